@@ -0,0 +1,300 @@
+"""Front-end estático precomprimido y con nombres con hash de contenido.
+
+Al arrancar (`load`, desde el startup de la app) se prepara en memoria cada
+fichero de `frontend/`:
+
+- los recursos (JS, CSS, imágenes) se publican también como
+  `nombre.<hash>.ext`; las referencias `/static/...` dentro de CSS, JS y de
+  las páginas HTML se reescriben a esos nombres, así que cambiar un fichero
+  cambia su URL y la de quien lo referencia;
+- cada variante se guarda sin comprimir, con gzip y, si el paquete `brotli`
+  está instalado, con brotli (sólo si sale más pequeña).
+
+`StaticAssets` (montado en `/static`) y `page` (rutas `/app*`) negocian
+`Accept-Encoding` y sirven los bytes ya comprimidos. Los nombres con hash
+llevan `Cache-Control: immutable` de un año; los nombres originales y las
+páginas HTML se revalidan por ETag.
+
+Para no comprimir en cada arranque (brotli al máximo es lento) se puede
+generar antes:
+
+    python -m app.assets [--out .assets]
+
+Si `ASSETS_DIR` contiene una compilación del mismo `frontend/` se carga tal
+cual; si no, se compila en memoria. Los cambios en `frontend/` se ven al
+reiniciar el servidor.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from starlette.datastructures import Headers
+from starlette.responses import PlainTextResponse, Response
+from starlette.routing import get_route_path
+
+try:
+    import brotli
+except ImportError:  # opcional: sólo se sirve gzip
+    brotli = None
+
+FRONTEND_DIR = os.getenv("FRONTEND_DIR", "frontend")
+ASSETS_DIR = os.getenv("ASSETS_DIR", ".assets")
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+# Ficheros de frontend/ que no se publican
+_SKIP = {"README.MD"}
+_COMPRESSIBLE = ("text/", "application/javascript", "application/json", "image/svg+xml")
+_REF = re.compile(r"/static/([A-Za-z0-9_./-]+)")
+_ENCODINGS = ("br", "gzip")
+_SUFFIX = {"br": ".br", "gzip": ".gz"}
+
+
+class Asset(NamedTuple):
+    content_type: str
+    digest: str
+    cache_control: str
+    # codificación ("identity", "gzip", "br") -> bytes
+    bodies: Dict[str, bytes]
+
+    def etag(self, encoding: str) -> str:
+        return f'"{self.digest}"' if encoding == "identity" else f'"{self.digest}.{encoding}"'
+
+
+# ruta bajo /static (o nombre de página HTML) -> recurso
+_ASSETS: Dict[str, Asset] = {}
+_PAGES: Dict[str, Asset] = {}
+
+
+def _content_type(name: str) -> str:
+    if name.endswith(".js"):
+        kind = "text/javascript"
+    else:
+        kind = mimetypes.guess_type(name)[0] or "application/octet-stream"
+    return f"{kind}; charset=utf-8" if kind.startswith("text/") else kind
+
+
+def _digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:12]
+
+
+def _hashed_name(name: str, digest: str) -> str:
+    stem, dot, ext = name.rpartition(".")
+    return f"{stem}.{digest}.{ext}" if dot else f"{name}.{digest}"
+
+
+def _compress(data: bytes, content_type: str) -> Dict[str, bytes]:
+    bodies = {"identity": data}
+    if not content_type.startswith(_COMPRESSIBLE):
+        return bodies
+    gz = gzip.compress(data, compresslevel=9, mtime=0)
+    if len(gz) < len(data):
+        bodies["gzip"] = gz
+    if brotli is not None:
+        br = brotli.compress(data, quality=11)
+        if len(br) < len(data):
+            bodies["br"] = br
+    return bodies
+
+
+def _rewrite(data: bytes, names: Dict[str, str]) -> bytes:
+    text = data.decode("utf-8")
+    text = _REF.sub(lambda m: "/static/" + names.get(m.group(1), m.group(1)), text)
+    return text.encode("utf-8")
+
+
+def _sources(src: str) -> List[str]:
+    return sorted(n for n in os.listdir(src) if n not in _SKIP and not n.startswith(".")
+                  and os.path.isfile(os.path.join(src, n)))
+
+
+def fingerprint(src: str = FRONTEND_DIR) -> str:
+    """Hash del contenido de `src` (para saber si una compilación está al día)."""
+    h = hashlib.sha256()
+    for name in _sources(src):
+        with open(os.path.join(src, name), "rb") as f:
+            h.update(name.encode() + b"\0" + f.read() + b"\0")
+    return h.hexdigest()[:16]
+
+
+def build(src: str = FRONTEND_DIR) -> Tuple[Dict[str, Asset], Dict[str, Asset], Dict[str, str]]:
+    """Compila `src`: (recursos por ruta, páginas HTML, nombre original -> nombre con hash)."""
+    raw: Dict[str, bytes] = {}
+    for name in _sources(src):
+        with open(os.path.join(src, name), "rb") as f:
+            raw[name] = f.read()
+    pages = [n for n in raw if n.endswith(".html")]
+    texts = [n for n in raw if n.endswith((".css", ".js"))]
+    # primero lo que no referencia a nada (imágenes...), luego CSS/JS con las
+    # referencias ya reescritas: así su hash cubre también lo que cargan
+    names: Dict[str, str] = {}
+    contents: Dict[str, bytes] = {}
+    for group in ([n for n in raw if n not in pages and n not in texts], texts):
+        for name in group:
+            data = _rewrite(raw[name], names) if name in texts else raw[name]
+            contents[name] = data
+            names[name] = _hashed_name(name, _digest(data))
+    assets: Dict[str, Asset] = {}
+    for name, data in contents.items():
+        ctype = _content_type(name)
+        bodies = _compress(data, ctype)
+        digest = _digest(data)
+        assets[names[name]] = Asset(ctype, digest, IMMUTABLE, bodies)
+        assets[name] = Asset(ctype, digest, REVALIDATE, bodies)
+    html: Dict[str, Asset] = {}
+    for name in pages:
+        data = _rewrite(raw[name], names)
+        ctype = _content_type(name)
+        html[name] = Asset(ctype, _digest(data), REVALIDATE, _compress(data, ctype))
+    return assets, html, names
+
+
+def write(out: str, src: str = FRONTEND_DIR) -> Dict[str, Any]:
+    """Compila `src` en el directorio `out` (ficheros + `.gz`/`.br` + `manifest.json`)."""
+    assets, html, names = build(src)
+    os.makedirs(out, exist_ok=True)
+    files: Dict[str, Any] = {}
+    for kind, group in (("asset", assets), ("page", html)):
+        for name, asset in group.items():
+            if kind == "asset" and asset.cache_control != IMMUTABLE:
+                continue  # el nombre original se sirve con el mismo contenido
+            for encoding, body in asset.bodies.items():
+                path = os.path.join(out, name + _SUFFIX.get(encoding, ""))
+                with open(path + ".tmp", "wb") as f:
+                    f.write(body)
+                os.replace(path + ".tmp", path)
+            files[name] = {"kind": kind, "type": asset.content_type, "digest": asset.digest,
+                           "encodings": sorted(asset.bodies)}
+    manifest = {"fingerprint": fingerprint(src), "names": names, "files": files}
+    path = os.path.join(out, "manifest.json")
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + ".tmp", path)
+    return manifest
+
+
+def _read(directory: str, src: str) -> Optional[Tuple[Dict[str, Asset], Dict[str, Asset]]]:
+    """Carga una compilación de `directory` si corresponde al contenido actual de `src`."""
+    try:
+        with open(os.path.join(directory, "manifest.json")) as f:
+            manifest = json.load(f)
+        if manifest.get("fingerprint") != fingerprint(src):
+            return None
+        assets: Dict[str, Asset] = {}
+        html: Dict[str, Asset] = {}
+        for name, meta in manifest["files"].items():
+            bodies = {}
+            for encoding in meta["encodings"]:
+                with open(os.path.join(directory, name + _SUFFIX.get(encoding, "")), "rb") as f:
+                    bodies[encoding] = f.read()
+            if meta["kind"] == "page":
+                html[name] = Asset(meta["type"], meta["digest"], REVALIDATE, bodies)
+            else:
+                assets[name] = Asset(meta["type"], meta["digest"], IMMUTABLE, bodies)
+        for original, hashed in manifest["names"].items():
+            asset = assets[hashed]
+            assets[original] = asset._replace(cache_control=REVALIDATE)
+        return assets, html
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def load(src: str = FRONTEND_DIR, directory: Optional[str] = ASSETS_DIR) -> str:
+    """Prepara los recursos en memoria. Devuelve "prebuilt" o "built"."""
+    loaded = _read(directory, src) if directory else None
+    origin = "prebuilt"
+    if loaded is None:
+        assets, html, _ = build(src)
+        loaded, origin = (assets, html), "built"
+    _ASSETS.clear()
+    _ASSETS.update(loaded[0])
+    _PAGES.clear()
+    _PAGES.update(loaded[1])
+    return origin
+
+
+def _negotiate(accept_encoding: str, available: Dict[str, bytes]) -> str:
+    accepted: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding.strip().lower()] = q
+    best, best_q = "identity", 0.0
+    for encoding in _ENCODINGS:
+        q = accepted.get(encoding, accepted.get("*", 0.0))
+        if encoding in available and q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def _respond(asset: Asset, headers: Any, method: str) -> Response:
+    encoding = _negotiate(headers.get("accept-encoding", ""), asset.bodies)
+    etag = asset.etag(encoding)
+    out = {"ETag": etag, "Cache-Control": asset.cache_control, "Vary": "Accept-Encoding"}
+    if_none_match = headers.get("if-none-match")
+    if if_none_match:
+        candidates = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+        if etag in candidates or "*" in candidates:
+            return Response(status_code=304, headers=out)
+    if encoding != "identity":
+        out["Content-Encoding"] = encoding
+    body = asset.bodies[encoding]
+    if method == "HEAD":
+        out["Content-Length"] = str(len(body))
+        return Response(status_code=200, headers=out, media_type=asset.content_type)
+    return Response(body, headers=out, media_type=asset.content_type)
+
+
+def page(request: Any, name: str) -> Response:
+    """Respuesta para la página HTML `name` (p. ej. "index.html")."""
+    asset = _PAGES.get(name)
+    if asset is None:
+        if not _PAGES and not _ASSETS:
+            load()
+            return page(request, name)
+        return PlainTextResponse("Not Found", status_code=404)
+    return _respond(asset, request.headers, request.method)
+
+
+class StaticAssets:
+    """App ASGI que sirve los recursos de `load` (montar en `/static`)."""
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if not _ASSETS and not _PAGES:
+            load()
+        method = scope["method"]
+        if method not in ("GET", "HEAD"):
+            response: Response = PlainTextResponse("Method Not Allowed", status_code=405, headers={"Allow": "GET, HEAD"})
+        else:
+            path = get_route_path(scope).lstrip("/")
+            asset = _ASSETS.get(path) or _PAGES.get(path)
+            if asset is None:
+                response = PlainTextResponse("Not Found", status_code=404)
+            else:
+                response = _respond(asset, Headers(scope=scope), method)
+        await response(scope, receive, send)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Precomprime y pone hash a los recursos de frontend/.")
+    parser.add_argument("--src", default=FRONTEND_DIR)
+    parser.add_argument("--out", default=ASSETS_DIR)
+    args = parser.parse_args()
+    manifest = write(args.out, args.src)
+    total = sum(len(m["encodings"]) for m in manifest["files"].values())
+    print(f"{len(manifest['files'])} ficheros ({total} variantes) en {args.out}"
+          f"{'' if brotli is not None else ' (sin brotli: instala el paquete brotli)'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Autorización para los endpoints de administración.
+
+`resolve_user` resuelve un `x-user-id` contra `app_users` con una caché en
+proceso: las respuestas positivas duran `AUTH_ROLE_TTL` segundos y las
+negativas (usuario inexistente) `AUTH_NEGATIVE_TTL`. Una entrada deja de
+valer en cuanto cambia la versión local de `app_users` (cualquier escritura
+a través de `app.db`).
+
+`issue_token` / `verify_token` implementan tokens de sesión firmados con
+HMAC-SHA256 (`payload.firma`, en base64url) que `/auth/login` entrega y que
+se validan sin ninguna consulta. El rol va dentro del token, así que un
+cambio de rol no afecta a los tokens ya emitidos hasta que caducan.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from . import db
+
+ROLE_TTL = float(os.getenv("AUTH_ROLE_TTL", "30"))
+NEGATIVE_TTL = float(os.getenv("AUTH_NEGATIVE_TTL", "5"))
+ROLE_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_ROLE_CACHE_MAX_ENTRIES", "4096"))
+TOKEN_TTL = int(os.getenv("AUTH_TOKEN_TTL", str(8 * 3600)))
+# Sin AUTH_SECRET cada proceso usa una clave aleatoria: los tokens no
+# sobreviven a un reinicio ni valen entre workers distintos (el panel de
+# admin envía también `x-user-id`, que `require_admin` usa entonces).
+_SECRET = (os.getenv("AUTH_SECRET") or secrets.token_hex(32)).encode()
+
+# user_id -> (caduca_en, versión de app_users, usuario o None)
+_ROLES: Dict[str, Tuple[float, int, Optional[Dict[str, Any]]]] = {}
+
+
+async def resolve_user(user_id: str) -> Optional[Dict[str, Any]]:
+    """Fila de `app_users` para `user_id` (`None` si no existe), con caché."""
+    now = time.monotonic()
+    version = db.table_version("app_users")
+    hit = _ROLES.get(user_id)
+    if hit is not None and hit[0] > now and hit[1] == version:
+        return hit[2]
+    users = await db.aselect_where("app_users", "id", user_id)
+    if users is None:
+        return None  # error de la base de datos: no se guarda en caché
+    user = users[0] if users else None
+    if len(_ROLES) >= ROLE_CACHE_MAX_ENTRIES:
+        _ROLES.pop(next(iter(_ROLES)))
+    _ROLES.pop(user_id, None)
+    _ROLES[user_id] = (now + (ROLE_TTL if user else NEGATIVE_TTL), version, user)
+    return user
+
+
+def clear_roles() -> int:
+    n = len(_ROLES)
+    _ROLES.clear()
+    return n
+
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _unb64(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _sign(payload: str) -> str:
+    return _b64(hmac.new(_SECRET, payload.encode(), hashlib.sha256).digest())
+
+
+def issue_token(user: Dict[str, Any], ttl: Optional[int] = None) -> str:
+    claims = {"sub": str(user.get("id")), "role": user.get("role"), "exp": int(time.time()) + (ttl or TOKEN_TTL)}
+    payload = _b64(json.dumps(claims, separators=(",", ":")).encode())
+    return f"{payload}.{_sign(payload)}"
+
+
+def verify_token(token: str) -> Optional[Dict[str, Any]]:
+    """Claims del token (`sub`, `role`, `exp`) o `None` si es inválido o ha caducado."""
+    payload, _, signature = token.partition(".")
+    if not payload or not hmac.compare_digest(signature.encode(), _sign(payload).encode()):
+        return None
+    try:
+        claims = json.loads(_unb64(payload))
+    except ValueError:
+        return None
+    if not isinstance(claims, dict) or claims.get("exp", 0) < time.time():
+        return None
+    return claims
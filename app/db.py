@@ -3,10 +3,17 @@
 Intenta usar Supabase si está disponible y configurado; si no, usa un
 fallback en memoria para permitir probar la API sin instalar el SDK.
 """
-from typing import Any, Dict, List, Optional
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+import asyncio
 import os
+import threading
+import time
 from dotenv import load_dotenv
 
+from . import memstore, metrics, persist, search
+
 load_dotenv()
 
 SUPABASE_URL = os.getenv("SUPABASE_URL")
@@ -28,13 +35,593 @@ except Exception:
 
 
 # --- Fallback en memoria ---
-_DATA: Dict[str, List[Dict[str, Any]]] = {
-    "categories": [],
-    "products": [],
-    "app_users": [],
+# Índices secundarios declarados por tabla (ver `app.memstore`)
+_INDEXES: Dict[str, Tuple[str, ...]] = {
+    "products": ("category",),
+    "categories": ("slug",),
+    "app_users": ("id",),
+}
+# Índices ordenados (paginación keyset por estas columnas)
+_SORTED_INDEXES: Dict[str, Tuple[str, ...]] = {
+    "products": ("id", "price", "name"),
 }
+
+
+def _new_table(name: str) -> memstore.Table:
+    return memstore.Table(name, indexes=_INDEXES.get(name, ()), sorted_indexes=_SORTED_INDEXES.get(name, ()))
+
+
+_DATA: Dict[str, memstore.Table] = {name: _new_table(name) for name in _INDEXES}
 _AUTO_INC: Dict[str, int] = {"categories": 1, "products": 1}
 
+# Persistencia opcional del fallback (ver `app.persist`): con MEMSTORE_DIR
+# cada escritura se añade a un log y el estado se compacta en un snapshot
+# cuando el log supera MEMSTORE_COMPACT_BYTES y al cerrar.
+MEMSTORE_DIR = os.getenv("MEMSTORE_DIR")
+MEMSTORE_FSYNC = os.getenv("MEMSTORE_FSYNC", "0").lower() in ("1", "true", "yes")
+MEMSTORE_COMPACT_BYTES = int(os.getenv("MEMSTORE_COMPACT_BYTES", str(64 * 1024 * 1024)))
+# Decodificar las tablas del snapshot en segundo plano nada más arrancar (si
+# no, cada tabla se decodifica en su primer uso)
+MEMSTORE_WARM = os.getenv("MEMSTORE_WARM", "1").lower() in ("1", "true", "yes")
+_JOURNAL: Optional[persist.Journal] = None
+
+# Varios workers (procesos) sobre el mismo MEMSTORE_DIR: con MEMSTORE_SHARED
+# cada escritura se hace con el lock del directorio tomado y sobre el estado
+# al día (mismo contador de ids en todos), y un hilo mira el log cada
+# MEMSTORE_TAIL_INTERVAL segundos para aplicar en el event loop lo que
+# escriben los demás. Las lecturas no toman ningún lock. Sin event loop
+# (scripts) no hay hilo: `sync()` aplica lo pendiente cuando se pida.
+MEMSTORE_SHARED = os.getenv("MEMSTORE_SHARED", "0").lower() in ("1", "true", "yes")
+MEMSTORE_TAIL_INTERVAL = float(os.getenv("MEMSTORE_TAIL_INTERVAL", "0.002"))
+# Serializa dentro del proceso las escrituras y la aplicación de las ajenas
+_WRITE_LOCK = threading.RLock()
+_TAILER: Dict[str, Any] = {"thread": None, "stop": None, "loop": None, "scheduled": False}
+
+
+# Tamaño de lote para inserciones masivas (una petición por lote)
+BULK_CHUNK_SIZE = int(os.getenv("DB_BULK_CHUNK_SIZE", "500"))
+
+# Resultado de una inserción masiva: (filas escritas, errores por fila)
+BulkResult = Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]
+
+
+# --- Caché de lecturas (sólo backend Supabase) ---
+# Clave: (tabla, operación, argumentos). TTL + desalojo LRU por tamaño; las
+# escrituras invalidan todas las entradas de la tabla afectada.
+CACHE_ENABLED = os.getenv("DB_CACHE_ENABLED", "1").lower() in ("1", "true", "yes")
+CACHE_TTL = float(os.getenv("DB_CACHE_TTL", "60"))
+CACHE_MAX_ENTRIES = int(os.getenv("DB_CACHE_MAX_ENTRIES", "1024"))
+
+_CacheKey = Tuple[str, str, Tuple[Any, ...]]
+_CACHE: "OrderedDict[_CacheKey, Tuple[float, Any]]" = OrderedDict()
+_CACHE_LOCK = threading.Lock()
+_CACHE_STATS: Dict[str, int] = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0, "stale_served": 0}
+# Generación por tabla: evita guardar un resultado leído antes de una escritura
+_TABLE_GEN: Dict[str, int] = {}
+_MISS = object()
+
+# Último resultado bueno de cada lectura (mismas claves, mismo tamaño
+# máximo): con DB_SERVE_STALE se devuelve si Supabase falla o el circuit
+# breaker está abierto. Las escrituras no lo borran: es el plan B.
+SERVE_STALE = os.getenv("DB_SERVE_STALE", "1").lower() in ("1", "true", "yes")
+_STALE: "OrderedDict[_CacheKey, Any]" = OrderedDict()
+
+# Lecturas en curso (single-flight): (clave, generación) -> espera compartida
+_FLIGHTS: Dict[Tuple[_CacheKey, int], List[Any]] = {}
+_FLIGHT_LOCK = threading.Lock()
+_AFLIGHTS: Dict[Tuple[_CacheKey, int], "asyncio.Future[Any]"] = {}
+
+
+def _copy(value: Any) -> Any:
+    # Devolvemos copias para que los llamadores no alteren la caché
+    if isinstance(value, list):
+        return [dict(r) if isinstance(r, dict) else r for r in value]
+    if isinstance(value, dict):
+        return dict(value)
+    if isinstance(value, tuple):
+        return tuple(_copy(v) for v in value)
+    return value
+
+
+def _cache_get(key: _CacheKey) -> Any:
+    with _CACHE_LOCK:
+        entry = _CACHE.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del _CACHE[key]
+            _CACHE_STATS["misses"] += 1
+            return _MISS
+        _CACHE.move_to_end(key)
+        _CACHE_STATS["hits"] += 1
+        return entry[1]
+
+
+def _cache_put(key: _CacheKey, value: Any, gen: int) -> None:
+    with _CACHE_LOCK:
+        if _TABLE_GEN.get(key[0], 0) != gen:
+            return
+        _CACHE[key] = (time.monotonic() + CACHE_TTL, _copy(value))
+        _CACHE.move_to_end(key)
+        while len(_CACHE) > CACHE_MAX_ENTRIES:
+            _CACHE.popitem(last=False)
+            _CACHE_STATS["evictions"] += 1
+
+
+def _invalidate(table: str) -> None:
+    with _CACHE_LOCK:
+        _TABLE_GEN[table] = _TABLE_GEN.get(table, 0) + 1
+        for key in [k for k in _CACHE if k[0] == table]:
+            del _CACHE[key]
+            _CACHE_STATS["invalidations"] += 1
+
+
+def cache_stats() -> Dict[str, Any]:
+    """Contadores de la caché de lecturas."""
+    with _CACHE_LOCK:
+        stats: Dict[str, Any] = dict(_CACHE_STATS)
+        stats["entries"] = len(_CACHE)
+    stats["enabled"] = CACHE_ENABLED and _rest()
+    stats["ttl"] = CACHE_TTL
+    stats["max_entries"] = CACHE_MAX_ENTRIES
+    return stats
+
+
+def cache_clear() -> int:
+    """Vacía la caché de lecturas. Devuelve el número de entradas eliminadas."""
+    with _CACHE_LOCK:
+        n = len(_CACHE)
+        _CACHE.clear()
+        for table in list(_TABLE_GEN):
+            _TABLE_GEN[table] += 1
+    return n
+
+
+def _rest() -> bool:
+    return _USE_SUPABASE and _use_supabase_rest and _supabase_client is not None
+
+
+def backend() -> str:
+    """"supabase" o "memory" según dónde van las lecturas y escrituras."""
+    return "supabase" if _rest() else "memory"
+
+
+def pending_tables() -> List[str]:
+    """Tablas del snapshot de MEMSTORE_DIR que aún no se han decodificado."""
+    return _DATA.pending() if isinstance(_DATA, persist.LazyTables) else []
+
+
+def _open_journal() -> None:
+    global _DATA, _JOURNAL
+    if _JOURNAL is not None or not MEMSTORE_DIR:
+        return
+    journal = persist.Journal(MEMSTORE_DIR, fsync=MEMSTORE_FSYNC, compact_bytes=MEMSTORE_COMPACT_BYTES,
+                              shared=MEMSTORE_SHARED)
+    tables, autoinc = journal.open(_new_table)
+    for name in _INDEXES:
+        if name not in tables:
+            tables[name] = _new_table(name)
+    _DATA = tables
+    _AUTO_INC.update(autoinc)
+    _SEARCH.clear()
+    if journal.shared:
+        _share_versions(journal)
+    _JOURNAL = journal
+    _reloaded()
+    if MEMSTORE_WARM and tables.pending():
+        threading.Thread(target=tables.warm, name="memstore-warm", daemon=True).start()
+
+
+def _close_journal() -> None:
+    global _JOURNAL
+    journal = _JOURNAL
+    if journal is None:
+        return
+    if not journal.shared:
+        journal.close(_DATA, _AUTO_INC)
+        _JOURNAL = None
+        return
+    _stop_tailer()
+    with _WRITE_LOCK, journal.locked():
+        # sólo se compacta estando al día: si no, el snapshot perdería escrituras ajenas
+        current = _apply_shared(journal)
+        journal.close(_DATA if current else None, _AUTO_INC if current else None)
+        _JOURNAL = None
+
+
+def _share_versions(journal: persist.Journal) -> None:
+    """Versiones y época comunes a todos los workers del directorio.
+
+    La versión de una tabla es la posición en el log (`persist.version`) de
+    su última escritura, o la del principio del log actual si no tiene
+    ninguna: el mismo estado da el mismo ETag en cualquier worker.
+    """
+    global _EPOCH, _VERSION_BASE
+    _EPOCH = journal.store_id
+    _VERSION_BASE = persist.version(journal.gen, 0)
+    _VERSIONS.clear()
+    _VERSIONS.update(journal.versions)
+
+
+def _apply_shared(journal: persist.Journal) -> bool:
+    """Aplica las escrituras de otros workers. False si hay que volver a abrir el almacén."""
+    applied = journal.catch_up(_DATA, _AUTO_INC, _new_table)
+    if applied is None:
+        return False
+    changed: Dict[str, int] = {}
+    # escrituras consecutivas de la misma tabla y tipo: un solo aviso
+    batch: List[Dict[str, Any]] = []
+    batch_key: Optional[Tuple[str, str]] = None
+    for op, version in applied:
+        kind, table = op[0], op[1]
+        row = op[2] if kind == "i" else _DATA[table].get(op[2]) if kind == "u" else {"id": op[2]}
+        if table in _SEARCH:
+            _search_sync(table, row.get("id") if kind == "i" else op[2], row if kind != "d" else None)
+        changed[table] = version
+        if _LISTENERS and row is not None:
+            key = (table, _OPS[kind])
+            if key != batch_key:
+                if batch_key is not None:
+                    _changed(batch_key[0], batch_key[1], batch)
+                batch, batch_key = [], key
+            batch.append(row)
+    for table, version in changed.items():
+        _VERSIONS[table] = version
+        _invalidate(table)
+    if batch_key is not None:
+        _changed(batch_key[0], batch_key[1], batch)
+    return True
+
+
+_OPS = {"i": "insert", "u": "update", "d": "delete"}
+
+
+def _reopen_shared(journal: persist.Journal) -> None:
+    # este proceso se quedó atrás más de una compactación: se carga de nuevo
+    global _JOURNAL
+    if _JOURNAL is not journal:
+        return
+    _JOURNAL = None
+    journal.close()
+    _open_journal()
+    cache_clear()
+
+
+def _refresh() -> None:
+    _TAILER["scheduled"] = False
+    with _WRITE_LOCK:
+        journal = _JOURNAL
+        if journal is not None and journal.shared and not _apply_shared(journal):
+            _reopen_shared(journal)
+
+
+def sync() -> None:
+    """Aplica ya las escrituras de otros workers (MEMSTORE_SHARED); si no, no hace nada."""
+    _refresh()
+
+
+def shared() -> bool:
+    """True si el fallback en memoria se comparte entre procesos (MEMSTORE_SHARED)."""
+    return _JOURNAL is not None and _JOURNAL.shared
+
+
+@contextmanager
+def _writing() -> Iterator[None]:
+    """Una escritura del fallback: en modo compartido, con el lock del
+    directorio tomado y después de aplicar lo que hayan escrito los demás."""
+    if _JOURNAL is None or not _JOURNAL.shared:
+        yield
+        return
+    with _WRITE_LOCK:
+        while True:
+            journal = _JOURNAL
+            with journal.locked():
+                if _apply_shared(journal):
+                    yield
+                    return
+            _reopen_shared(journal)
+
+
+def _tail(stop: threading.Event) -> None:
+    # las escrituras ajenas se aplican en el event loop, entre dos awaits,
+    # igual que las propias: los handlers async leen sin locks
+    while not stop.wait(MEMSTORE_TAIL_INTERVAL):
+        journal = _JOURNAL
+        if journal is None or _TAILER["scheduled"] or not journal.has_news():
+            continue
+        _TAILER["scheduled"] = True
+        try:
+            _TAILER["loop"].call_soon_threadsafe(_refresh)
+        except RuntimeError:  # el loop se cerró
+            return
+
+
+def _start_tailer() -> None:
+    if _JOURNAL is None or not _JOURNAL.shared or _TAILER["thread"] is not None:
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    stop = threading.Event()
+    thread = threading.Thread(target=_tail, args=(stop,), name="memstore-tail", daemon=True)
+    _TAILER.update(thread=thread, stop=stop, loop=loop, scheduled=False)
+    thread.start()
+
+
+def _stop_tailer() -> None:
+    thread, stop = _TAILER["thread"], _TAILER["stop"]
+    if thread is None:
+        return
+    stop.set()
+    if thread is not threading.current_thread():
+        thread.join()
+    _TAILER.update(thread=None, stop=None, loop=None, scheduled=False)
+
+
+def _journal(*op: Any) -> None:
+    if _JOURNAL is not None:
+        _JOURNAL.append(op)
+
+
+def compact() -> bool:
+    """Compacta el log del fallback en un snapshot nuevo (False si no hay persistencia)."""
+    if _JOURNAL is None:
+        return False
+    with _writing():
+        _JOURNAL.compact(_DATA, _AUTO_INC)
+    return True
+
+
+def connect() -> None:
+    """Abre los pools de conexiones hacia Supabase o, en modo memoria, el
+    almacén persistente de MEMSTORE_DIR si está configurado."""
+    if _rest():
+        _supabase_client.open_client()
+        _supabase_client.open_async_client()
+    else:
+        _open_journal()
+        _start_tailer()
+
+
+def close() -> None:
+    """Cierra el pool síncrono hacia Supabase (o el log del modo memoria)."""
+    if _rest():
+        _supabase_client.close_client()
+    else:
+        _close_journal()
+
+
+async def aclose() -> None:
+    """Cierra ambos pools (síncrono y async) hacia Supabase (o el log del modo memoria)."""
+    if _rest():
+        _supabase_client.close_client()
+        await _supabase_client.close_async_client()
+    else:
+        _close_journal()
+
+
+def _remember(key: _CacheKey, value: Any) -> None:
+    if not SERVE_STALE or value is None:
+        return
+    with _CACHE_LOCK:
+        _STALE[key] = _copy(value)
+        _STALE.move_to_end(key)
+        while len(_STALE) > CACHE_MAX_ENTRIES:
+            _STALE.popitem(last=False)
+
+
+def _fallback(key: _CacheKey, exc: Exception) -> Any:
+    """Tras un fallo: el último resultado bueno de `key` (si `DB_SERVE_STALE`) o `None`."""
+    table, op = key[0], key[1]
+    metrics.db_error(table, op, exc)
+    with _CACHE_LOCK:
+        value = _STALE.get(key) if SERVE_STALE else None
+        if value is not None:
+            _CACHE_STATS["stale_served"] += 1
+    if value is not None:
+        metrics.db_stale_served(table, op)
+    return value
+
+
+def _fetch(key: _CacheKey, gen: int, fetch: Callable[[], Any]) -> Any:
+    try:
+        value = fetch()
+    except Exception as exc:
+        return _fallback(key, exc)
+    if CACHE_ENABLED and value is not None:
+        _cache_put(key, value, gen)
+    _remember(key, value)
+    return value
+
+
+async def _afetch(key: _CacheKey, gen: int, fetch: Callable[[], Any]) -> Any:
+    try:
+        value = await fetch()
+    except Exception as exc:
+        return _fallback(key, exc)
+    if CACHE_ENABLED and value is not None:
+        _cache_put(key, value, gen)
+    _remember(key, value)
+    return value
+
+
+def _read(table: str, op: str, args: Tuple[Any, ...], fetch: Callable[[], Any]) -> Any:
+    """Lectura remota a través de la caché; `None` si falla (o el último resultado bueno).
+
+    Las lecturas idénticas simultáneas comparten una sola llamada a Supabase.
+    """
+    key = (table, op, args)
+    if CACHE_ENABLED:
+        hit = _cache_get(key)
+        if hit is not _MISS:
+            return _copy(hit)
+    gen = _TABLE_GEN.get(table, 0)
+    # la generación forma parte de la clave: una lectura empezada antes de una
+    # escritura no se comparte con las que llegan después
+    flight_key = (key, gen)
+    with _FLIGHT_LOCK:
+        flight = _FLIGHTS.get(flight_key)
+        leader = flight is None
+        if leader:
+            flight = _FLIGHTS[flight_key] = [threading.Event(), None]
+    if not leader:
+        flight[0].wait()
+        return _copy(flight[1])
+    try:
+        flight[1] = _fetch(key, gen, fetch)
+    finally:
+        with _FLIGHT_LOCK:
+            del _FLIGHTS[flight_key]
+        flight[0].set()
+    return _copy(flight[1])
+
+
+async def _aread(table: str, op: str, args: Tuple[Any, ...], fetch: Callable[[], Any]) -> Any:
+    """Como `_read`, pero `fetch` devuelve una corrutina."""
+    key = (table, op, args)
+    if CACHE_ENABLED:
+        hit = _cache_get(key)
+        if hit is not _MISS:
+            return _copy(hit)
+    gen = _TABLE_GEN.get(table, 0)
+    flight_key = (key, gen)
+    task = _AFLIGHTS.get(flight_key)
+    if task is None or task.get_loop() is not asyncio.get_running_loop():
+        task = _AFLIGHTS[flight_key] = asyncio.ensure_future(_afetch(key, gen, fetch))
+        task.add_done_callback(lambda t: _AFLIGHTS.pop(flight_key, None) if _AFLIGHTS.get(flight_key) is t else None)
+    # shield: si el cliente que la inició se va, las demás esperas siguen
+    return _copy(await asyncio.shield(task))
+
+
+def upstream_state() -> Optional[Dict[str, Any]]:
+    """Estado del circuit breaker hacia Supabase (`None` en modo memoria)."""
+    if not _rest():
+        return None
+    state = _supabase_client.BREAKER.snapshot()
+    with _CACHE_LOCK:
+        state["stale_entries"] = len(_STALE)
+        state["stale_served"] = _CACHE_STATS["stale_served"]
+    state["serve_stale"] = SERVE_STALE
+    state["inflight"] = len(_FLIGHTS) + len(_AFLIGHTS)
+    return state
+
+
+# --- Versiones por tabla (ETags de la API) ---
+# Cada escritura incrementa la versión de su tabla. `_EPOCH` distingue
+# procesos/arranques para que una versión no se confunda con la de otro.
+# Con MEMSTORE_SHARED ambas son comunes a los workers (`_share_versions`).
+_VERSIONS: Dict[str, int] = {}
+_VERSION_BASE = 0
+_EPOCH = f"{os.getpid():x}.{time.time_ns():x}"
+
+
+def table_version(table: str) -> int:
+    return _VERSIONS.get(table, _VERSION_BASE)
+
+
+def version_tag(*tables: str) -> str:
+    """Identificador del estado actual de `tables` (cambia con cada escritura).
+
+    Con Supabase otros procesos (u otros clientes) también escriben, así que
+    el identificador caduca además cada `DB_CACHE_TTL` segundos: nunca se
+    considera vigente algo más antiguo que la propia caché de lecturas.
+    """
+    parts = [_EPOCH] + [f"{t}:{table_version(t)}" for t in tables]
+    if _rest():
+        parts.append(str(int(time.time() // max(CACHE_TTL, 1))))
+    return "|".join(parts)
+
+
+def _after_write(table: str) -> None:
+    journal = _JOURNAL
+    if journal is not None:
+        journal.commit()
+    if journal is not None and journal.shared:
+        _VERSIONS[table] = journal.position()
+    else:
+        _VERSIONS[table] = _VERSIONS.get(table, 0) + 1
+    _invalidate(table)
+    if journal is not None and journal.needs_compaction():
+        journal.compact(_DATA, _AUTO_INC)
+
+
+def _maybe_written(exc: Exception) -> bool:
+    """¿Puede haberse aplicado en Supabase la escritura que falló con `exc`?
+
+    Sólo con un 5xx: PostgREST pudo escribir antes de fallar. Un 4xx (fila
+    rechazada) o el circuito abierto (ni se envió) no cambian nada, así que
+    no hay que invalidar la caché ni tocar las versiones.
+    """
+    response = getattr(exc, "response", None)
+    return response is not None and response.status_code >= 500
+
+
+# --- Oyentes de escrituras (p. ej. `app.events`) ---
+# fn(tabla, operación, filas) tras cada escritura correcta, desde el hilo
+# que escribe. Operación: "insert", "update", "upsert" (altas masivas con
+# upsert) o "delete" (las filas traen al menos el id). Con MEMSTORE_SHARED
+# también llegan las escrituras de los demás workers. "reload" (sin filas)
+# avisa de que el almacén se cargó de nuevo desde MEMSTORE_DIR: lo que el
+# oyente haya acumulado sobre esa tabla ya no vale.
+_LISTENERS: List[Callable[[str, str, List[Dict[str, Any]]], None]] = []
+
+
+def add_listener(fn: Callable[[str, str, List[Dict[str, Any]]], None]) -> None:
+    if fn not in _LISTENERS:
+        _LISTENERS.append(fn)
+
+
+def remove_listener(fn: Callable[[str, str, List[Dict[str, Any]]], None]) -> None:
+    if fn in _LISTENERS:
+        _LISTENERS.remove(fn)
+
+
+def _changed(table: str, op: str, rows: Any) -> Any:
+    """Avisa a los oyentes de `rows` (si hay) y las devuelve tal cual."""
+    if rows and _LISTENERS:
+        for fn in list(_LISTENERS):
+            try:
+                fn(table, op, rows)
+            except Exception as exc:
+                metrics.db_error(table, "listener", exc)
+    return rows
+
+
+def _reloaded() -> None:
+    for table in _INDEXES:
+        for fn in list(_LISTENERS):
+            try:
+                fn(table, "reload", [])
+            except Exception as exc:
+                metrics.db_error(table, "listener", exc)
+
+
+def _mem_write(table: str, write: Callable[..., Any], *args: Any) -> Any:
+    with _writing():
+        res = write(table, *args)
+        _after_write(table)
+    return res
+
+
+# Mapa residente id de categoría -> slug. Las categorías son pocas y casi no
+# cambian: con Supabase se cargan en una consulta y se reutilizan hasta que
+# cambia su versión local o pasa CACHE_TTL (otros procesos también escriben).
+_SLUGS: Dict[str, Any] = {"key": None, "map": {}, "pending": None}
+
+
+def _slug_key() -> Tuple[int, int]:
+    return table_version("categories"), int(time.time() // max(CACHE_TTL, 1))
+
+
+def _slug_of(cat: Optional[Dict[str, Any]]) -> Optional[str]:
+    return (cat.get("slug") or cat.get("name")) if cat else None
+
+
+def _set_slugs(key: Tuple[int, int], rows: List[Dict[str, Any]]) -> Dict[str, Optional[str]]:
+    _SLUGS["map"] = {str(c.get("id")): _slug_of(c) for c in rows}
+    _SLUGS["key"] = key
+    return _SLUGS["map"]
+
 
 def _next_id(table: str) -> int:
     v = _AUTO_INC.get(table, 1)
@@ -42,105 +629,601 @@ def _next_id(table: str) -> int:
     return v
 
 
-def select_all(table: str) -> Optional[List[Dict[str, Any]]]:
-    if _USE_SUPABASE and _use_supabase_rest and _supabase_client is not None:
-        try:
-            return _supabase_client.list_table(table, select="*")
-        except Exception:
-            return None
-    # fallback
-    return list(_DATA.get(table, []))
+# --- Operaciones sobre el fallback en memoria (compartidas por la API
+# síncrona y la async; no bloquean, así que se ejecutan en el event loop) ---
+
+# Tablas con búsqueda de texto (índice invertido en el fallback; se construye
+# en la primera búsqueda y después lo mantienen las escrituras)
+_SEARCH: Dict[str, search.InvertedIndex] = {}
+
+
+def _search_index(table: str) -> search.InvertedIndex:
+    index = _SEARCH.get(table)
+    if index is None:
+        index = search.InvertedIndex()
+        t = _DATA.get(table)
+        for row in (t if t is not None else ()):
+            index.add(str(row.get("id")), row)
+        _SEARCH[table] = index
+    return index
+
+
+def _search_sync(table: str, key: Any, row: Optional[Dict[str, Any]]) -> None:
+    index = _SEARCH.get(table)
+    if index is None:
+        return
+    index.remove(str(key))
+    if row is not None:
+        index.add(str(row.get("id")), row)
+
+
+def _mem_table(table: str) -> memstore.Table:
+    t = _DATA.get(table)
+    if t is None:
+        t = _DATA[table] = _new_table(table)
+    return t
+
+
+def _mem_select_all(table: str, columns: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+    t = _DATA.get(table)
+    return t.all(columns) if t is not None else []
+
+
+def _mem_select_one(table: str, id_value: Any) -> Optional[Dict[str, Any]]:
+    t = _DATA.get(table)
+    return t.get(id_value) if t is not None else None
+
+
+def _mem_select_many(table: str, ids: List[Any],
+                     columns: Optional[Sequence[str]] = None) -> List[Optional[Dict[str, Any]]]:
+    t = _DATA.get(table)
+    return t.get_many(ids, columns) if t is not None else [None] * len(ids)
+
+
+def _mem_insert(table: str, payload: Dict[str, Any]) -> List[Dict[str, Any]]:
+    obj = dict(payload)
+    obj["id"] = _next_id(table)
+    row = _mem_table(table).insert(obj)
+    _journal("i", table, row)
+    _search_sync(table, row["id"], row)
+    return [row]
+
+
+def _mem_insert_many(table: str, rows: List[Dict[str, Any]], upsert: bool) -> List[Dict[str, Any]]:
+    t = _mem_table(table)
+    out = []
+    for payload in rows:
+        obj = dict(payload)
+        if upsert and obj.get("id") is not None:
+            # merge-duplicates: actualiza si existe, si no inserta con ese id
+            row = t.update(obj["id"], obj)
+            if row is None:
+                row = t.insert(obj)
+                _journal("i", table, row)
+                if isinstance(obj["id"], int) and obj["id"] >= _AUTO_INC.get(table, 1):
+                    _AUTO_INC[table] = obj["id"] + 1
+            else:
+                _journal("u", table, obj["id"], obj)
+        else:
+            obj["id"] = _next_id(table)
+            row = t.insert(obj)
+            _journal("i", table, row)
+        _search_sync(table, row["id"], row)
+        out.append(row)
+    return out
+
+
+def _mem_update(table: str, id_value: Any, payload: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+    t = _DATA.get(table)
+    updated = t.update(id_value, payload) if t is not None else None
+    if updated is None:
+        return None
+    _journal("u", table, id_value, payload)
+    _search_sync(table, id_value, updated)
+    return [updated]
+
+
+def _mem_delete(table: str, id_value: Any) -> Optional[List[Dict[str, Any]]]:
+    t = _DATA.get(table)
+    removed = t.delete(id_value) if t is not None else None
+    if removed is None:
+        return None
+    _journal("d", table, id_value)
+    _search_sync(table, id_value, None)
+    return [removed]
+
+
+def _mem_select_where(table: str, column: str, value: Any,
+                      columns: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+    t = _DATA.get(table)
+    return t.where(column, value, columns) if t is not None else []
+
+
+def _mem_select_limit(table: str, limit: int, columns: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+    t = _DATA.get(table)
+    return t.head(limit, columns) if t is not None else []
+
+
+def _mem_select_page(table: str, order_by: str, after: Optional[Tuple[Any, ...]], limit: Optional[int],
+                     where: Optional[Tuple[str, Any]], count: Optional[str],
+                     columns: Optional[Sequence[str]] = None,
+                     between: Optional[Tuple[str, Any, Any]] = None) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+    t = _DATA.get(table)
+    if t is None:
+        return [], (0 if count else None)
+    rows, total = t.page(order_by=order_by, after=after, limit=limit, where=where, columns=columns,
+                         between=between)
+    return rows, (total if count else None)
+
+
+def _mem_search(table: str, query: str, limit: int) -> List[Dict[str, Any]]:
+    t = _DATA.get(table)
+    if t is None:
+        return []
+    hits = _search_index(table).search(query, limit)
+    return [row for row in (t.get(key) for key, _ in hits) if row is not None]
+
+
+def _align(ids: List[Any], rows: Optional[List[Dict[str, Any]]]) -> Optional[List[Optional[Dict[str, Any]]]]:
+    # Resultado de `id=in.(...)` en el orden pedido, con `None` para los que faltan
+    if rows is None:
+        return None
+    by_id = {str(r.get("id")): r for r in rows}
+    return [by_id.get(str(i)) for i in ids]
+
+
+def _many_filters(ids: List[Any]) -> Dict[str, Any]:
+    return {"id": _supabase_client.in_filter(dict.fromkeys(str(i) for i in ids))}
+
+
+def _select(columns: Optional[Sequence[str]]) -> str:
+    # Proyección de PostgREST: `select=id,name,price` en lugar de `*`
+    return ",".join(columns) if columns else "*"
+
+
+def _fts_query(query: str) -> Optional[str]:
+    # Cada término como prefijo: "capit americ" -> capit:* & americ:*
+    tokens = search.tokenize(query)
+    if not tokens:
+        return None
+    return " & ".join(f"{t}:*" for t in tokens)
+
+
+def _chunks(rows: List[Dict[str, Any]], size: int):
+    for start in range(0, len(rows), max(size, 1)):
+        yield start, rows[start:start + size]
+
+
+def _error_detail(exc: Exception) -> str:
+    response = getattr(exc, "response", None)
+    if response is not None:
+        return f"{response.status_code}: {response.text[:200]}"
+    return f"{type(exc).__name__}: {exc}"
+
+
+def _chunk_errors(start: int, chunk: List[Dict[str, Any]], exc: Exception) -> List[Dict[str, Any]]:
+    detail = _error_detail(exc)
+    return [{"index": start + i, "detail": detail} for i in range(len(chunk))]
+
+
+def _page_filters(order_by: str, after: Optional[Tuple[Any, ...]], limit: Optional[int],
+                  where: Optional[Tuple[str, Any]],
+                  between: Optional[Tuple[str, Any, Any]] = None) -> Dict[str, Any]:
+    filters = _supabase_client.keyset_params(order_by, after, limit)
+    if where is not None:
+        filters[where[0]] = f"eq.{where[1]}"
+    if between is not None:
+        # `price=gte.10&price=lte.50`: la misma columna repetida se combina con AND
+        column, low, high = between
+        bounds = [f"{op}.{v}" for op, v in (("gte", low), ("lte", high)) if v is not None]
+        if bounds:
+            filters[column] = bounds if len(bounds) > 1 else bounds[0]
+    return filters
+
+
+# --- API síncrona ---
+
+def select_all(table: str, columns: Optional[Sequence[str]] = None) -> Optional[List[Dict[str, Any]]]:
+    """Todas las filas; `columns` limita las columnas devueltas (por defecto todas)."""
+    if _rest():
+        return _read(table, "all", (_select(columns),),
+                     lambda: _supabase_client.list_table(table, select=_select(columns)))
+    return _mem_select_all(table, columns)
 
 
 def select_one(table: str, id_value: Any) -> Optional[Dict[str, Any]]:
-    if _USE_SUPABASE and _use_supabase_rest and _supabase_client is not None:
-        try:
-            return _supabase_client.get_by_id(table, str(id_value))
-        except Exception:
-            return None
-    for row in _DATA.get(table, []):
-        # comparar IDs como strings para evitar mismatch int vs '1'
-        if str(row.get("id")) == str(id_value):
-            return dict(row)
-    return None
+    if _rest():
+        return _read(table, "one", (str(id_value),), lambda: _supabase_client.get_by_id(table, str(id_value)))
+    return _mem_select_one(table, id_value)
+
+
+def select_many(table: str, ids: List[Any],
+                columns: Optional[Sequence[str]] = None) -> Optional[List[Optional[Dict[str, Any]]]]:
+    """Varias filas por id en una sola consulta.
+
+    Devuelve una fila por cada id pedido, en el mismo orden, con `None` para
+    los ids que no existen (o `None` entero si falla la consulta).
+    """
+    if not ids:
+        return []
+    if _rest():
+        # con proyección el id hace falta para volver a ordenar
+        select = _select(tuple(dict.fromkeys(("id",) + tuple(columns))) if columns else None)
+        return _align(ids, _read(table, "many", (tuple(str(i) for i in ids), select),
+                                 lambda: _supabase_client.list_table(table, filters=_many_filters(ids), select=select)))
+    return _mem_select_many(table, ids, columns)
 
 
 def insert(table: str, payload: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
-    if _USE_SUPABASE and _use_supabase_rest and _supabase_client is not None:
+    if _rest():
         try:
             res = _supabase_client.insert(table, payload)
-            return [res] if res else None
-        except Exception:
+        except Exception as exc:
+            metrics.db_error(table, "insert", exc)
+            if _maybe_written(exc):
+                _after_write(table)
             return None
-    obj = dict(payload)
-    obj["id"] = _next_id(table)
-    _DATA.setdefault(table, []).append(obj)
-    return [obj]
+        _after_write(table)
+        return _changed(table, "insert", [res] if res else None)
+    return _changed(table, "insert", _mem_write(table, _mem_insert, payload))
 
 
 def update(table: str, id_value: Any, payload: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
-    if _USE_SUPABASE and _use_supabase_rest and _supabase_client is not None:
+    if _rest():
         try:
             res = _supabase_client.update(table, str(id_value), payload)
-            return [res] if res else None
-        except Exception:
+        except Exception as exc:
+            metrics.db_error(table, "update", exc)
+            if _maybe_written(exc):
+                _after_write(table)
             return None
-    rows = _DATA.get(table, [])
-    for i, row in enumerate(rows):
-        if str(row.get("id")) == str(id_value):
-            updated = dict(row)
-            updated.update(payload)
-            rows[i] = updated
-            return [updated]
-    return None
+        _after_write(table)
+        return _changed(table, "update", [res] if res else None)
+    return _changed(table, "update", _mem_write(table, _mem_update, id_value, payload))
 
 
 def delete(table: str, id_value: Any) -> Optional[List[Dict[str, Any]]]:
-    if _USE_SUPABASE and _use_supabase_rest and _supabase_client is not None:
+    if _rest():
         try:
             ok = _supabase_client.delete(table, str(id_value))
-            return [{}] if ok else None
-        except Exception:
+        except Exception as exc:
+            metrics.db_error(table, "delete", exc)
+            if _maybe_written(exc):
+                _after_write(table)
+            return None
+        _after_write(table)
+        if ok:
+            _changed(table, "delete", [{"id": id_value}])
+        return [{}] if ok else None
+    return _changed(table, "delete", _mem_write(table, _mem_delete, id_value))
+
+
+def insert_many(table: str, rows: List[Dict[str, Any]], upsert: bool = False,
+                chunk_size: Optional[int] = None) -> BulkResult:
+    """Inserta `rows` en lotes de `chunk_size` (una petición por lote).
+
+    Con `upsert=True` las filas con `id` existente se actualizan (PostgREST
+    `resolution=merge-duplicates`). Si un lote falla, todas sus filas se
+    reportan en la lista de errores como `{"index": i, "detail": ...}`.
+    """
+    written: List[Dict[str, Any]] = []
+    errors: List[Dict[str, Any]] = []
+    if not rows:
+        return written, errors
+    if _rest():
+        touched = False
+        try:
+            for start, chunk in _chunks(rows, chunk_size or BULK_CHUNK_SIZE):
+                try:
+                    written.extend(_supabase_client.insert_many(table, chunk, upsert=upsert))
+                    touched = True
+                except Exception as exc:
+                    metrics.db_error(table, "insert_many", exc)
+                    errors.extend(_chunk_errors(start, chunk, exc))
+                    touched = touched or _maybe_written(exc)
+        finally:
+            # también si se cancela a mitad: los lotes ya enviados sí se escribieron
+            if touched:
+                _after_write(table)
+        return _changed(table, "upsert" if upsert else "insert", written), errors
+    return _changed(table, "upsert" if upsert else "insert", _mem_write(table, _mem_insert_many, rows, upsert)), errors
+
+
+def select_where(table: str, column: str, value: Any,
+                 columns: Optional[Sequence[str]] = None) -> Optional[List[Dict[str, Any]]]:
+    if _rest():
+        return _read(table, "where", (column, str(value), _select(columns)),
+                     lambda: _supabase_client.list_table(table, filters={column: f"eq.{value}"},
+                                                         select=_select(columns)))
+    return _mem_select_where(table, column, value, columns)
+
+
+def select_limit(table: str, limit: int = 10,
+                 columns: Optional[Sequence[str]] = None) -> Optional[List[Dict[str, Any]]]:
+    if _rest():
+        # PostgREST soporta limit en params
+        return _read(table, "limit", (limit, _select(columns)),
+                     lambda: _supabase_client.list_table(table, select=_select(columns),
+                                                         filters={"limit": str(limit)}))
+    return _mem_select_limit(table, limit, columns)
+
+
+def select_page(
+    table: str,
+    order_by: str = "id",
+    after: Optional[Tuple[Any, ...]] = None,
+    limit: Optional[int] = None,
+    where: Optional[Tuple[str, Any]] = None,
+    count: Optional[str] = None,
+    columns: Optional[Sequence[str]] = None,
+    between: Optional[Tuple[str, Any, Any]] = None,
+) -> Optional[Tuple[List[Dict[str, Any]], Optional[int]]]:
+    """Página keyset ordenada por `(order_by, id)`.
+
+    `after` es `(valor, id)` de la última fila entregada (o `(id,)` si se
+    ordena por id); `where` un filtro de igualdad `(columna, valor)`;
+    `between` un rango `(columna, mínimo, máximo)` con extremos incluidos
+    (`None` = sin ese extremo; en memoria usa el índice ordenado de la
+    columna); `count` ("exact"/"estimated") pide además el total; `columns`
+    limita las columnas devueltas. Devuelve `(filas, total)`.
+    """
+    if _rest():
+        return _read(table, "page", (order_by, after, limit, where, count, _select(columns), between),
+                     lambda: _supabase_client.list_page(table, filters=_page_filters(order_by, after, limit, where,
+                                                                                     between),
+                                                        select=_select(columns), count=count))
+    return _mem_select_page(table, order_by, after, limit, where, count, columns, between)
+
+
+def count_rows(table: str) -> Optional[int]:
+    """Número de filas de `table` sin leerlas (`None` si falla la consulta)."""
+    if _rest():
+        try:
+            return _supabase_client.count(table)
+        except Exception as exc:
+            metrics.db_error(table, "count", exc)
+            return None
+    t = _DATA.get(table)
+    return len(t) if t is not None else 0
+
+
+def category_slug(category_id: Any) -> Optional[str]:
+    """Slug de la categoría `category_id` (`None` si no existe) sin consultar por petición."""
+    if not _rest():
+        return _slug_of(_mem_select_one("categories", category_id))
+    key = _slug_key()
+    slugs = _SLUGS["map"]
+    if _SLUGS["key"] != key:
+        try:
+            slugs = _set_slugs(key, _supabase_client.list_table("categories", select="id,slug,name"))
+        except Exception as exc:
+            metrics.db_error("categories", "slugs", exc)  # seguimos con el mapa anterior
+    return slugs.get(str(category_id))
+
+
+def search_text(table: str, query: str, limit: int = 20) -> Optional[List[Dict[str, Any]]]:
+    """Búsqueda por nombre/descripción sin acentos y con prefijos, ordenada por relevancia.
+
+    En Supabase usa la función `search_<tabla>` (ver `supabase_setup.sql`),
+    que ordena por `ts_rank` en el servidor antes de aplicar `limit`.
+    """
+    if _rest():
+        tsquery = _fts_query(query)
+        if tsquery is None:
+            return []
+        return _read(table, "search", (query, limit), lambda: _supabase_client.search(table, tsquery, limit))
+    return _mem_search(table, query, limit)
+
+
+# --- API async (misma semántica que la síncrona) ---
+
+async def aselect_all(table: str, columns: Optional[Sequence[str]] = None) -> Optional[List[Dict[str, Any]]]:
+    if _rest():
+        return await _aread(table, "all", (_select(columns),),
+                            lambda: _supabase_client.alist_table(table, select=_select(columns)))
+    return _mem_select_all(table, columns)
+
+
+async def aselect_one(table: str, id_value: Any) -> Optional[Dict[str, Any]]:
+    if _rest():
+        return await _aread(table, "one", (str(id_value),), lambda: _supabase_client.aget_by_id(table, str(id_value)))
+    return _mem_select_one(table, id_value)
+
+
+async def aselect_many(table: str, ids: List[Any],
+                       columns: Optional[Sequence[str]] = None) -> Optional[List[Optional[Dict[str, Any]]]]:
+    if not ids:
+        return []
+    if _rest():
+        select = _select(tuple(dict.fromkeys(("id",) + tuple(columns))) if columns else None)
+        return _align(ids, await _aread(table, "many", (tuple(str(i) for i in ids), select),
+                                        lambda: _supabase_client.alist_table(table, filters=_many_filters(ids),
+                                                                             select=select)))
+    return _mem_select_many(table, ids, columns)
+
+
+async def ainsert(table: str, payload: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+    if _rest():
+        try:
+            res = await _supabase_client.ainsert(table, payload)
+        except Exception as exc:
+            metrics.db_error(table, "insert", exc)
+            if _maybe_written(exc):
+                _after_write(table)
             return None
-    rows = _DATA.get(table, [])
-    for i, row in enumerate(rows):
-        if str(row.get("id")) == str(id_value):
-            removed = rows.pop(i)
-            return [removed]
-    return None
+        _after_write(table)
+        return _changed(table, "insert", [res] if res else None)
+    return _changed(table, "insert", _mem_write(table, _mem_insert, payload))
 
 
-def select_where(table: str, column: str, value: Any) -> Optional[List[Dict[str, Any]]]:
-    if _USE_SUPABASE and _use_supabase_rest and _supabase_client is not None:
+async def aupdate(table: str, id_value: Any, payload: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+    if _rest():
         try:
-            return _supabase_client.list_table(table, filters={column: f"eq.{value}"}, select="*")
-        except Exception:
+            res = await _supabase_client.aupdate(table, str(id_value), payload)
+        except Exception as exc:
+            metrics.db_error(table, "update", exc)
+            if _maybe_written(exc):
+                _after_write(table)
             return None
-    return [r for r in _DATA.get(table, []) if r.get(column) == value]
+        _after_write(table)
+        return _changed(table, "update", [res] if res else None)
+    return _changed(table, "update", _mem_write(table, _mem_update, id_value, payload))
+
+
+async def adelete(table: str, id_value: Any) -> Optional[List[Dict[str, Any]]]:
+    if _rest():
+        try:
+            ok = await _supabase_client.adelete(table, str(id_value))
+        except Exception as exc:
+            metrics.db_error(table, "delete", exc)
+            if _maybe_written(exc):
+                _after_write(table)
+            return None
+        _after_write(table)
+        if ok:
+            _changed(table, "delete", [{"id": id_value}])
+        return [{}] if ok else None
+    return _changed(table, "delete", _mem_write(table, _mem_delete, id_value))
+
+
+async def ainsert_many(table: str, rows: List[Dict[str, Any]], upsert: bool = False,
+                       chunk_size: Optional[int] = None) -> BulkResult:
+    written: List[Dict[str, Any]] = []
+    errors: List[Dict[str, Any]] = []
+    if not rows:
+        return written, errors
+    if _rest():
+        touched = False
+        try:
+            for start, chunk in _chunks(rows, chunk_size or BULK_CHUNK_SIZE):
+                try:
+                    written.extend(await _supabase_client.ainsert_many(table, chunk, upsert=upsert))
+                    touched = True
+                except Exception as exc:
+                    metrics.db_error(table, "insert_many", exc)
+                    errors.extend(_chunk_errors(start, chunk, exc))
+                    touched = touched or _maybe_written(exc)
+        finally:
+            # también si se cancela a mitad: los lotes ya enviados sí se escribieron
+            if touched:
+                _after_write(table)
+        return _changed(table, "upsert" if upsert else "insert", written), errors
+    return _changed(table, "upsert" if upsert else "insert", _mem_write(table, _mem_insert_many, rows, upsert)), errors
 
 
-def select_limit(table: str, limit: int = 10) -> Optional[List[Dict[str, Any]]]:
-    if _USE_SUPABASE and _use_supabase_rest and _supabase_client is not None:
+async def aselect_where(table: str, column: str, value: Any,
+                        columns: Optional[Sequence[str]] = None) -> Optional[List[Dict[str, Any]]]:
+    if _rest():
+        return await _aread(table, "where", (column, str(value), _select(columns)),
+                            lambda: _supabase_client.alist_table(table, filters={column: f"eq.{value}"},
+                                                                 select=_select(columns)))
+    return _mem_select_where(table, column, value, columns)
+
+
+async def aselect_limit(table: str, limit: int = 10,
+                        columns: Optional[Sequence[str]] = None) -> Optional[List[Dict[str, Any]]]:
+    if _rest():
+        return await _aread(table, "limit", (limit, _select(columns)),
+                            lambda: _supabase_client.alist_table(table, select=_select(columns),
+                                                                 filters={"limit": str(limit)}))
+    return _mem_select_limit(table, limit, columns)
+
+
+async def aselect_page(
+    table: str,
+    order_by: str = "id",
+    after: Optional[Tuple[Any, ...]] = None,
+    limit: Optional[int] = None,
+    where: Optional[Tuple[str, Any]] = None,
+    count: Optional[str] = None,
+    columns: Optional[Sequence[str]] = None,
+    between: Optional[Tuple[str, Any, Any]] = None,
+) -> Optional[Tuple[List[Dict[str, Any]], Optional[int]]]:
+    if _rest():
+        return await _aread(table, "page", (order_by, after, limit, where, count, _select(columns), between),
+                            lambda: _supabase_client.alist_page(table, filters=_page_filters(order_by, after, limit,
+                                                                                             where, between),
+                                                                select=_select(columns), count=count))
+    return _mem_select_page(table, order_by, after, limit, where, count, columns, between)
+
+
+async def acount_rows(table: str) -> Optional[int]:
+    if _rest():
         try:
-            # PostgREST soporta limit en params
-            return _supabase_client.list_table(table, select="*", filters={"limit": str(limit)})
-        except Exception:
+            return await _supabase_client.acount(table)
+        except Exception as exc:
+            metrics.db_error(table, "count", exc)
             return None
-    return list(_DATA.get(table, []))[:limit]
+    t = _DATA.get(table)
+    return len(t) if t is not None else 0
+
+
+async def acategory_slug(category_id: Any) -> Optional[str]:
+    if not _rest():
+        return _slug_of(_mem_select_one("categories", category_id))
+    key = _slug_key()
+    slugs = _SLUGS["map"]
+    if _SLUGS["key"] != key:
+        # una sola carga aunque lleguen muchas peticiones a la vez
+        pending = _SLUGS["pending"]
+        if pending is None or pending.get_loop() is not asyncio.get_running_loop():
+            pending = _SLUGS["pending"] = asyncio.ensure_future(
+                _supabase_client.alist_table("categories", select="id,slug,name"))
+        try:
+            slugs = _set_slugs(key, await asyncio.shield(pending))
+        except Exception as exc:
+            metrics.db_error("categories", "slugs", exc)  # seguimos con el mapa anterior
+        finally:
+            if _SLUGS["pending"] is pending:
+                _SLUGS["pending"] = None
+    return slugs.get(str(category_id))
+
+
+async def asearch_text(table: str, query: str, limit: int = 20) -> Optional[List[Dict[str, Any]]]:
+    if _rest():
+        tsquery = _fts_query(query)
+        if tsquery is None:
+            return []
+        return await _aread(table, "search", (query, limit), lambda: _supabase_client.asearch(table, tsquery, limit))
+    return _mem_search(table, query, limit)
+
+
+async def aiter_pages(table: str, page_size: int = 1000) -> AsyncIterator[List[Dict[str, Any]]]:
+    """Recorre la tabla entera por páginas keyset (orden por id).
+
+    No pasa por la caché de lecturas: pensado para exportaciones, donde sólo
+    una página está en memoria a la vez.
+    """
+    after: Optional[Tuple[Any, ...]] = None
+    while True:
+        if _rest():
+            rows, _ = await _supabase_client.alist_page(table, filters=_page_filters("id", after, page_size, None))
+        else:
+            rows, _ = _mem_select_page(table, "id", after, page_size, None, None)
+        if not rows:
+            return
+        yield rows
+        if len(rows) < page_size:
+            return
+        after = (rows[-1].get("id"),)
 
 
 def seed_sample_data(force: bool = False) -> Dict[str, int]:
     """Inserta categorías y productos de ejemplo.
 
     Si Supabase está configurado intentará insertar allí; si no, usa el
-    fallback en memoria. Por defecto no vuelve a sembrar si ya hay datos,
-    a menos que `force=True`.
-    Devuelve un dict con conteos insertados.
+    fallback en memoria. Por defecto no vuelve a sembrar si ya hay datos
+    (una sola consulta de conteo, sin leer las tablas), a menos que
+    `force=True`.
+    Devuelve un dict con conteos insertados (o, si ya había datos, el
+    número de categorías existentes).
     """
     result = {"categories": 0, "products": 0}
-    existing = select_all("categories") or []
+    existing = count_rows("categories")
+    if existing is None and not force:
+        raise RuntimeError("No se pudo comprobar si ya hay datos en categories")
     if existing and not force:
-        return {"categories": len(existing), "products": len(select_all("products") or [])}
+        return {"categories": existing}
 
     # Usamos 4 categorías principales y añadimos slug para compatibilidad
     cats = [
@@ -150,11 +1233,7 @@ def seed_sample_data(force: bool = False) -> Dict[str, int]:
         {"name": "Guardianes Villanos", "slug": "guardianes-villanos", "description": "Enemigos de los Guardianes"},
     ]
 
-    inserted_categories = []
-    for c in cats:
-        res = insert("categories", c)
-        if res:
-            inserted_categories.extend(res)
+    inserted_categories, _ = insert_many("categories", cats)
 
     result["categories"] = len(inserted_categories)
 
@@ -196,11 +1275,7 @@ def seed_sample_data(force: bool = False) -> Dict[str, int]:
         {"name": "Thanos (enemigo cósmico)", "description": "Amenaza cósmica recurrente", "price": 4599, "category": name_to_slug.get("Guardianes Villanos")},
     ]
 
-    inserted_products = []
-    for p in products:
-        res = insert("products", p)
-        if res:
-            inserted_products.extend(res)
+    inserted_products, _ = insert_many("products", products)
 
     result["products"] = len(inserted_products)
 
@@ -209,10 +1284,6 @@ def seed_sample_data(force: bool = False) -> Dict[str, int]:
         {"id": "00000000-0000-0000-0000-000000000001", "email": "user@example.com", "pass": "userpass", "role": "user"},
         {"id": "00000000-0000-0000-0000-000000000002", "email": "admin@example.com", "pass": "adminpass", "role": "admin"},
     ]
-    inserted_users = []
-    for u in example_users:
-        res = insert("app_users", u)
-        if res:
-            inserted_users.extend(res)
+    inserted_users, _ = insert_many("app_users", example_users)
     result["app_users"] = len(inserted_users)
     return result
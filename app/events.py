@@ -0,0 +1,195 @@
+"""Feed de cambios del catálogo por Server-Sent Events (`GET /events/catalog`).
+
+`app.db` avisa a sus oyentes de cada escritura; aquí se publican las de
+`products` y `categories` como eventos con un delta compacto, proyectado a
+los campos públicos del esquema:
+
+    id: 5f2a91c0-42
+    event: change
+    data: {"table":"products","op":"update","id":3,"row":{...}}
+
+`op` es `insert`, `update`, `upsert` o `delete` (sin `row`). El cliente
+sustituye o quita la fila por id y no vuelve a descargar la lista.
+
+- Cada suscriptor tiene un buffer acotado (`EVENTS_QUEUE_SIZE`). Si un
+  cliente lento lo llena, se vacía y recibe `event: resync`: debe volver a
+  pedir las listas. Así no frena a los demás ni crece sin límite.
+- Los últimos `EVENTS_BUFFER` cambios se guardan en un buffer circular. Un
+  cliente que se reconecta con `Last-Event-ID` recibe los que se perdió, o
+  `resync` si ya no están o si el id es de otro proceso o arranque.
+- Una escritura de más de `EVENTS_MAX_ROWS` filas (altas masivas,
+  importación) se publica como un único `resync` de esa tabla, igual que
+  una recarga completa del almacén de MEMSTORE_DIR.
+
+Cada worker publica lo que ve: sus escrituras y, con `MEMSTORE_SHARED`, las
+de los demás workers. Con Supabase sólo ve las hechas desde este proceso.
+"""
+import asyncio
+import os
+import secrets
+import threading
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Set, Tuple
+
+from . import db, respcache
+from .schemas import Category, Product
+
+EVENTS_BUFFER = int(os.getenv("EVENTS_BUFFER", "1024"))
+EVENTS_QUEUE_SIZE = int(os.getenv("EVENTS_QUEUE_SIZE", "256"))
+EVENTS_MAX_ROWS = int(os.getenv("EVENTS_MAX_ROWS", "100"))
+EVENTS_MAX_SUBSCRIBERS = int(os.getenv("EVENTS_MAX_SUBSCRIBERS", "1000"))
+# Comentario periódico para que proxies y navegadores no den la conexión por muerta
+EVENTS_KEEPALIVE = float(os.getenv("EVENTS_KEEPALIVE", "15"))
+# Espera que se sugiere al navegador antes de reconectar (ms)
+EVENTS_RETRY_MS = int(os.getenv("EVENTS_RETRY_MS", "3000"))
+
+TABLES: Dict[str, type] = {"products": Product, "categories": Category}
+
+
+class TooManySubscribers(Exception):
+    pass
+
+
+def _resync(reason: str, table: Optional[str] = None) -> bytes:
+    data = {"reason": reason} if table is None else {"reason": reason, "table": table}
+    return b"event: resync\ndata: " + respcache.dumps(data) + b"\n\n"
+
+
+_OVERFLOW = _resync("overflow")
+_EXPIRED = _resync("expired")
+_KEEPALIVE = b": keepalive\n\n"
+
+
+class Subscriber:
+    """Buffer de eventos de una conexión; se llena desde cualquier hilo vía su loop."""
+
+    __slots__ = ("loop", "pending", "wake", "size")
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, size: int) -> None:
+        self.loop = loop
+        self.pending: Deque[bytes] = deque()
+        self.wake = asyncio.Event()
+        self.size = size
+
+    def push(self, frame: bytes) -> None:
+        if len(self.pending) >= self.size:
+            # cliente demasiado lento: en vez de encolar sin fin, que se resincronice
+            self.pending.clear()
+            self.pending.append(_OVERFLOW)
+            HUB.stats["overflows"] += 1
+        self.pending.append(frame)
+        self.wake.set()
+
+
+class Hub:
+    """Reparto en proceso de los cambios a los suscriptores, con buffer circular."""
+
+    def __init__(self, buffer: int = EVENTS_BUFFER, queue_size: int = EVENTS_QUEUE_SIZE,
+                 max_subscribers: int = EVENTS_MAX_SUBSCRIBERS) -> None:
+        # distingue los ids de este proceso/arranque de los de cualquier otro
+        self.epoch = secrets.token_hex(4)
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self.stats: Dict[str, int] = {"published": 0, "overflows": 0, "resumed": 0, "expired": 0}
+        self._seq = 0
+        self._ring: Deque[Tuple[int, bytes]] = deque(maxlen=buffer)
+        self._subs: Set[Subscriber] = set()
+        self._lock = threading.Lock()
+
+    def _frames(self, table: str, op: str, rows: List[Dict[str, Any]]) -> List[bytes]:
+        if op == "reload":
+            return [_resync("reload", table)]
+        if len(rows) > EVENTS_MAX_ROWS:
+            return [_resync("bulk", table)]
+        if op == "delete":
+            deltas = [{"table": table, "op": op, "id": r.get("id")} for r in rows]
+        else:
+            projected = respcache.project(TABLES[table], rows)
+            deltas = [{"table": table, "op": op, "id": r.get("id"), "row": p} for r, p in zip(rows, projected)]
+        return [respcache.dumps(d) for d in deltas]
+
+    def publish(self, table: str, op: str, rows: List[Dict[str, Any]]) -> None:
+        """Oyente de `db`: publica las escrituras de las tablas de `TABLES`."""
+        if table not in TABLES:
+            return
+        frames = self._frames(table, op, rows)
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        with self._lock:
+            for data in frames:
+                self._seq += 1
+                if data.startswith(b"event:"):
+                    frame = f"id: {self.epoch}-{self._seq}\n".encode() + data
+                else:
+                    frame = f"id: {self.epoch}-{self._seq}\nevent: change\ndata: ".encode() + data + b"\n\n"
+                self._ring.append((self._seq, frame))
+                self.stats["published"] += 1
+                # con el lock tomado: cada suscriptor recibe los eventos en orden
+                for sub in list(self._subs):
+                    if sub.loop is running:
+                        sub.push(frame)
+                        continue
+                    try:
+                        sub.loop.call_soon_threadsafe(sub.push, frame)
+                    except RuntimeError:  # su event loop ya se cerró
+                        self._subs.discard(sub)
+
+    def _backlog(self, last_event_id: Optional[str]) -> List[bytes]:
+        if not last_event_id:
+            return []
+        epoch, _, seq = last_event_id.strip().rpartition("-")
+        oldest = self._ring[0][0] if self._ring else self._seq + 1
+        if epoch != self.epoch or not seq.isdigit() or int(seq) > self._seq or int(seq) < oldest - 1:
+            self.stats["expired"] += 1
+            return [_EXPIRED]
+        self.stats["resumed"] += 1
+        return [frame for n, frame in self._ring if n > int(seq)]
+
+    def subscribe(self, last_event_id: Optional[str] = None) -> Tuple[Subscriber, List[bytes]]:
+        """Alta de un suscriptor en el loop actual: (suscriptor, eventos pendientes desde `last_event_id`)."""
+        sub = Subscriber(asyncio.get_running_loop(), self.queue_size)
+        with self._lock:
+            if len(self._subs) >= self.max_subscribers:
+                raise TooManySubscribers()
+            # a la vez que el alta: ni huecos ni repetidos entre el buffer y lo nuevo
+            backlog = self._backlog(last_event_id)
+            self._subs.add(sub)
+        return sub, backlog
+
+    def unsubscribe(self, sub: Subscriber) -> None:
+        with self._lock:
+            self._subs.discard(sub)
+
+    def subscribers(self) -> int:
+        return len(self._subs)
+
+    def full(self) -> bool:
+        return len(self._subs) >= self.max_subscribers
+
+    async def stream(self, last_event_id: Optional[str] = None) -> AsyncIterator[bytes]:
+        """Cuerpo de una respuesta `text/event-stream`: el alta se hace al
+        empezar a enviarla y la baja al terminar (también si el cliente se va)."""
+        try:
+            sub, backlog = self.subscribe(last_event_id)
+        except TooManySubscribers:
+            return
+        try:
+            yield f"retry: {EVENTS_RETRY_MS}\n\n".encode()
+            for frame in backlog:
+                yield frame
+            while True:
+                while sub.pending:
+                    yield sub.pending.popleft()
+                sub.wake.clear()
+                try:
+                    await asyncio.wait_for(sub.wake.wait(), EVENTS_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield _KEEPALIVE
+        finally:
+            self.unsubscribe(sub)
+
+
+HUB = Hub()
+db.add_listener(HUB.publish)
@@ -0,0 +1,191 @@
+"""Facetas del catálogo (`GET /facets`): productos por categoría e histograma de precios.
+
+Los agregados no se calculan en cada petición. Se construyen una vez con una
+sola lectura de `id, category, price` y después se mantienen con cada
+escritura, como oyente de `app.db`: un alta suma uno a su categoría y a su
+tramo de precio, una baja resta y una modificación mueve la fila de tramo o
+de categoría. Para poder restar se guarda por id la pareja
+`(categoría, precio)` vista por última vez, que es lo único que ocupa
+memoria proporcional al catálogo.
+
+Aplicar un cambio es idempotente (el último valor de cada id gana), así que
+los cambios que llegan mientras se construye se guardan y se vuelven a
+aplicar sobre el resultado: no se pierde ninguno aunque la lectura tarde.
+
+En modo memoria (también con `MEMSTORE_SHARED`) este proceso ve todas las
+escrituras y los agregados no se reconstruyen nunca, salvo si el almacén se
+recarga entero. Con Supabase sólo ve las hechas desde este proceso, así que
+se reconstruyen cada `FACETS_TTL` segundos, como la caché de lecturas.
+
+Los tramos de precio se configuran con `FACETS_PRICE_BUCKETS` (límites
+inferiores en orden; el último tramo no tiene techo).
+"""
+import os
+import threading
+import time
+from bisect import bisect_right
+from typing import Any, Dict, List, Optional, Tuple
+
+from . import db
+
+FACETS_PRICE_BUCKETS: Tuple[float, ...] = tuple(
+    float(x) for x in os.getenv("FACETS_PRICE_BUCKETS", "0,1000,2000,3000,4000,5000").split(",") if x.strip()
+)
+FACETS_TTL = float(os.getenv("FACETS_TTL", "60"))
+
+COLUMNS = ("id", "category", "price")
+
+
+def _price(v: Any) -> Optional[float]:
+    if isinstance(v, (int, float)) and not isinstance(v, bool):
+        return v
+    return None
+
+
+class Facets:
+    """Recuentos por categoría y por tramo de precio (global y por categoría)."""
+
+    def __init__(self, edges: Tuple[float, ...] = FACETS_PRICE_BUCKETS) -> None:
+        self.edges = edges
+        # id -> (categoría, precio) tal como está contado
+        self._rows: Dict[str, Tuple[Any, Optional[float]]] = {}
+        self._counts: Dict[Any, int] = {}
+        # categoría -> recuento por tramo; la clave None acumula todas
+        self._hist: Dict[Any, List[int]] = {}
+        self._built_at: Optional[float] = None
+        # cambios recibidos mientras hay reconstrucciones en curso
+        self._pending: Optional[List[Tuple[str, List[Dict[str, Any]]]]] = None
+        self._building = 0
+        self._lock = threading.Lock()
+        self.stats: Dict[str, int] = {"builds": 0, "changes": 0}
+
+    # --- mantenimiento incremental ---
+
+    def _bucket(self, price: Optional[float]) -> int:
+        # -1: sin precio o por debajo del primer tramo (no cuenta en el histograma)
+        return -1 if price is None else bisect_right(self.edges, price) - 1
+
+    def _add(self, category: Any, price: Optional[float], n: int) -> None:
+        count = self._counts.get(category, 0) + n
+        if count:
+            self._counts[category] = count
+        else:
+            del self._counts[category]
+        bucket = self._bucket(price)
+        if bucket >= 0:
+            for key in (None, category):
+                hist = self._hist.get(key)
+                if hist is None:
+                    hist = self._hist[key] = [0] * len(self.edges)
+                hist[bucket] += n
+
+    def _set(self, row: Dict[str, Any]) -> None:
+        key = str(row.get("id"))
+        old = self._rows.get(key)
+        if old is not None:
+            self._add(old[0], old[1], -1)
+        # una fila parcial conserva lo que no trae
+        category = row["category"] if "category" in row or old is None else old[0]
+        price = _price(row["price"]) if "price" in row or old is None else old[1]
+        self._rows[key] = (category, price)
+        self._add(category, price, 1)
+
+    def _drop(self, row: Dict[str, Any]) -> None:
+        old = self._rows.pop(str(row.get("id")), None)
+        if old is not None:
+            self._add(old[0], old[1], -1)
+
+    def _apply(self, op: str, rows: List[Dict[str, Any]]) -> None:
+        for row in rows:
+            if op == "delete":
+                self._drop(row)
+            else:
+                self._set(row)
+
+    def apply(self, table: str, op: str, rows: List[Dict[str, Any]]) -> None:
+        """Oyente de `db`: aplica las escrituras de `products`."""
+        if table != "products":
+            return
+        with self._lock:
+            if op == "reload":
+                self._built_at = None
+                return
+            self.stats["changes"] += len(rows)
+            if self._pending is not None:
+                self._pending.append((op, rows))
+            if self._built_at is not None:
+                self._apply(op, rows)
+
+    # --- construcción ---
+
+    def _stale(self) -> bool:
+        if self._built_at is None:
+            return True
+        return db.backend() == "supabase" and time.monotonic() - self._built_at > FACETS_TTL
+
+    def _begin(self) -> None:
+        with self._lock:
+            self._building += 1
+            if self._pending is None:
+                self._pending = []
+
+    def _finish(self, rows: Optional[List[Dict[str, Any]]]) -> bool:
+        with self._lock:
+            if rows is not None:
+                self._rows, self._counts, self._hist = {}, {}, {}
+                for row in rows:
+                    self._set(row)
+                # lo escrito durante la lectura, esté o no en `rows`
+                for op, changed in self._pending or ():
+                    self._apply(op, changed)
+                self._built_at = time.monotonic()
+                self.stats["builds"] += 1
+            self._building -= 1
+            if not self._building:
+                self._pending = None
+            return self._built_at is not None
+
+    def ensure(self) -> bool:
+        """Construye los agregados si hace falta. False si no se pudieron leer."""
+        if not self._stale():
+            return True
+        self._begin()
+        rows = None
+        try:
+            rows = db.select_all("products", COLUMNS)
+        finally:
+            built = self._finish(rows)
+        return built
+
+    async def aensure(self) -> bool:
+        if not self._stale():
+            return True
+        self._begin()
+        rows = None
+        try:
+            rows = await db.aselect_all("products", COLUMNS)
+        finally:
+            built = self._finish(rows)
+        return built
+
+    # --- lectura ---
+
+    def snapshot(self, category: Optional[str] = None) -> Dict[str, Any]:
+        """Recuentos por categoría y el histograma de precios (de `category` o de todo)."""
+        edges = self.edges
+        with self._lock:
+            counts = sorted(((c, n) for c, n in self._counts.items() if c is not None), key=lambda x: (-x[1], str(x[0])))
+            total = self._counts.get(category, 0) if category is not None else len(self._rows)
+            hist = list(self._hist.get(category) or [0] * len(edges))
+        return {
+            "total": total,
+            "categories": [{"category": c, "count": n} for c, n in counts],
+            "price": [
+                {"min": lo, "max": edges[i + 1] if i + 1 < len(edges) else None, "count": n}
+                for i, (lo, n) in enumerate(zip(edges, hist))
+            ],
+        }
+
+
+FACETS = Facets()
+db.add_listener(FACETS.apply)
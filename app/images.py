@@ -0,0 +1,310 @@
+"""Imágenes de producto: originales por contenido y variantes bajo demanda.
+
+`POST /images` y `PUT /products/{id}/image` (admin) reciben los bytes de la
+imagen como cuerpo de la petición (JPEG, PNG, WebP o GIF). Se validan y se
+calcula su sha256 en un hilo, y el original se guarda una sola vez por
+contenido en `IMAGES_DIR/originals/<ab>/<sha256>`: volver a subir la misma
+imagen, o usarla en otro producto, no ocupa más. Su URL pública es
+`/images/<sha256>`.
+
+Las variantes `/images/<sha256>/<tamaño>.<webp|jpg>` (tamaños en `SIZES`)
+se generan la primera vez que se piden, en un `ProcessPoolExecutor`:
+decodificar y redimensionar es CPU pura y en el event loop (o en hilos, por
+el GIL) frenaría al resto de peticiones. Si varias peticiones piden a la vez
+la misma variante, esperan a una única generación. Se guardan en
+`IMAGES_DIR/variants/` hasta `IMAGES_CACHE_BYTES`; al pasarse se borran las
+usadas hace más tiempo (LRU), que se regenerarán desde el original si se
+vuelven a pedir. El orden de uso se lleva en memoria; al arrancar se parte
+del orden de creación de los ficheros. Cada worker lleva su propia cuenta
+del límite.
+
+Como las URLs incluyen el hash del contenido, originales y variantes se
+sirven con `Cache-Control: immutable`.
+
+Pillow es opcional: sin él las imágenes se validan sólo por la firma del
+fichero y las variantes devuelven el original.
+"""
+import asyncio
+import hashlib
+import io
+import multiprocessing
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional, Tuple
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # opcional: sin variantes redimensionadas
+    Image = None
+    ImageOps = None
+
+IMAGES_DIR = os.getenv("IMAGES_DIR", ".images")
+# Tamaño máximo de una imagen subida
+IMAGES_MAX_BYTES = int(os.getenv("IMAGES_MAX_BYTES", str(10 * 1024 * 1024)))
+# Límite de disco de las variantes generadas (los originales no cuentan)
+IMAGES_CACHE_BYTES = int(os.getenv("IMAGES_CACHE_BYTES", str(256 * 1024 * 1024)))
+# Procesos que generan variantes; 0 = en el pool de hilos del event loop
+IMAGES_WORKERS = int(os.getenv("IMAGES_WORKERS", str(os.cpu_count() or 1)))
+
+# nombre -> lado mayor en píxeles (nunca se amplía)
+SIZES: Dict[str, int] = {"cart": 160, "grid": 480, "detail": 1200}
+# extensión de la URL -> (formato de Pillow, Content-Type)
+FORMATS: Dict[str, Tuple[str, str]] = {"webp": ("WEBP", "image/webp"), "jpg": ("JPEG", "image/jpeg")}
+
+_MAGIC = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+)
+_DIGEST = re.compile(r"[0-9a-f]{64}")
+
+
+class InvalidImage(ValueError):
+    pass
+
+
+def content_type(data: bytes) -> Optional[str]:
+    """Tipo de imagen según la firma de los primeros bytes (None si no es una soportada)."""
+    for magic, ctype in _MAGIC:
+        if data.startswith(magic):
+            return ctype
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+def is_digest(value: str) -> bool:
+    return _DIGEST.fullmatch(value) is not None
+
+
+def url(digest: str) -> str:
+    return f"/images/{digest}"
+
+
+def original_path(digest: str, directory: str = IMAGES_DIR) -> str:
+    return os.path.join(directory, "originals", digest[:2], digest)
+
+
+def variant_path(digest: str, size: str, ext: str, directory: str = IMAGES_DIR) -> str:
+    return os.path.join(directory, "variants", digest[:2], f"{digest}-{size}.{ext}")
+
+
+def _read(path: str) -> Optional[bytes]:
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def _write(path: str, data: bytes) -> None:
+    # fichero temporal + rename: nadie lee nunca una imagen a medias
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+# --- trabajo fuera del event loop (funciones de módulo: `render` se envía por pickle al pool) ---
+
+def ingest(data: bytes, directory: str = IMAGES_DIR) -> Dict[str, Any]:
+    """Valida `data`, lo guarda por su sha256 si no estaba y describe la imagen."""
+    ctype = content_type(data)
+    if ctype is None:
+        raise InvalidImage("formato no soportado: JPEG, PNG, WebP o GIF")
+    width = height = None
+    if Image is not None:
+        try:
+            with Image.open(io.BytesIO(data)) as im:
+                width, height = im.size
+                im.verify()
+        except Exception as exc:  # también DecompressionBombError (demasiados píxeles)
+            raise InvalidImage(f"imagen no válida: {exc}") from None
+    digest = hashlib.sha256(data).hexdigest()
+    path = original_path(digest, directory)
+    created = not os.path.exists(path)
+    if created:
+        _write(path, data)
+    return {"digest": digest, "content_type": ctype, "width": width, "height": height,
+            "bytes": len(data), "created": created}
+
+
+def render(src: str, dst: str, box: int, fmt: str) -> bytes:
+    """Reduce `src` para que quepa en `box`×`box`, lo codifica en `fmt` y lo guarda en `dst`."""
+    with Image.open(src) as im:
+        # JPEG: decodifica ya a 1/2, 1/4 o 1/8 si sobra resolución (mucho más rápido)
+        im.draft("RGB", (box, box))
+        im = ImageOps.exif_transpose(im)
+        im.thumbnail((box, box), Image.Resampling.LANCZOS)
+        alpha = im.mode in ("RGBA", "LA") or (im.mode == "P" and "transparency" in im.info)
+        if alpha and fmt == "WEBP":
+            im = im.convert("RGBA")
+        elif alpha:
+            # JPEG no tiene transparencia: sobre fondo blanco
+            rgba = im.convert("RGBA")
+            im = Image.new("RGB", rgba.size, (255, 255, 255))
+            im.paste(rgba, mask=rgba.getchannel("A"))
+        else:
+            im = im.convert("RGB")
+        out = io.BytesIO()
+        if fmt == "JPEG":
+            im.save(out, "JPEG", quality=82, optimize=True, progressive=True)
+        else:
+            im.save(out, "WEBP", quality=80, method=4)
+    data = out.getvalue()
+    _write(dst, data)
+    return data
+
+
+class Store:
+    """Originales y variantes en disco, con el pool de procesos y la LRU de variantes."""
+
+    def __init__(self, directory: str = IMAGES_DIR, cache_bytes: int = IMAGES_CACHE_BYTES,
+                 workers: int = IMAGES_WORKERS) -> None:
+        self.directory = directory
+        self.cache_bytes = cache_bytes
+        self.workers = workers
+        self.stats: Dict[str, int] = {"ingested": 0, "deduplicated": 0, "generated": 0, "hits": 0, "evictions": 0}
+        self._pool: Optional[ProcessPoolExecutor] = None
+        # ruta de variante -> bytes, de la usada hace más tiempo a la más reciente
+        self._lru: Optional["OrderedDict[str, int]"] = None
+        self._bytes = 0
+        self._inflight: Dict[str, "asyncio.Future[Optional[bytes]]"] = {}
+        self._lock = threading.Lock()
+
+    # --- pool de procesos ---
+
+    def _executor(self) -> Optional[ProcessPoolExecutor]:
+        if self.workers <= 0:
+            return None
+        with self._lock:
+            if self._pool is None:
+                # spawn: no heredar hilos ni conexiones abiertas del worker
+                self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            return self._pool
+
+    async def _run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        pool = self._executor()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(pool, fn, *args)
+        except BrokenProcessPool:
+            # un proceso murió (p. ej. sin memoria): la próxima vez se crea otro pool
+            with self._lock:
+                if self._pool is pool:
+                    self._pool = None
+            raise
+
+    def close(self) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    # --- LRU de variantes ---
+
+    def load(self) -> None:
+        """Recorre las variantes ya generadas (en orden de creación) para la LRU."""
+        entries = []
+        for root, _, files in os.walk(os.path.join(self.directory, "variants")):
+            for name in files:
+                if name.endswith(".tmp"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, path, st.st_size))
+        entries.sort()
+        with self._lock:
+            self._lru = OrderedDict((path, size) for _, path, size in entries)
+            self._bytes = sum(self._lru.values())
+        self._evict()
+
+    def _touch(self, path: str, size: int) -> None:
+        if self._lru is None:
+            self.load()
+        with self._lock:
+            if path in self._lru:
+                self._lru.move_to_end(path)
+                return
+            self._lru[path] = size
+            self._bytes += size
+        self._evict()
+
+    def _evict(self) -> None:
+        victims = []
+        with self._lock:
+            while self._bytes > self.cache_bytes and len(self._lru) > 1:
+                path, size = self._lru.popitem(last=False)
+                self._bytes -= size
+                victims.append(path)
+        for path in victims:
+            try:
+                os.remove(path)
+            except FileNotFoundError:  # ya la borró otro worker
+                pass
+            self.stats["evictions"] += 1
+
+    def cached_bytes(self) -> int:
+        return self._bytes
+
+    # --- API para los endpoints ---
+
+    async def ingest(self, data: bytes) -> Dict[str, Any]:
+        """Valida y guarda `data`. `InvalidImage` si no es una imagen.
+
+        En un hilo y no en el pool de procesos: sólo se lee la cabecera de la
+        imagen, y el hash y la escritura sueltan el GIL; copiar los bytes a
+        otro proceso costaría más que el trabajo.
+        """
+        info = await asyncio.to_thread(ingest, data, self.directory)
+        self.stats["ingested" if info["created"] else "deduplicated"] += 1
+        return info
+
+    async def original(self, digest: str) -> Optional[Tuple[bytes, str]]:
+        """(bytes, Content-Type) del original, o None si no existe."""
+        data = await asyncio.to_thread(_read, original_path(digest, self.directory))
+        if data is None:
+            return None
+        return data, content_type(data) or "application/octet-stream"
+
+    async def variant(self, digest: str, size: str, ext: str) -> Optional[bytes]:
+        """Bytes de la variante, generándola si hace falta (None si no hay original)."""
+        path = variant_path(digest, size, ext, self.directory)
+        data = await asyncio.to_thread(_read, path)
+        if data is not None:
+            self.stats["hits"] += 1
+            self._touch(path, len(data))
+            return data
+        task = self._inflight.get(path)
+        if task is None:
+            # en una tarea aparte: si el cliente que la pidió se va, la generación sigue
+            task = asyncio.ensure_future(self._generate(digest, size, ext, path))
+            self._inflight[path] = task
+            task.add_done_callback(lambda _: self._inflight.pop(path, None))
+        return await asyncio.shield(task)
+
+    async def _generate(self, digest: str, size: str, ext: str, path: str) -> Optional[bytes]:
+        src = original_path(digest, self.directory)
+        if not os.path.exists(src):
+            return None
+        data = await self._run(render, src, path, SIZES[size], FORMATS[ext][0])
+        self.stats["generated"] += 1
+        self._touch(path, len(data))
+        return data
+
+
+def describe(info: Dict[str, Any]) -> Dict[str, Any]:
+    """Respuesta de una subida: el original y las URLs de todas sus variantes."""
+    base = url(info["digest"])
+    return dict(info, url=base, variants={f"{size}.{ext}": f"{base}/{size}.{ext}" for size in SIZES for ext in FORMATS})
+
+
+STORE = Store()
@@ -1,13 +1,26 @@
-from fastapi import FastAPI, HTTPException, Query, Header, Depends
-from fastapi.responses import FileResponse
-from fastapi.staticfiles import StaticFiles
-from typing import List, Optional
+from fastapi import FastAPI, HTTPException, Query, Header, Depends, Request, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from typing import Any, Dict, List, Optional, Tuple
 from fastapi import Body
-
-from app import db
-from app.schemas import Category, CategoryCreate, Product, ProductCreate, IndexResponse
+import asyncio
+import base64
+import csv
+import hashlib
+import io
+import json
+import os
+
+from app import assets, auth, db, events, facets, images, metrics, respcache, seed
+from pydantic import ValidationError
+
+from app.schemas import (
+    Category, CategoryCreate, Product, ProductCreate, IndexResponse, CategoryBulkResult, ProductBulkResult,
+    ProductBatch, CartItem, CartQuote, FacetsResponse, ImageInfo,
+)
 
 app = FastAPI(title="Ecommerce simple (FastAPI + Supabase)")
+# Latencia/errores por ruta y por llamada a Supabase; ver `app.metrics`
+app.add_middleware(metrics.MetricsMiddleware)
 
 # Credenciales en memoria para demo (no usar en producción)
 AUTH_USERS = {
@@ -15,49 +28,65 @@ AUTH_USERS = {
     "admin": {"username": "admin", "pass": "123456", "role": "admin", "id": "admin"},
 }
 
-# Montar archivos estáticos (front-end)
-app.mount("/static", StaticFiles(directory="frontend"), name="static")
+# Front-end precomprimido y con nombres con hash (ver `app.assets`)
+app.mount("/static", assets.StaticAssets(), name="static")
 
 
 @app.get("/app", include_in_schema=False)
-def serve_frontend():
-    return FileResponse("frontend/index.html")
+async def serve_frontend(request: Request):
+    return assets.page(request, "index.html")
 
 
 @app.get("/app/login", include_in_schema=False)
-def serve_login():
-    return FileResponse("frontend/login.html")
+async def serve_login(request: Request):
+    return assets.page(request, "login.html")
 
 
 @app.get("/app/cart", include_in_schema=False)
-def serve_cart():
-    return FileResponse("frontend/cart.html")
+async def serve_cart(request: Request):
+    return assets.page(request, "cart.html")
 
 
 @app.get("/app/category/{category_slug}", include_in_schema=False)
-def serve_category_page(category_slug: str):
+async def serve_category_page(request: Request, category_slug: str):
     # Servimos la página estática de categoría. El frontend extraerá el slug desde la URL.
-    return FileResponse("frontend/category.html")
+    return assets.page(request, "category.html")
 
 
 @app.get("/app/product/{product_id}", include_in_schema=False)
-def serve_product_page(product_id: str):
+async def serve_product_page(request: Request, product_id: str):
     # Servimos la página de detalle del producto; el JS extraerá el id (puede ser int o uuid)
-    return FileResponse("frontend/product.html")
+    return assets.page(request, "product.html")
 
 
 @app.get("/app/admin", include_in_schema=False)
-def serve_admin_page():
-    return FileResponse("frontend/admin.html")
+async def serve_admin_page(request: Request):
+    return assets.page(request, "admin.html")
 
 
-def require_admin(x_user_id: str = Header(None)):
+async def require_admin(x_user_id: str = Header(None), authorization: str = Header(None)):
     """Dependencia para endpoints que requieren rol admin.
 
-    Por simplicidad en desarrollo se espera que el cliente incluya el header
+    Acepta `Authorization: Bearer <token>` con el token firmado que devuelve
+    `/auth/login` (se valida sin consultar la base de datos). Si no, por
+    simplicidad en desarrollo se espera que el cliente incluya el header
     `x-user-id` con el id del usuario (puede ser el id de Supabase Auth).
-    La función comprueba la tabla `app_users` y valida que `role = 'admin'`.
+    La función comprueba la tabla `app_users` (con caché, ver `app.auth`) y
+    valida que `role = 'admin'`.
+
+    Si el token no se puede validar y también llega `x-user-id`, se usa éste:
+    sin `AUTH_SECRET` cada worker firma con su propia clave, así que un token
+    emitido por otro worker o antes de un reinicio no vale aquí.
     """
+    if authorization and authorization.lower().startswith("bearer "):
+        claims = auth.verify_token(authorization[7:].strip())
+        if claims is not None:
+            if claims.get("role") != "admin":
+                raise HTTPException(status_code=403, detail="Operación permitida solo para administradores")
+            return {"id": claims.get("sub"), "role": claims.get("role")}
+        if not x_user_id:
+            raise HTTPException(status_code=401, detail="Token inválido o caducado")
+
     # Primero comprobamos si el cliente proporciona x-username (cabecera simple para demo)
     x_username = x_user_id
     if x_username:
@@ -70,34 +99,133 @@ def require_admin(x_user_id: str = Header(None)):
     # Si no, intentamos el comportamiento antiguo (buscar en DB por id)
     if not x_user_id:
         raise HTTPException(status_code=401, detail="x-user-id header requerido")
-    users = db.select_where("app_users", "id", x_user_id)
-    if not users:
+    user = await auth.resolve_user(x_user_id)
+    if not user:
         raise HTTPException(status_code=403, detail="Usuario no autorizado")
-    user = users[0]
     if user.get("role") != "admin":
         raise HTTPException(status_code=403, detail="Operación permitida solo para administradores")
     return user
 
 
+# Caché HTTP del catálogo: ETag fuerte derivado de la versión de las tablas
+CATALOG_CACHE_CONTROL = os.getenv("CATALOG_CACHE_CONTROL", "public, max-age=0, must-revalidate")
+
+
+def _etag(request: Request, tables: Tuple[str, ...]) -> str:
+    raw = f"{request.url.path}?{request.url.query}|{db.version_tag(*tables)}"
+    return '"' + hashlib.sha1(raw.encode()).hexdigest()[:24] + '"'
+
+
+def _conditional(request: Request, response: Response, *tables: str, cached: bool = False) -> Optional[Response]:
+    """Añade ETag/Cache-Control; devuelve un 304 si el cliente ya tiene esta versión.
+
+    Se evalúa antes de consultar la base de datos, así que un 304 no cuesta
+    ninguna llamada upstream ni serialización. Con `cached=True` (listas que
+    responden con `_json`) devuelve también el cuerpo ya serializado de esta
+    misma versión si está en `app.respcache`.
+    """
+    etag = _etag(request, tables)
+    headers = {"ETag": etag, "Cache-Control": CATALOG_CACHE_CONTROL}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        candidates = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+        if etag in candidates or "*" in candidates:
+            return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    if cached:
+        hit = respcache.get(etag)
+        if hit is not None:
+            return Response(hit[0], media_type="application/json", headers=hit[1])
+    return None
+
+
+def _json(response: Response, data: Any, cache: bool = True) -> Response:
+    """Serializa `data` (ya proyectado con `respcache.project`) y lo guarda por ETag.
+
+    `cache=False` cuando la consulta falló y `data` es un sustituto vacío.
+    """
+    headers = dict(response.headers)
+    body = respcache.dumps(data)
+    if cache:
+        respcache.put(headers.get("etag"), body, headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+
+# Campos parciales (`?fields=id,name,price`): sólo se piden esas columnas
+def _parse_fields(raw: Optional[str], model: type) -> Optional[Tuple[str, ...]]:
+    """Valida `fields` contra el esquema `model`; `None` si no se pidió."""
+    if raw is None:
+        return None
+    fields = tuple(dict.fromkeys(f.strip() for f in raw.split(",") if f.strip()))
+    if not fields:
+        raise HTTPException(status_code=400, detail="fields no puede estar vacío")
+    unknown = [f for f in fields if f not in model.model_fields]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Campos desconocidos: {', '.join(unknown)}. Disponibles: {', '.join(model.model_fields)}",
+        )
+    return fields
+
+
 @app.get("/", tags=["root"])
-def read_root():
+async def read_root():
     return {"message": "Ecommerce simple con FastAPI + Supabase"}
 
 
 @app.get("/index", response_model=IndexResponse)
-def read_index():
-    """Devuelve las categorías y los productos destacados (limit 8)."""
-    categories = db.select_all("categories") or []
-    featured = db.select_limit("products", limit=8) or []
-    return {"categories": categories, "featured": featured}
+async def read_index(
+    request: Request,
+    response: Response,
+    fields: Optional[str] = Query(None, description="Campos de los productos destacados, p. ej. id,name,price,image_url"),
+):
+    """Devuelve las categorías y los productos destacados (limit 8).
+
+    `fields` limita los campos de los productos destacados; las categorías
+    se devuelven completas.
+    """
+    columns = _parse_fields(fields, Product)
+    not_modified = _conditional(request, response, "categories", "products", cached=True)
+    if not_modified:
+        return not_modified
+    # consultas independientes: en paralelo, una sola espera de red
+    categories, featured = await asyncio.gather(
+        db.aselect_all("categories"),
+        db.aselect_limit("products", limit=8, columns=columns),
+    )
+    data = {
+        "categories": respcache.project(Category, categories or []),
+        "featured": respcache.project(Product, featured or [], columns),
+    }
+    return _json(response, data, cache=categories is not None and featured is not None)
+
+
+@app.get("/facets", response_model=FacetsResponse)
+async def read_facets(
+    request: Request,
+    response: Response,
+    category: Optional[str] = Query(None, description="Histograma de precios sólo de esta categoría (slug)"),
+):
+    """Número de productos por categoría e histograma de precios.
+
+    Sale de agregados que se mantienen con cada escritura (ver `app.facets`):
+    no recorre el catálogo en cada petición. Con `category`, `total` y
+    `price` son los de esa categoría; `categories` siempre trae todas.
+    """
+    not_modified = _conditional(request, response, "products", cached=True)
+    if not_modified:
+        return not_modified
+    built = await facets.FACETS.aensure()
+    return _json(response, facets.FACETS.snapshot(category), cache=built)
 
 
 @app.post('/auth/login')
-def login(payload: dict = Body(...)):
+async def login(payload: dict = Body(...)):
     """Login demo (en memoria): acepta JSON {"username": "...", "pass": "..."}.
 
     Este endpoint valida contra la tabla `AUTH_USERS` en memoria (demo).
-    Devuelve el objeto usuario sin el campo `pass`.
+    Devuelve el objeto usuario sin el campo `pass` y con un `token` firmado
+    para enviar como `Authorization: Bearer <token>`.
 
     Nota: esto es sólo para demostración local. No uses autenticación de texto plano en producción.
     """
@@ -114,123 +242,598 @@ def login(payload: dict = Body(...)):
         raise HTTPException(status_code=401, detail='Credenciales inválidas')
     safe = dict(user)
     safe.pop('pass', None)
+    safe['token'] = auth.issue_token(safe)
     return safe
 
 
+@app.on_event("startup")
+def on_startup_assets():
+    assets.load()
+    images.STORE.load()
+
+
+@app.on_event("startup")
+def on_startup_connect():
+    # Abrimos el pool de conexiones antes de sembrar datos
+    db.connect()
+
+
+@app.on_event("shutdown")
+async def on_shutdown_close():
+    await db.aclose()
+    images.STORE.close()
+
+
 @app.on_event("startup")
 def on_startup_seed():
-    try:
-        stats = db.seed_sample_data()
-        # sólo registramos en logs — si corres uvicorn verás la salida
-        print(f"Seeded sample data: {stats}")
-    except Exception as e:
-        print(f"Error seeding sample data: {e}")
+    # Con Supabase se siembra en segundo plano (el worker no espera); el
+    # resultado aparece en los logs y en /health/ready. Ver `app.seed`.
+    seed.start_background()
+
+
+@app.get("/health/ready", tags=["root"])
+async def readiness(response: Response):
+    """200 cuando el worker está listo (siembra terminada y tablas cargadas), 503 mientras tanto."""
+    pending = db.pending_tables()
+    ready = seed.STATE["status"] in seed.READY_STATES and not pending
+    if not ready:
+        response.status_code = 503
+    return {"ready": ready, "backend": db.backend(), "seed": dict(seed.STATE), "pending_tables": pending}
+
+
+@app.get("/health/upstream", tags=["root"])
+async def upstream_health():
+    """Estado del circuit breaker hacia Supabase (`closed`, `open` o `half_open`)."""
+    return {"backend": db.backend(), "breaker": db.upstream_state()}
+
+
+@app.get("/metrics", include_in_schema=False)
+async def read_metrics():
+    """Métricas del proceso en formato Prometheus."""
+    stats = db.cache_stats()
+    gauges = {
+        "db_cache_entries": ("Entradas en la caché de lecturas.", stats["entries"]),
+        "db_cache_hits": ("Aciertos de la caché de lecturas.", stats["hits"]),
+        "db_cache_misses": ("Fallos de la caché de lecturas.", stats["misses"]),
+    }
+    upstream = db.upstream_state()
+    if upstream is not None:
+        gauges["upstream_breaker_open"] = ("1 si el circuit breaker hacia Supabase no está cerrado.",
+                                           int(upstream["state"] != "closed"))
+    responses = respcache.stats()
+    gauges["response_cache_entries"] = ("Respuestas serializadas en caché.", responses["entries"])
+    gauges["response_cache_bytes"] = ("Bytes de respuestas serializadas en caché.", responses["bytes"])
+    gauges["response_cache_hits"] = ("Respuestas servidas desde la caché.", responses["hits"])
+    gauges["events_subscribers"] = ("Conexiones abiertas a /events/catalog.", events.HUB.subscribers())
+    gauges["events_published"] = ("Cambios publicados en /events/catalog.", events.HUB.stats["published"])
+    gauges["events_overflows"] = ("Suscriptores lentos enviados a resincronizar.", events.HUB.stats["overflows"])
+    gauges["images_generated"] = ("Variantes de imagen generadas.", images.STORE.stats["generated"])
+    gauges["images_evictions"] = ("Variantes de imagen borradas por la LRU.", images.STORE.stats["evictions"])
+    gauges["images_variant_bytes"] = ("Bytes en disco de variantes de imagen.", images.STORE.cached_bytes())
+    gauges["facets_builds"] = ("Construcciones completas de los agregados de /facets.", facets.FACETS.stats["builds"])
+    return PlainTextResponse(metrics.render(gauges), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/events/catalog", tags=["events"])
+async def catalog_events(last_event_id: Optional[str] = Header(None)):
+    """Cambios de productos y categorías como Server-Sent Events (ver `app.events`).
+
+    Cada evento `change` trae `{table, op, id, row}`; `resync` indica que hay
+    que volver a pedir las listas. Al reconectar, el navegador manda
+    `Last-Event-ID` y se reciben los cambios perdidos.
+    """
+    if events.HUB.full():
+        raise HTTPException(status_code=503, detail="Demasiadas conexiones al feed de cambios")
+    return StreamingResponse(events.HUB.stream(last_event_id), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+# Administración de la caché de lecturas
+@app.get("/admin/cache", tags=["admin"])
+async def get_cache_stats(admin=Depends(require_admin)):
+    return {**db.cache_stats(), "responses": respcache.stats()}
+
+
+@app.post("/admin/cache/flush", tags=["admin"])
+async def flush_cache(admin=Depends(require_admin)):
+    return {"flushed": db.cache_clear(), "roles": auth.clear_roles(), "responses": respcache.clear()}
+
+
+def _validate_bulk(items: List[Any], model: type, upsert: bool):
+    """Valida cada elemento contra `model`.
+
+    Devuelve `(filas válidas, índice original de cada fila, errores)`. Con
+    upsert se conserva el `id` recibido para que actúe como clave.
+    """
+    rows: List[Dict[str, Any]] = []
+    positions: List[int] = []
+    errors: List[Dict[str, Any]] = []
+    for i, item in enumerate(items):
+        if not isinstance(item, dict):
+            errors.append({"index": i, "detail": "Se esperaba un objeto"})
+            continue
+        try:
+            row = model(**item).dict()
+        except ValidationError as e:
+            errors.append({"index": i, "detail": e.errors(include_url=False, include_context=False)})
+            continue
+        if upsert and item.get("id") is not None:
+            row["id"] = item["id"]
+        rows.append(row)
+        positions.append(i)
+    return rows, positions, errors
+
+
+async def _bulk_write(table: str, items: List[Any], model: type, upsert: bool):
+    rows, positions, errors = _validate_bulk(items, model, upsert)
+    created, db_errors = await db.ainsert_many(table, rows, upsert=upsert)
+    errors.extend({"index": positions[e["index"]], "detail": e["detail"]} for e in db_errors)
+    errors.sort(key=lambda e: e["index"])
+    return {"created": created, "errors": errors}
+
+
+# Exportación / importación del catálogo (streaming, memoria constante)
+EXPORT_COLUMNS = ("id", "name", "description", "price", "image_url", "category")
+IMPORT_MAX_ERRORS = 100
+
+
+async def _export_lines(table: str, fmt: str, page_size: int):
+    if fmt == "csv":
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        writer.writerow(EXPORT_COLUMNS)
+        yield buf.getvalue().encode()
+    async for rows in db.aiter_pages(table, page_size=page_size):
+        if fmt == "csv":
+            buf = io.StringIO()
+            writer = csv.writer(buf)
+            writer.writerows([r.get(c) for c in EXPORT_COLUMNS] for r in rows)
+            yield buf.getvalue().encode()
+        else:
+            yield "".join(json.dumps(r, ensure_ascii=False, default=str) + "\n" for r in rows).encode()
+
+
+@app.get("/admin/export/products", tags=["admin"])
+async def export_products(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    page_size: int = Query(1000, ge=1, le=10000),
+    admin=Depends(require_admin),
+):
+    """Exporta el catálogo completo como NDJSON o CSV, página a página."""
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    headers = {"Content-Disposition": f'attachment; filename="products.{format}"'}
+    return StreamingResponse(_export_lines("products", format, page_size), media_type=media_type, headers=headers)
+
+
+async def _ndjson_lines(request: Request):
+    """Líneas del cuerpo a medida que llegan (sin cargarlo entero)."""
+    pending = b""
+    async for chunk in request.stream():
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            yield line
+    if pending:
+        yield pending
+
+
+@app.post("/admin/import/products", tags=["admin"])
+async def import_products(
+    request: Request,
+    upsert: bool = Query(False, description="Actualizar las filas cuyo id ya exista"),
+    batch_size: int = Query(500, ge=1, le=5000),
+    admin=Depends(require_admin),
+):
+    """Importa productos desde un cuerpo NDJSON (un objeto por línea).
+
+    El cuerpo se procesa en streaming: cada `batch_size` filas válidas se
+    escriben con una inserción masiva y no se sigue leyendo hasta que
+    termina (contrapresión). Se devuelven como mucho los primeros
+    `IMPORT_MAX_ERRORS` errores; `error_count` los cuenta todos.
+    """
+    received = created = error_count = 0
+    errors: List[Dict[str, Any]] = []
+
+    def add_errors(new: List[Dict[str, Any]]):
+        nonlocal error_count
+        error_count += len(new)
+        errors.extend(new[:max(IMPORT_MAX_ERRORS - len(errors), 0)])
+
+    async def flush(items: List[Any], line_numbers: List[int]):
+        nonlocal created
+        rows, positions, errs = _validate_bulk(items, ProductCreate, upsert)
+        written, db_errors = await db.ainsert_many("products", rows, upsert=upsert, chunk_size=batch_size)
+        created += len(written)
+        errs.extend({"index": positions[e["index"]], "detail": e["detail"]} for e in db_errors)
+        add_errors([{"line": line_numbers[e["index"]], "detail": e["detail"]} for e in errs])
+
+    batch: List[Any] = []
+    batch_lines: List[int] = []
+    line_no = 0
+    async for line in _ndjson_lines(request):
+        line_no += 1
+        if not line.strip():
+            continue
+        received += 1
+        try:
+            batch.append(json.loads(line))
+        except ValueError as e:
+            add_errors([{"line": line_no, "detail": f"JSON inválido: {e}"}])
+            continue
+        batch_lines.append(line_no)
+        if len(batch) >= batch_size:
+            await flush(batch, batch_lines)
+            batch, batch_lines = [], []
+    if batch:
+        await flush(batch, batch_lines)
+    return {"received": received, "created": created, "error_count": error_count, "errors": errors}
 
 
 # Categories
 @app.get("/categories", response_model=List[Category])
-def list_categories():
-    data = db.select_all("categories")
-    return data or []
+async def list_categories(
+    request: Request,
+    response: Response,
+    fields: Optional[str] = Query(None, description="Campos a devolver, p. ej. id,name,slug"),
+):
+    columns = _parse_fields(fields, Category)
+    not_modified = _conditional(request, response, "categories", cached=True)
+    if not_modified:
+        return not_modified
+    data = await db.aselect_all("categories", columns=columns)
+    return _json(response, respcache.project(Category, data or [], columns), cache=data is not None)
 
 
 @app.get("/categories/slug/{slug}", response_model=Category)
-def get_category_by_slug(slug: str):
-    res = db.select_where("categories", "slug", slug)
+async def get_category_by_slug(slug: str, request: Request, response: Response):
+    not_modified = _conditional(request, response, "categories")
+    if not_modified:
+        return not_modified
+    res = await db.aselect_where("categories", "slug", slug)
     if not res:
         raise HTTPException(status_code=404, detail="Categoría no encontrada")
     return res[0]
 
 
 @app.post("/categories", response_model=Category)
-def create_category(cat: CategoryCreate):
-    res = db.insert("categories", cat.dict())
+async def create_category(cat: CategoryCreate):
+    res = await db.ainsert("categories", cat.dict())
     if not res:
         raise HTTPException(status_code=500, detail="Error creando categoría")
     return res[0]
 
 
+@app.post("/categories/bulk", response_model=CategoryBulkResult)
+async def create_categories_bulk(
+    items: List[Any] = Body(...),
+    upsert: bool = Query(False, description="Actualizar las filas cuyo id ya exista"),
+    admin=Depends(require_admin),
+):
+    """Alta masiva de categorías en lotes; los errores se informan por fila."""
+    return await _bulk_write("categories", items, CategoryCreate, upsert)
+
+
 @app.get("/categories/{category_id}", response_model=Category)
-def get_category(category_id: int):
-    res = db.select_one("categories", category_id)
+async def get_category(category_id: int, request: Request, response: Response):
+    not_modified = _conditional(request, response, "categories")
+    if not_modified:
+        return not_modified
+    res = await db.aselect_one("categories", category_id)
     if not res:
         raise HTTPException(status_code=404, detail="Categoría no encontrada")
     return res
 
 
 @app.put("/categories/{category_id}", response_model=Category)
-def update_category(category_id: int, cat: CategoryCreate):
-    res = db.update("categories", category_id, cat.dict())
+async def update_category(category_id: int, cat: CategoryCreate):
+    res = await db.aupdate("categories", category_id, cat.dict())
     if not res:
         raise HTTPException(status_code=500, detail="Error actualizando categoría")
     return res[0]
 
 
 @app.delete("/categories/{category_id}")
-def delete_category(category_id: int):
-    res = db.delete("categories", category_id)
+async def delete_category(category_id: int):
+    res = await db.adelete("categories", category_id)
     if res is None:
         raise HTTPException(status_code=500, detail="Error eliminando categoría")
     return {"deleted": True}
 
 
 # Products
+PRODUCT_ORDER_FIELDS = ("id", "price", "name")
+MAX_PAGE_SIZE = 1000
+
+
+def _parse_id(raw: str) -> Any:
+    return int(raw) if raw.isdigit() else raw
+
+
+def _encode_cursor(row: Dict[str, Any], order_by: str) -> str:
+    """Cursor de la fila `row`: su id si se ordena por id; si no, `(valor, id)` opaco."""
+    if order_by == "id":
+        return str(row.get("id"))
+    raw = json.dumps([row.get(order_by), row.get("id")], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str, order_by: str) -> Tuple[Any, ...]:
+    if order_by == "id":
+        return (_parse_id(cursor),)
+    try:
+        value, last_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    return (value, last_id)
+
+
 @app.get("/products", response_model=List[Product])
-def list_products(
+async def list_products(
+    request: Request,
+    response: Response,
     category: Optional[str] = Query(None, description="Filtrar por slug de categoría"),
     category_id: Optional[str] = Query(None, description="Filtrar por id de categoría (opcional)"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Tamaño de página"),
+    after: Optional[str] = Query(None, description="Cursor devuelto en `X-Next-Cursor`"),
+    order_by: Optional[str] = Query(None, description="Orden: id, price o name (ascendente)"),
+    count: Optional[str] = Query(None, description="Incluir total en `X-Total-Count`: exact o estimated"),
+    fields: Optional[str] = Query(None, description="Campos a devolver, p. ej. id,name,price,image_url"),
+    min_price: Optional[float] = Query(None, ge=0, description="Precio mínimo (incluido)"),
+    max_price: Optional[float] = Query(None, ge=0, description="Precio máximo (incluido)"),
 ):
     """Devuelve productos.
 
     Se puede filtrar por `category` (slug) o por `category_id` (id de la categoría,
-    en cuyo caso buscamos el slug y filtramos por él).
+    en cuyo caso buscamos el slug y filtramos por él), y por rango de precio
+    con `min_price`/`max_price` (se resuelve con el índice ordenado de
+    precios o con `price=gte.`/`price=lte.` en PostgREST).
+
+    Con `limit`, `after`, `order_by` o `count` la respuesta se pagina por
+    keyset: la cabecera `X-Next-Cursor` trae el valor para `after` de la
+    página siguiente y `X-Total-Count` el total si se pidió `count` (sólo en
+    la primera página: PostgREST cuenta aplicando también el filtro del cursor).
+
+    `fields` (p. ej. `id,name,price,image_url`) limita las columnas que se
+    piden a la base de datos y las que se devuelven.
     """
-    # Si nos pasan category_id lo usamos para buscar la categoría y su slug
+    columns = _parse_fields(fields, Product)
+    if min_price is not None and max_price is not None and min_price > max_price:
+        raise HTTPException(status_code=400, detail="min_price no puede ser mayor que max_price")
+    not_modified = _conditional(request, response, "categories", "products", cached=True)
+    if not_modified:
+        return not_modified
+
+    slug = category
+    # Si nos pasan category_id lo traducimos a slug con el mapa residente de
+    # categorías (sin consulta extra por petición)
     if category_id is not None:
-        cat = db.select_one("categories", category_id)
-        if not cat:
+        slug = await db.acategory_slug(category_id)
+        if not slug:
+            return []
+
+    priced = min_price is not None or max_price is not None
+    if limit is not None or after is not None or order_by is not None or count is not None or priced:
+        order_by = order_by or "id"
+        if order_by not in PRODUCT_ORDER_FIELDS:
+            raise HTTPException(status_code=400, detail=f"order_by debe ser uno de {', '.join(PRODUCT_ORDER_FIELDS)}")
+        if count is not None and count not in ("exact", "estimated"):
+            raise HTTPException(status_code=400, detail="count debe ser exact o estimated")
+        page = await db.aselect_page(
+            "products",
+            order_by=order_by,
+            after=_decode_cursor(after, order_by) if after else None,
+            limit=limit,
+            where=("category", slug) if slug else None,
+            between=("price", min_price, max_price) if priced else None,
+            count=count if after is None else None,
+            # el cursor necesita id y la columna de orden aunque no se pidan
+            columns=tuple(dict.fromkeys(columns + ("id", order_by))) if columns else None,
+        )
+        if page is None:
             return []
-        slug = cat.get("slug") or cat.get("name")
-        products = db.select_where("products", "category", slug)
-        return products or []
+        rows, total = page
+        if limit is not None and len(rows) == limit:
+            response.headers["X-Next-Cursor"] = _encode_cursor(rows[-1], order_by)
+        if total is not None:
+            response.headers["X-Total-Count"] = str(total)
+    elif slug:
+        # Si tenemos slug de categoría, filtramos por products.category
+        rows = await db.aselect_where("products", "category", slug, columns=columns)
+    else:
+        rows = await db.aselect_all("products", columns=columns)
+    return _json(response, respcache.project(Product, rows or [], columns), cache=rows is not None)
+
+
+@app.get("/products/search", response_model=List[Product])
+async def search_products(
+    request: Request,
+    response: Response,
+    q: str = Query(..., min_length=1, description="Texto a buscar en nombre y descripción"),
+    limit: int = Query(20, ge=1, le=100),
+):
+    """Busca productos por nombre/descripción (sin distinguir acentos, admite prefijos).
 
-    # Si nos pasan slug de categoría, filtramos por products.category
-    if category:
-        products = db.select_where("products", "category", category)
-        return products or []
+    Ejemplo: `q=capitan amer` encuentra "Capitán América".
+    """
+    not_modified = _conditional(request, response, "products", cached=True)
+    if not_modified:
+        return not_modified
+    res = await db.asearch_text("products", q, limit=limit)
+    return _json(response, respcache.project(Product, res or []), cache=res is not None)
 
-    data = db.select_all("products")
-    return data or []
+
+# Consulta de varios productos por id en una sola llamada
+MAX_BATCH_IDS = 100
+
+
+@app.get("/products/batch", response_model=ProductBatch)
+async def get_products_batch(
+    request: Request,
+    response: Response,
+    ids: str = Query(..., description="Ids separados por comas, p. ej. 1,2,3"),
+):
+    """Devuelve varios productos en el orden pedido; los que no existen van a `missing`."""
+    wanted = list(dict.fromkeys(i.strip() for i in ids.split(",") if i.strip()))
+    if not wanted:
+        raise HTTPException(status_code=400, detail="ids no puede estar vacío")
+    if len(wanted) > MAX_BATCH_IDS:
+        raise HTTPException(status_code=400, detail=f"Como máximo {MAX_BATCH_IDS} ids por petición")
+    not_modified = _conditional(request, response, "products")
+    if not_modified:
+        return not_modified
+    rows = await db.aselect_many("products", wanted)
+    if rows is None:
+        raise HTTPException(status_code=502, detail="Error consultando productos")
+    return {"items": rows, "missing": [i for i, r in zip(wanted, rows) if r is None]}
+
+
+@app.post("/cart/price", response_model=CartQuote, tags=["cart"])
+async def price_cart(items: List[CartItem]):
+    """Calcula subtotales y total del carrito con los precios actuales (una sola consulta)."""
+    if len(items) > MAX_BATCH_IDS:
+        raise HTTPException(status_code=400, detail=f"Como máximo {MAX_BATCH_IDS} líneas por carrito")
+    ids = list(dict.fromkeys(str(it.id) for it in items))
+    rows = await db.aselect_many("products", ids, columns=("id", "name", "price", "image_url"))
+    if rows is None:
+        raise HTTPException(status_code=502, detail="Error consultando productos")
+    by_id = {i: r for i, r in zip(ids, rows) if r is not None}
+    lines: List[Dict[str, Any]] = []
+    missing: List[Any] = []
+    for it in items:
+        prod = by_id.get(str(it.id))
+        if prod is None:
+            missing.append(it.id)
+            continue
+        price = float(prod.get("price") or 0)
+        lines.append({
+            "id": prod.get("id"),
+            "name": prod.get("name"),
+            "price": price,
+            "qty": it.qty,
+            "line_total": round(price * it.qty, 2),
+            "image_url": prod.get("image_url"),
+        })
+    return {"lines": lines, "missing": missing, "total": round(sum(l["line_total"] for l in lines), 2)}
 
 
 @app.post("/products", response_model=Product)
-def create_product(prod: ProductCreate, admin=Depends(require_admin)):
+async def create_product(prod: ProductCreate, admin=Depends(require_admin)):
     # prod.dict() debe incluir `category` como slug
-    res = db.insert("products", prod.dict())
+    res = await db.ainsert("products", prod.dict())
     if not res:
         raise HTTPException(status_code=500, detail="Error creando producto")
     return res[0]
 
 
+@app.post("/products/bulk", response_model=ProductBulkResult)
+async def create_products_bulk(
+    items: List[Any] = Body(...),
+    upsert: bool = Query(False, description="Actualizar las filas cuyo id ya exista"),
+    admin=Depends(require_admin),
+):
+    """Alta masiva de productos en lotes; los errores se informan por fila."""
+    return await _bulk_write("products", items, ProductCreate, upsert)
+
+
 @app.get("/products/{product_id}", response_model=Product)
-def get_product(product_id: str):
-    res = db.select_one("products", product_id)
+async def get_product(product_id: str, request: Request, response: Response):
+    not_modified = _conditional(request, response, "products")
+    if not_modified:
+        return not_modified
+    res = await db.aselect_one("products", product_id)
     if not res:
         raise HTTPException(status_code=404, detail="Producto no encontrado")
     return res
 
 
 @app.put("/products/{product_id}", response_model=Product)
-def update_product(product_id: str, prod: ProductCreate, admin=Depends(require_admin)):
-    res = db.update("products", product_id, prod.dict())
+async def update_product(product_id: str, prod: ProductCreate, admin=Depends(require_admin)):
+    res = await db.aupdate("products", product_id, prod.dict())
+    if not res:
+        raise HTTPException(status_code=500, detail="Error actualizando producto")
+    return res[0]
+
+
+async def _ingest_image(request: Request) -> Dict[str, Any]:
+    # bytes de la imagen en el cuerpo, sin multipart (no es dependencia del repo)
+    length = request.headers.get("content-length")
+    if length and length.isdigit() and int(length) > images.IMAGES_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"La imagen supera {images.IMAGES_MAX_BYTES} bytes")
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > images.IMAGES_MAX_BYTES:
+            raise HTTPException(status_code=413, detail=f"La imagen supera {images.IMAGES_MAX_BYTES} bytes")
+    if not body:
+        raise HTTPException(status_code=400, detail="Cuerpo vacío: envía los bytes de la imagen")
+    try:
+        return await images.STORE.ingest(bytes(body))
+    except images.InvalidImage as exc:
+        raise HTTPException(status_code=415, detail=str(exc))
+
+
+@app.post("/images", response_model=ImageInfo, tags=["images"])
+async def upload_image(request: Request, admin=Depends(require_admin)):
+    """Sube una imagen (JPEG, PNG, WebP o GIF) enviando sus bytes como cuerpo.
+
+    Se guarda por contenido: subir la misma imagen otra vez devuelve la misma
+    URL con `created: false`. Las variantes se generan al pedirlas.
+    """
+    return images.describe(await _ingest_image(request))
+
+
+@app.put("/products/{product_id}/image", response_model=Product, tags=["images"])
+async def upload_product_image(product_id: str, request: Request, admin=Depends(require_admin)):
+    """Sube la imagen de un producto (bytes en el cuerpo) y la asigna a su `image_url`."""
+    if not await db.aselect_one("products", product_id):
+        raise HTTPException(status_code=404, detail="Producto no encontrado")
+    info = await _ingest_image(request)
+    res = await db.aupdate("products", product_id, {"image_url": images.url(info["digest"])})
     if not res:
         raise HTTPException(status_code=500, detail="Error actualizando producto")
     return res[0]
 
 
+def _image_response(request: Request, data: bytes, media_type: str, etag: str) -> Response:
+    headers = {"ETag": etag, "Cache-Control": assets.IMMUTABLE}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(data, media_type=media_type, headers=headers)
+
+
+@app.get("/images/{digest}", tags=["images"])
+async def get_image(digest: str, request: Request):
+    """Imagen original tal como se subió."""
+    found = await images.STORE.original(digest) if images.is_digest(digest) else None
+    if found is None:
+        raise HTTPException(status_code=404, detail="Imagen no encontrada")
+    return _image_response(request, found[0], found[1], f'"{digest}"')
+
+
+@app.get("/images/{digest}/{variant}", tags=["images"])
+async def get_image_variant(digest: str, variant: str, request: Request):
+    """Variante `<tamaño>.<formato>` (p. ej. `grid.webp`, `cart.jpg`), generada la primera vez que se pide."""
+    size, _, ext = variant.partition(".")
+    if not images.is_digest(digest) or size not in images.SIZES or ext not in images.FORMATS:
+        raise HTTPException(status_code=404, detail="Imagen no encontrada")
+    etag = f'"{digest}-{variant}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": assets.IMMUTABLE})
+    if images.Image is None:
+        # sin Pillow no hay redimensionado: el original sirve para cualquier tamaño
+        found = await images.STORE.original(digest)
+        if found is None:
+            raise HTTPException(status_code=404, detail="Imagen no encontrada")
+        return _image_response(request, found[0], found[1], etag)
+    data = await images.STORE.variant(digest, size, ext)
+    if data is None:
+        raise HTTPException(status_code=404, detail="Imagen no encontrada")
+    return _image_response(request, data, images.FORMATS[ext][1], etag)
+
+
 @app.delete("/products/{product_id}")
-def delete_product(product_id: str, admin=Depends(require_admin)):
-    res = db.delete("products", product_id)
+async def delete_product(product_id: str, admin=Depends(require_admin)):
+    res = await db.adelete("products", product_id)
     if res is None:
         raise HTTPException(status_code=500, detail="Error eliminando producto")
     return {"deleted": True}
@@ -0,0 +1,345 @@
+"""Almacén en memoria con índices para el fallback de `app.db`.
+
+Cada `Table` guarda las filas como tuplas alineadas con la lista de columnas
+de la tabla (mucho más compactas que un dict por fila) en un dict indexado
+por la clave primaria (`str(id)`, igual que la comparación original), de modo
+que `get`, `update` y `delete` son O(1). Los índices secundarios declarados
+(`valor -> claves`) y los índices ordenados (`(valor, id) -> clave`, usados
+para paginación keyset y filtros por rango) se construyen la primera vez
+que se usan y después se mantienen en cada escritura.
+
+Todas las lecturas devuelven dicts nuevos: los llamadores nunca reciben
+referencias al almacenamiento interno.
+"""
+from bisect import bisect_left, bisect_right, insort
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# Marca de "columna ausente" en una fila (distinto de None). Usamos Ellipsis
+# porque es un singleton que nunca llega desde JSON y es serializable.
+_ABSENT = ...
+
+Row = Tuple[Any, ...]
+
+
+def _key(id_value: Any) -> str:
+    return str(id_value)
+
+
+def sort_value(v: Any) -> Tuple[Any, ...]:
+    """Clave de orden total: números < textos < nulos (como `order=col.asc`)."""
+    if v is None or v is _ABSENT:
+        return (2,)
+    if isinstance(v, (int, float)) and not isinstance(v, bool):
+        return (0, v)
+    return (1, str(v))
+
+
+_Entry = Tuple[Tuple[Any, ...], Tuple[Any, ...], str]
+
+
+def _in_range(v: Any, low: Any, high: Any) -> bool:
+    # Como `gte.`/`lte.` de PostgREST sobre una columna numérica: nulos fuera
+    if not isinstance(v, (int, float)) or isinstance(v, bool):
+        return False
+    return (low is None or v >= low) and (high is None or v <= high)
+
+
+class Table:
+    def __init__(self, name: str, indexes: Iterable[str] = (), sorted_indexes: Iterable[str] = ()) -> None:
+        self.name = name
+        self.columns: List[str] = []
+        self._pos: Dict[str, int] = {}
+        # clave primaria -> fila; el dict conserva el orden de inserción
+        self._rows: Dict[str, Row] = {}
+        # clave primaria -> posición lógica (orden de inserción). None = sin
+        # construir: equivale al orden de `_rows` (ver `_seqs`)
+        self._seq: Optional[Dict[str, int]] = {}
+        self._next_seq = 0
+        # columna -> valor -> {clave: None} (conjunto ordenado). None = sin construir
+        self._indexes: Dict[str, Optional[Dict[Any, Dict[str, None]]]] = {c: None for c in indexes}
+        # buckets que recibieron claves fuera de orden (por un update)
+        self._dirty: Dict[str, set] = {c: set() for c in indexes}
+        # columna -> lista ordenada de (sort_value(valor), sort_value(id), clave)
+        self._sorted: Dict[str, Optional[List[_Entry]]] = {c: None for c in sorted_indexes}
+
+    # --- codificación de filas ---
+
+    def _encode(self, row: Dict[str, Any]) -> Row:
+        for col in row:
+            if col not in self._pos:
+                self._pos[col] = len(self.columns)
+                self.columns.append(col)
+        values = [_ABSENT] * len(self.columns)
+        for col, v in row.items():
+            values[self._pos[col]] = v
+        return tuple(values)
+
+    def _decode(self, tup: Row) -> Dict[str, Any]:
+        return {c: v for c, v in zip(self.columns, tup) if v is not _ABSENT}
+
+    def _decoder(self, columns: Optional[Sequence[str]]):
+        """Decodificador de filas; con `columns` sólo extrae esas columnas."""
+        if columns is None:
+            return self._decode
+        wanted = [(c, self._pos[c]) for c in columns if c in self._pos]
+
+        def decode(tup: Row) -> Dict[str, Any]:
+            n = len(tup)
+            return {c: tup[i] for c, i in wanted if i < n and tup[i] is not _ABSENT}
+
+        return decode
+
+    def _value(self, tup: Row, column: str) -> Any:
+        pos = self._pos.get(column)
+        if pos is None or pos >= len(tup) or tup[pos] is _ABSENT:
+            return None
+        return tup[pos]
+
+    # --- índices secundarios ---
+
+    def _index(self, column: str) -> Optional[Dict[Any, Dict[str, None]]]:
+        if column not in self._indexes:
+            return None
+        index = self._indexes[column]
+        if index is None:
+            index = {}
+            try:
+                for key, tup in self._rows.items():
+                    index.setdefault(self._value(tup, column), {})[key] = None
+            except TypeError:
+                # valores no hashables: dejamos la columna sin índice
+                del self._indexes[column]
+                return None
+            self._indexes[column] = index
+            self._dirty[column] = set()
+        return index
+
+    def _entry(self, key: str, tup: Row, column: str) -> _Entry:
+        return (sort_value(self._value(tup, column)), sort_value(self._value(tup, "id")), key)
+
+    def _sorted_index(self, column: str) -> Optional[List[_Entry]]:
+        if column not in self._sorted:
+            return None
+        entries = self._sorted[column]
+        if entries is None:
+            entries = sorted(self._entry(k, t, column) for k, t in self._rows.items())
+            self._sorted[column] = entries
+        return entries
+
+    def _index_add(self, key: str, tup: Row, in_order: bool = True) -> None:
+        for column, entries in self._sorted.items():
+            if entries is not None:
+                insort(entries, self._entry(key, tup, column))
+        for column, index in list(self._indexes.items()):
+            if index is None:
+                continue
+            value = self._value(tup, column)
+            try:
+                bucket = index.setdefault(value, {})
+            except TypeError:
+                del self._indexes[column]
+                continue
+            if bucket and not in_order:
+                self._dirty[column].add(value)
+            bucket[key] = None
+
+    def _index_remove(self, key: str, tup: Row) -> None:
+        for column, entries in self._sorted.items():
+            if entries is not None:
+                entry = self._entry(key, tup, column)
+                i = bisect_left(entries, entry)
+                if i < len(entries) and entries[i] == entry:
+                    del entries[i]
+        for column, index in self._indexes.items():
+            if index is None:
+                continue
+            value = self._value(tup, column)
+            bucket = index.get(value)
+            if bucket is not None:
+                bucket.pop(key, None)
+                if not bucket:
+                    del index[value]
+                    self._dirty[column].discard(value)
+
+    def _seqs(self) -> Dict[str, int]:
+        if self._seq is None:
+            self._seq = {k: i for i, k in enumerate(self._rows)}
+        return self._seq
+
+    def _bucket_keys(self, column: str, value: Any, index: Dict[Any, Dict[str, None]]) -> List[str]:
+        bucket = index.get(value)
+        if not bucket:
+            return []
+        if value in self._dirty[column]:
+            # reordenamos según la posición en la tabla (orden de inserción)
+            ordered = sorted(bucket, key=self._seqs().__getitem__)
+            index[value] = dict.fromkeys(ordered)
+            self._dirty[column].discard(value)
+            return ordered
+        return list(bucket)
+
+    # --- volcado / restauración (ver `app.persist`) ---
+
+    def dump(self) -> Tuple[List[str], List[Row]]:
+        """Estado compacto de la tabla: `(columnas, filas)` en orden de tabla."""
+        return list(self.columns), list(self._rows.values())
+
+    def restore(self, columns: List[str], rows: Iterable[Row]) -> None:
+        """Sustituye el contenido por un volcado de `dump`; los índices se reconstruyen al usarse."""
+        self.columns = list(columns)
+        self._pos = {c: i for i, c in enumerate(self.columns)}
+        pos = self._pos.get("id")
+        self._rows = {_key(t[pos] if pos is not None and pos < len(t) and t[pos] is not _ABSENT else None): t
+                      for t in rows}
+        self._seq = None
+        self._next_seq = len(self._rows)
+        self._indexes = {c: None for c in self._indexes}
+        self._dirty = {c: set() for c in self._indexes}
+        self._sorted = {c: None for c in self._sorted}
+
+    # --- API ---
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return (self._decode(t) for t in self._rows.values())
+
+    def all(self, columns: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        decode = self._decoder(columns)
+        return [decode(t) for t in self._rows.values()]
+
+    def head(self, limit: int, columns: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        decode = self._decoder(columns)
+        return [decode(t) for t in islice(self._rows.values(), max(limit, 0))]
+
+    def get(self, id_value: Any) -> Optional[Dict[str, Any]]:
+        tup = self._rows.get(_key(id_value))
+        return None if tup is None else self._decode(tup)
+
+    def get_many(self, ids: Iterable[Any], columns: Optional[Sequence[str]] = None) -> List[Optional[Dict[str, Any]]]:
+        """Filas para cada id, en el mismo orden (`None` si no existe)."""
+        decode = self._decoder(columns)
+        rows = self._rows
+        return [None if t is None else decode(t) for t in (rows.get(_key(i)) for i in ids)]
+
+    def where(self, column: str, value: Any, columns: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        """Filas con `row.get(column) == value` en orden de tabla."""
+        decode = self._decoder(columns)
+        index = self._index(column)
+        if index is not None:
+            try:
+                keys = self._bucket_keys(column, value, index)
+            except TypeError:  # valor buscado no hashable
+                keys = None
+            if keys is not None:
+                return [decode(self._rows[k]) for k in keys]
+        return [decode(t) for t in self._rows.values() if self._value(t, column) == value]
+
+    def _range(self, order_by: str, where: Optional[Tuple[str, Any]],
+               between: Tuple[str, Any, Any]) -> List[_Entry]:
+        """Entradas `(order_by, id)` ordenadas de las filas con `low <= columna <= high`.
+
+        Con índice ordenado sobre la columna, los extremos se buscan por
+        bisección y sólo se recorren las filas del rango; si además se ordena
+        por esa columna y no hay `where`, el rango ya es el resultado.
+        """
+        column, low, high = between
+        entries = self._sorted_index(column)
+        if entries is None:
+            keys = [k for k, t in self._rows.items() if _in_range(self._value(t, column), low, high)]
+        else:
+            # sólo valores numéricos: sort_value los pone delante de textos y nulos
+            start = 0 if low is None else bisect_left(entries, (sort_value(low),))
+            stop = bisect_left(entries, ((1,),)) if high is None else bisect_right(entries, (sort_value(high), (3,)))
+            if order_by == column and where is None:
+                return entries[start:stop]
+            keys = [e[2] for e in entries[start:stop]]
+        if where is not None:
+            keys = [k for k in keys if self._value(self._rows[k], where[0]) == where[1]]
+        return sorted(self._entry(k, self._rows[k], order_by) for k in keys)
+
+    def page(
+        self,
+        order_by: str = "id",
+        after: Optional[Sequence[Any]] = None,
+        limit: Optional[int] = None,
+        where: Optional[Tuple[str, Any]] = None,
+        columns: Optional[Sequence[str]] = None,
+        between: Optional[Tuple[str, Any, Any]] = None,
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """Página keyset ordenada por `(order_by, id)` ascendente.
+
+        `after` es la posición de la última fila ya entregada: `(valor, id)`
+        (o `(id,)` si se ordena por id). `where` es un filtro de igualdad
+        opcional `(columna, valor)`; `between` un rango numérico opcional
+        `(columna, mínimo, máximo)` (extremos incluidos, `None` = abierto);
+        `columns` limita las columnas devueltas.
+        Devuelve `(filas, total_coincidentes)`.
+        """
+        if after is not None:
+            last_id = after[-1]
+            bound = (sort_value(after[0]), sort_value(last_id), _key(last_id))
+        if between is not None:
+            entries = self._range(order_by, where, between)
+        else:
+            entries = None if where is not None else self._sorted_index(order_by)
+        if entries is None:
+            # candidatos vía índice secundario (o escaneo) y orden en el momento
+            rows = self.where(*where) if where is not None else self.all()
+            candidates = sorted(
+                (sort_value(r.get(order_by)), sort_value(r.get("id")), _key(r.get("id"))) for r in rows
+            )
+            start = bisect_right(candidates, bound) if after is not None else 0
+            stop = len(candidates) if limit is None else start + limit
+            entries = candidates
+        else:
+            start = bisect_right(entries, bound) if after is not None else 0
+            stop = len(entries) if limit is None else start + limit
+        decode = self._decoder(columns)
+        return [decode(self._rows[e[2]]) for e in entries[start:stop]], len(entries)
+
+    def insert(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        key = _key(row.get("id"))
+        old = self._rows.get(key)
+        if old is not None:
+            self._index_remove(key, old)
+        tup = self._encode(row)
+        self._rows[key] = tup
+        if old is None:
+            if self._seq is not None:
+                self._seq[key] = self._next_seq
+            self._next_seq += 1
+        self._index_add(key, tup, in_order=old is None)
+        return self._decode(tup)
+
+    def update(self, id_value: Any, payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        key = _key(id_value)
+        old = self._rows.get(key)
+        if old is None:
+            return None
+        updated = self._decode(old)
+        updated.update(payload)
+        tup = self._encode(updated)
+        new_key = _key(updated.get("id"))
+        self._index_remove(key, old)
+        if new_key == key:
+            self._rows[key] = tup
+        else:
+            # cambio de clave primaria: conservamos la posición de la fila
+            self._rows = {(new_key if k == key else k): (tup if k == key else t) for k, t in self._rows.items()}
+            if self._seq is not None:
+                self._seq[new_key] = self._seq.pop(key)
+        self._index_add(new_key, tup, in_order=False)
+        return self._decode(tup)
+
+    def delete(self, id_value: Any) -> Optional[Dict[str, Any]]:
+        key = _key(id_value)
+        tup = self._rows.pop(key, None)
+        if tup is None:
+            return None
+        if self._seq is not None:
+            del self._seq[key]
+        self._index_remove(key, tup)
+        return self._decode(tup)
@@ -0,0 +1,241 @@
+"""Métricas en proceso con formato de exposición Prometheus (`/metrics`).
+
+- `MetricsMiddleware` (ASGI) mide cada petición HTTP: latencia, código y
+  tamaño de la respuesta, etiquetados por método y plantilla de ruta
+  (`/products/{product_id}`, no la URL concreta, para acotar las series).
+- `app.supabase_client` llama a `observe_upstream` en cada petición a
+  PostgREST, con la tabla y la operación (`list`, `get`, `insert`, ...).
+- `app.db` llama a `db_error` cuando una llamada falla y devuelve `None`,
+  así los errores quedan contados por tipo en vez de perderse.
+
+Con `METRICS_SERVER_TIMING=1` cada respuesta lleva además una cabecera
+`Server-Timing` con el tiempo pasado esperando a Supabase (`upstream`), el
+resto (`app`: validación, serialización, ...) y el total.
+
+Las métricas son por proceso: con varios workers, Prometheus debe leer cada
+uno por separado.
+"""
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+SERVER_TIMING = os.getenv("METRICS_SERVER_TIMING", "0").lower() in ("1", "true", "yes")
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+_HELP: Dict[str, Tuple[str, str]] = {
+    "http_requests_total": ("counter", "Peticiones HTTP atendidas."),
+    "http_request_duration_seconds": ("histogram", "Latencia de las peticiones HTTP."),
+    "http_response_size_bytes": ("histogram", "Tamaño del cuerpo de las respuestas HTTP."),
+    "upstream_requests_total": ("counter", "Peticiones a PostgREST por tabla, operación y resultado."),
+    "upstream_request_duration_seconds": ("histogram", "Latencia de las peticiones a PostgREST."),
+    "upstream_response_size_bytes": ("histogram", "Tamaño de las respuestas de PostgREST."),
+    "upstream_errors_total": ("counter", "Peticiones a PostgREST fallidas, por tipo de error."),
+    "upstream_retries_total": ("counter", "Reintentos de lecturas a PostgREST."),
+    "upstream_rejected_total": ("counter", "Llamadas a PostgREST cortadas por el circuit breaker."),
+    "db_errors_total": ("counter", "Errores absorbidos por app.db (la llamada devolvió None)."),
+    "db_stale_served_total": ("counter", "Lecturas servidas con el último resultado bueno tras un fallo."),
+}
+
+
+class _Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]) -> None:
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+
+_LOCK = threading.Lock()
+_COUNTERS: Dict[Tuple[str, Labels], float] = {}
+_HISTOGRAMS: Dict[Tuple[str, Labels], _Histogram] = {}
+
+# [segundos esperando a PostgREST, llamadas] de la petición HTTP en curso.
+# Es una lista (mutable) para que las llamadas hechas desde el threadpool,
+# que ven una copia del contexto, sumen sobre el mismo objeto.
+_UPSTREAM: ContextVar[Optional[List[float]]] = ContextVar("metrics_upstream", default=None)
+
+
+def _inc(name: str, labels: Labels, amount: float = 1) -> None:
+    key = (name, labels)
+    with _LOCK:
+        _COUNTERS[key] = _COUNTERS.get(key, 0) + amount
+
+
+def _observe(name: str, labels: Labels, value: float, buckets: Tuple[float, ...]) -> None:
+    key = (name, labels)
+    with _LOCK:
+        hist = _HISTOGRAMS.get(key)
+        if hist is None:
+            hist = _HISTOGRAMS[key] = _Histogram(buckets)
+        hist.observe(value)
+
+
+def error_type(exc: BaseException) -> str:
+    """`http_<código>` para respuestas de error de PostgREST; si no, el nombre de la excepción."""
+    response = getattr(exc, "response", None)
+    status = getattr(response, "status_code", None)
+    if isinstance(status, int):
+        return f"http_{status}"
+    return type(exc).__name__
+
+
+def observe_request(method: str, route: str, status: int, seconds: float, size: int) -> None:
+    labels = (("method", method), ("route", route), ("status", str(status)))
+    _inc("http_requests_total", labels)
+    _observe("http_request_duration_seconds", labels[:2], seconds, LATENCY_BUCKETS)
+    _observe("http_response_size_bytes", labels[:2], size, SIZE_BUCKETS)
+
+
+def observe_upstream(table: str, op: str, seconds: float, status: Optional[int] = None,
+                     size: int = 0, error: Optional[BaseException] = None) -> None:
+    """Una petición a PostgREST. `error` si no llegó a haber respuesta o fue un error HTTP."""
+    labels = (("table", table), ("op", op))
+    outcome = str(status) if status is not None else "error"
+    _inc("upstream_requests_total", labels + (("status", outcome),))
+    _observe("upstream_request_duration_seconds", labels, seconds, LATENCY_BUCKETS)
+    if status is not None:
+        _observe("upstream_response_size_bytes", labels, size, SIZE_BUCKETS)
+    if error is not None:
+        _inc("upstream_errors_total", labels + (("type", error_type(error)),))
+    current = _UPSTREAM.get()
+    if current is not None:
+        current[0] += seconds
+        current[1] += 1
+
+
+def upstream_retry(table: str, op: str) -> None:
+    _inc("upstream_retries_total", (("table", table), ("op", op)))
+
+
+def upstream_rejected(table: str, op: str) -> None:
+    _inc("upstream_rejected_total", (("table", table), ("op", op)))
+
+
+def db_error(table: str, op: str, exc: BaseException) -> None:
+    _inc("db_errors_total", (("table", table), ("op", op), ("type", error_type(exc))))
+
+
+def db_stale_served(table: str, op: str) -> None:
+    _inc("db_stale_served_total", (("table", table), ("op", op)))
+
+
+def reset() -> None:
+    with _LOCK:
+        _COUNTERS.clear()
+        _HISTOGRAMS.clear()
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt_labels(labels: Iterable[Tuple[str, str]]) -> str:
+    inner = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+    return "{" + inner + "}" if inner else ""
+
+
+def _fmt_number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def render(gauges: Optional[Dict[str, Tuple[str, float]]] = None) -> str:
+    """Texto de exposición Prometheus (versión 0.0.4).
+
+    `gauges`: valores instantáneos añadidos por el llamador, `nombre -> (ayuda, valor)`.
+    """
+    with _LOCK:
+        counters = sorted(_COUNTERS.items())
+        histograms = sorted((k, (list(h.counts), h.sum, h.count, h.buckets)) for k, h in _HISTOGRAMS.items())
+    lines: List[str] = []
+    seen = set()
+
+    def header(name: str) -> None:
+        if name not in seen:
+            seen.add(name)
+            kind, text = _HELP[name]
+            lines.append(f"# HELP {name} {text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+    for (name, labels), value in counters:
+        header(name)
+        lines.append(f"{name}{_fmt_labels(labels)} {_fmt_number(value)}")
+    for (name, labels), (counts, total, count, buckets) in histograms:
+        header(name)
+        cumulative = 0
+        for bound, n in zip(buckets, counts):
+            cumulative += n
+            lines.append(f"{name}_bucket{_fmt_labels(labels + (('le', _fmt_number(bound)),))} {cumulative}")
+        lines.append(f"{name}_bucket{_fmt_labels(labels + (('le', '+Inf'),))} {count}")
+        lines.append(f"{name}_sum{_fmt_labels(labels)} {_fmt_number(total)}")
+        lines.append(f"{name}_count{_fmt_labels(labels)} {count}")
+    for name, (text, value) in sorted((gauges or {}).items()):
+        lines.append(f"# HELP {name} {text}")
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {_fmt_number(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def _route_label(scope: Dict[str, Any], root_path: str) -> str:
+    route = scope.get("route")
+    if route is not None:
+        return getattr(route, "path", "unmatched")
+    # Mount (p. ej. /static): el router deja en root_path el prefijo montado
+    mounted = scope.get("root_path", "")[len(root_path):]
+    return mounted or "unmatched"
+
+
+class MetricsMiddleware:
+    """Middleware ASGI: registra cada petición HTTP y, si se pide, añade `Server-Timing`."""
+
+    def __init__(self, app: Any, server_timing: Optional[bool] = None) -> None:
+        self.app = app
+        self.server_timing = SERVER_TIMING if server_timing is None else server_timing
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        root_path = scope.get("root_path", "")
+        upstream = [0.0, 0]
+        token = _UPSTREAM.set(upstream)
+        status = 500
+        size = 0
+
+        async def send_wrapper(message: Dict[str, Any]) -> None:
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.server_timing:
+                    total = (time.perf_counter() - start) * 1000
+                    waited = upstream[0] * 1000
+                    value = (f'upstream;dur={waited:.1f};desc="{int(upstream[1])} calls", '
+                             f"app;dur={max(total - waited, 0):.1f}, total;dur={total:.1f}")
+                    message = dict(message)
+                    message["headers"] = list(message.get("headers", [])) + [(b"server-timing", value.encode())]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _UPSTREAM.reset(token)
+            observe_request(scope["method"], _route_label(scope, root_path), status,
+                            time.perf_counter() - start, size)
@@ -0,0 +1,492 @@
+"""Persistencia opcional del fallback en memoria de `app.db` (`MEMSTORE_DIR`).
+
+En el directorio hay dos ficheros:
+
+- `snapshot.bin`: `MAGIC`, una cabecera (longitud u32 + marshal) con la
+  generación, los contadores de ids y la posición de cada tabla, y después
+  un bloque marshal `(columnas, filas)` por tabla. El fichero se abre con
+  mmap y cada tabla se decodifica la primera vez que se usa, así que el
+  arranque no depende del tamaño del catálogo.
+- `log.<gen>`: registro de escrituras posteriores al snapshot `gen`. Cada
+  registro es `longitud u32 | crc32 u32 | marshal(op)`; un registro
+  incompleto o corrupto al final (caída a mitad de escritura) se descarta.
+
+`Journal.compact` escribe un snapshot nuevo (las tablas sin cambios se
+copian tal cual, sin decodificarlas) y empieza un log vacío. El orden de
+los pasos hace que una caída en cualquier punto deje un estado recuperable.
+
+Con `shared=True` varios procesos (workers) usan el mismo directorio: cada
+escritura se hace con el lock de fichero `lock` tomado (`locked`), después
+de aplicar lo que otros hayan añadido al log (`catch_up`), y así el
+contador de ids es común. Para ver las escrituras ajenas sin esperar a
+escribir, `has_news` dice si el log ha crecido (lo consulta un hilo). Si
+otro proceso compacta, `catch_up` termina de leer el log antiguo (sigue
+abierto aunque se borre) y continúa en el de la generación siguiente.
+"""
+import marshal
+import mmap
+import os
+import secrets
+import struct
+import threading
+import zlib
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin modo compartido
+    fcntl = None
+
+from .memstore import Table
+
+MAGIC = b"MEMSNAP1"
+SNAPSHOT = "snapshot.bin"
+LOCK = "lock"
+STORE_ID = "store.id"
+_U32 = struct.Struct(">I")
+_RECORD = struct.Struct(">II")  # longitud, crc32
+
+Op = Tuple[Any, ...]
+
+
+def _log_name(gen: int) -> str:
+    return f"log.{gen}"
+
+
+def _fsync_dir(directory: str) -> None:
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _records(data: bytes) -> Iterator[Tuple[Op, int]]:
+    """Registros válidos del log como `(op, posición final)`; para en el primero dañado."""
+    pos = 0
+    while pos + _RECORD.size <= len(data):
+        length, crc = _RECORD.unpack_from(data, pos)
+        start, end = pos + _RECORD.size, pos + _RECORD.size + length
+        if end > len(data) or zlib.crc32(data[start:end]) != crc:
+            return
+        try:
+            op = marshal.loads(data[start:end])
+        except (EOFError, ValueError, TypeError):
+            return
+        yield op, end
+        pos = end
+
+
+def version(gen: int, pos: int) -> int:
+    """Versión global de una posición del log (igual en todos los procesos)."""
+    return (gen << 40) | pos
+
+
+def _apply(table: Table, op: Op) -> None:
+    kind = op[0]
+    if kind == "i":
+        table.insert(op[2])
+    elif kind == "u":
+        table.update(op[2], op[3])
+    elif kind == "d":
+        table.delete(op[2])
+
+
+class LazyTables(dict):
+    """dict de tablas que decodifica cada tabla del snapshot en su primer acceso."""
+
+    def __init__(self, loaders: Dict[str, Callable[[], Table]]) -> None:
+        super().__init__()
+        self._loaders = loaders
+        # un lock por tabla: decodificar una tabla grande no bloquea las demás
+        self._locks = {name: threading.Lock() for name in loaders}
+
+    def _load(self, name: str) -> None:
+        if name in self._loaders:
+            with self._locks[name]:
+                loader = self._loaders.get(name)
+                if loader is not None:
+                    # se quita el loader después de cargar: otro hilo que llegue
+                    # mientras tanto espera el lock en vez de ver la tabla vacía
+                    dict.__setitem__(self, name, loader())
+                    del self._loaders[name]
+
+    def get(self, name: str, default: Any = None) -> Any:
+        self._load(name)
+        return super().get(name, default)
+
+    def __getitem__(self, name: str) -> Table:
+        self._load(name)
+        return super().__getitem__(name)
+
+    def __setitem__(self, name: str, table: Table) -> None:
+        self._loaders.pop(name, None)
+        super().__setitem__(name, table)
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._loaders or super().__contains__(name)
+
+    def pending(self) -> List[str]:
+        """Tablas del snapshot que todavía no se han decodificado."""
+        return list(self._loaders)
+
+    def warm(self) -> None:
+        """Decodifica todas las tablas pendientes (p. ej. desde un hilo tras arrancar)."""
+        for name in self.pending():
+            self._load(name)
+
+
+class Journal:
+    """Snapshot + log de escrituras de un directorio.
+
+    `open` devuelve las tablas (perezosas) y los contadores de ids ya con el
+    log reaplicado: las escrituras del log sobre una tabla aún sin
+    decodificar se guardan y se aplican cuando se decodifica. Después
+    `append` añade cada escritura y `commit` la vuelca al fichero (con
+    `fsync=True`, también a disco).
+    """
+
+    def __init__(self, directory: str, fsync: bool = False, compact_bytes: int = 64 * 1024 * 1024,
+                 shared: bool = False) -> None:
+        if shared and fcntl is None:
+            raise RuntimeError("el modo compartido necesita fcntl (POSIX)")
+        self.directory = directory
+        self.fsync = fsync
+        self.compact_bytes = compact_bytes
+        self.shared = shared
+        self.gen = 0
+        self._log = None
+        self._log_bytes = 0
+        self._map: Optional[mmap.mmap] = None
+        self._data_start = 0
+        # tabla -> (posición, longitud, crc32) dentro del snapshot actual
+        self._blocks: Dict[str, Tuple[int, int, int]] = {}
+        # tablas modificadas desde el snapshot actual
+        self._dirty: Set[str] = set()
+        # escrituras del log pendientes de aplicar a tablas sin decodificar
+        self._replay: Dict[str, List[Op]] = {}
+        self._lock = threading.Lock()
+        # tabla -> versión (`version`) de la última escritura del log que la tocó
+        self.versions: Dict[str, int] = {}
+        # identificador del directorio (distingue un almacén de otro recreado)
+        self.store_id = ""
+        # modo compartido: lector del log actual, hasta dónde se ha aplicado,
+        # inodo del snapshot cargado y lock entre procesos
+        self._reader = None
+        self._read_pos = 0
+        self._snap_ino = 0
+        self._flock = None
+        self._owner = threading.RLock()
+        self._depth = 0
+
+    # --- arranque ---
+
+    def _read_snapshot(self) -> Dict[str, int]:
+        path = os.path.join(self.directory, SNAPSHOT)
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            return {}
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        m = self._map
+        if m[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path}: no es un snapshot válido")
+        (length,) = _U32.unpack_from(m, len(MAGIC))
+        start = len(MAGIC) + _U32.size
+        header = marshal.loads(m[start:start + length])
+        self._data_start = start + length
+        self.gen = header["gen"]
+        self._blocks = dict(header["tables"])
+        return dict(header["autoinc"])
+
+    def _block(self, name: str) -> bytes:
+        offset, length, crc = self._blocks[name]
+        start = self._data_start + offset
+        data = self._map[start:start + length]
+        if zlib.crc32(data) != crc:
+            raise ValueError(f"snapshot: tabla {name} corrupta")
+        return data
+
+    def _loader(self, name: str, make_table: Callable[[str], Table]) -> Callable[[], Table]:
+        def load() -> Table:
+            columns, rows = marshal.loads(self._block(name))
+            table = make_table(name)
+            table.restore(columns, rows)
+            for op in self._replay.pop(name, ()):
+                _apply(table, op)
+            return table
+        return load
+
+    @contextmanager
+    def locked(self) -> Iterator[None]:
+        """Exclusión entre procesos (y entre hilos del proceso); reentrante."""
+        if not self.shared:
+            yield
+            return
+        with self._owner:
+            if self._depth == 0:
+                if self._flock is None:
+                    os.makedirs(self.directory, exist_ok=True)
+                    self._flock = open(os.path.join(self.directory, LOCK), "a")
+                fcntl.flock(self._flock.fileno(), fcntl.LOCK_EX)
+            self._depth += 1
+            try:
+                yield
+            finally:
+                self._depth -= 1
+                if self._depth == 0:
+                    fcntl.flock(self._flock.fileno(), fcntl.LOCK_UN)
+                    if self._log is None and self._reader is None:  # cerrado dentro del lock
+                        self._flock.close()
+                        self._flock = None
+
+    def _read_store_id(self) -> str:
+        path = os.path.join(self.directory, STORE_ID)
+        if not os.path.exists(path):
+            with open(path + ".new", "w") as f:
+                f.write(secrets.token_hex(8))
+            os.replace(path + ".new", path)
+        with open(path) as f:
+            return f.read().strip()
+
+    def _replay_ops(self, records: Iterator[Tuple[Op, int]], tables: LazyTables, autoinc: Dict[str, int],
+                    make_table: Callable[[str], Table], base: int = 0,
+                    defer: bool = True) -> Tuple[List[Tuple[Op, int]], int]:
+        """Aplica registros del log; devuelve `[(op, versión)]` y la posición final.
+
+        Con `defer` las escrituras sobre tablas sin decodificar se guardan para
+        cuando se decodifiquen; si no (`catch_up`, con el hilo de `warm` quizá
+        decodificándolas a la vez), la tabla se decodifica antes de aplicarlas.
+        """
+        applied: List[Tuple[Op, int]] = []
+        good = 0
+        pending = set(tables.pending()) if defer else ()
+        for op, end in records:
+            good = end
+            kind, name = op[0], op[1]
+            self._dirty.add(name)
+            if kind == "i":
+                rid = op[2].get("id")
+                if isinstance(rid, int) and rid >= autoinc.get(name, 1):
+                    autoinc[name] = rid + 1
+            v = version(self.gen, base + end)
+            self.versions[name] = v
+            applied.append((op, v))
+            if name in pending:
+                self._replay.setdefault(name, []).append(op)
+                continue
+            t = tables.get(name) if not defer else dict.get(tables, name)
+            if t is None:
+                t = tables[name] = make_table(name)
+            _apply(t, op)
+        return applied, good
+
+    def open(self, make_table: Callable[[str], Table]) -> Tuple[LazyTables, Dict[str, int]]:
+        os.makedirs(self.directory, exist_ok=True)
+        with self.locked():
+            return self._open(make_table)
+
+    def _open(self, make_table: Callable[[str], Table]) -> Tuple[LazyTables, Dict[str, int]]:
+        self.store_id = self._read_store_id()
+        autoinc = self._read_snapshot()
+        tables = LazyTables({name: self._loader(name, make_table) for name in self._blocks})
+        current = _log_name(self.gen)
+        for name in os.listdir(self.directory):
+            # restos de una compactación interrumpida
+            if (name.startswith("log.") and name != current) or name.endswith(".tmp"):
+                os.remove(os.path.join(self.directory, name))
+        path = os.path.join(self.directory, current)
+        data = b""
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                data = f.read()
+        _, good = self._replay_ops(_records(data), tables, autoinc, make_table)
+        self._log = open(path, "ab")
+        if good < len(data):
+            self._log.truncate(good)  # registro final incompleto
+        self._log_bytes = good
+        if self.shared:
+            self._reader = open(path, "rb")
+            self._read_pos = good
+            self._snap_ino = self._snapshot_ino()
+        return tables, autoinc
+
+    def _snapshot_ino(self, gen: Optional[int] = None) -> int:
+        """Inodo del snapshot actual (0 si no hay; con `gen`, también si no es de esa generación)."""
+        path = os.path.join(self.directory, SNAPSHOT)
+        try:
+            if gen is None:
+                return os.stat(path).st_ino
+            with open(path, "rb") as f:
+                head = f.read(len(MAGIC) + _U32.size)
+                (length,) = _U32.unpack_from(head, len(MAGIC))
+                if marshal.loads(f.read(length)).get("gen") != gen:
+                    return 0
+                return os.fstat(f.fileno()).st_ino
+        except (OSError, ValueError, EOFError, struct.error):
+            return 0
+
+    # --- modo compartido ---
+
+    def has_news(self) -> bool:
+        """¿Hay en el log (o en una generación nueva) escrituras aún no aplicadas aquí?"""
+        reader = self._reader
+        if reader is None:
+            return False
+        try:
+            if os.fstat(reader.fileno()).st_size > self._read_pos:
+                return True
+        except (OSError, ValueError):
+            return False
+        return os.path.exists(os.path.join(self.directory, _log_name(self.gen + 1))) \
+            or self._snapshot_ino() != self._snap_ino
+
+    def catch_up(self, tables: LazyTables, autoinc: Dict[str, int],
+                 make_table: Callable[[str], Table]) -> Optional[List[Tuple[Op, int]]]:
+        """Aplica lo que otros procesos han añadido al log desde la última vez.
+
+        Devuelve `[(op, versión)]` aplicadas, o `None` si este proceso se ha
+        quedado atrás más de una compactación y hay que volver a abrir (`open`).
+        """
+        applied: List[Tuple[Op, int]] = []
+        with self._lock:
+            while True:
+                size = os.fstat(self._reader.fileno()).st_size
+                if size > self._read_pos:
+                    data = os.pread(self._reader.fileno(), size - self._read_pos, self._read_pos)
+                    ops, good = self._replay_ops(_records(data), tables, autoinc, make_table,
+                                                 self._read_pos, defer=False)
+                    applied.extend(ops)
+                    self._read_pos += good
+                    if good < len(data):
+                        break  # registro a medio escribir: se leerá en la próxima vuelta
+                nxt = os.path.join(self.directory, _log_name(self.gen + 1))
+                if os.path.exists(nxt):
+                    # otro proceso compactó: el log anterior ya está completo
+                    if os.fstat(self._reader.fileno()).st_size > self._read_pos:
+                        continue
+                    try:
+                        self._switch(self.gen + 1, nxt)
+                    except FileNotFoundError:
+                        return None  # ya se compactó otra vez y se borró
+                    continue
+                if self._snapshot_ino() != self._snap_ino:
+                    return None
+                break
+            self._log_bytes = self._read_pos
+        return applied
+
+    def _switch(self, gen: int, path: str) -> None:
+        # las tablas aún sin decodificar siguen leyendo del snapshot anterior
+        # (su contenido más el log anterior, que ya está aplicado o en _replay)
+        reader = open(path, "rb")
+        self._reader.close()
+        self._reader = reader
+        # sin O_CREAT: si ya se borró, no se vuelve a crear vacío
+        log = os.fdopen(os.open(path, os.O_WRONLY | os.O_APPEND), "ab")
+        if self._log is not None:
+            self._log.close()
+        self._log = log
+        self.gen, self._read_pos, self._log_bytes = gen, 0, 0
+        # si el snapshot ya es de una generación posterior, queda distinto a
+        # propósito: o hay un log siguiente que seguir o toca volver a abrir
+        self._snap_ino = self._snapshot_ino(gen)
+
+    def position(self) -> int:
+        """Versión global de la última escritura aplicada en este proceso."""
+        return version(self.gen, self._read_pos)
+
+    # --- escrituras ---
+
+    def append(self, op: Op) -> None:
+        """Añade una escritura: `("i", tabla, fila)`, `("u", tabla, id, cambios)` o `("d", tabla, id)`."""
+        payload = marshal.dumps(op)
+        with self._lock:
+            self._log.write(_RECORD.pack(len(payload), zlib.crc32(payload)))
+            self._log.write(payload)
+            self._log_bytes += _RECORD.size + len(payload)
+            self._dirty.add(op[1])
+
+    def commit(self) -> None:
+        with self._lock:
+            if self._log is None:
+                return
+            self._log.flush()
+            if self.fsync:
+                os.fsync(self._log.fileno())
+            if self.shared:
+                # con el lock tomado y al día: lo escrito ya está aplicado aquí
+                self._read_pos = self._log_bytes = self._log.tell()
+
+    def needs_compaction(self) -> bool:
+        return self._log_bytes >= self.compact_bytes
+
+    # --- compactación ---
+
+    def compact(self, tables: Dict[str, Table], autoinc: Dict[str, int]) -> None:
+        """Escribe un snapshot con el estado actual y empieza un log vacío."""
+        with self._lock:
+            pending = tables.pending() if isinstance(tables, LazyTables) else []
+            blocks: List[Tuple[str, bytes]] = []
+            for name in sorted(set(dict.keys(tables)) | set(pending)):
+                if name not in self._dirty and name in self._blocks:
+                    blocks.append((name, self._block(name)))  # sin cambios: se copia tal cual
+                else:
+                    blocks.append((name, marshal.dumps(tables[name].dump())))
+            index: Dict[str, Tuple[int, int, int]] = {}
+            offset = 0
+            for name, data in blocks:
+                index[name] = (offset, len(data), zlib.crc32(data))
+                offset += len(data)
+            gen = self.gen + 1
+            header = marshal.dumps({"gen": gen, "autoinc": dict(autoinc), "tables": index})
+            final = os.path.join(self.directory, SNAPSHOT)
+            tmp = final + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(MAGIC + _U32.pack(len(header)) + header)
+                for _, data in blocks:
+                    f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            # 1) log nuevo vacío, 2) el snapshot nuevo pasa a ser el actual,
+            # 3) se borra el log antiguo. Tras una caída antes de (2) manda el
+            # snapshot anterior y su log; después, el nuevo.
+            new_log = open(os.path.join(self.directory, _log_name(gen)), "ab")
+            os.replace(tmp, final)
+            _fsync_dir(self.directory)
+            old_log, old_gen = self._log, self.gen
+            self._log, self._log_bytes, self.gen = new_log, 0, gen
+            if old_log is not None:
+                old_log.close()
+            if self.shared:
+                self._reader.close()
+                self._reader = open(os.path.join(self.directory, _log_name(gen)), "rb")
+                self._read_pos = 0
+                self._snap_ino = self._snapshot_ino()
+            old_path = os.path.join(self.directory, _log_name(old_gen))
+            if os.path.exists(old_path):
+                os.remove(old_path)
+            # las tablas aún sin decodificar se leerán del snapshot nuevo
+            if self._map is not None:
+                self._map.close()
+            with open(final, "rb") as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._data_start = len(MAGIC) + _U32.size + len(header)
+            self._blocks = index
+            self._dirty.clear()
+
+    def close(self, tables: Optional[Dict[str, Table]] = None, autoinc: Optional[Dict[str, int]] = None) -> None:
+        """Vuelca el log; con `tables` compacta antes si el log no está vacío."""
+        if tables is not None and autoinc is not None and self._log_bytes:
+            self.compact(tables, autoinc)
+        self.commit()
+        with self._lock:
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+            if self._reader is not None:
+                self._reader.close()
+                self._reader = None
+        if self._flock is not None and self._depth == 0:
+            self._flock.close()
+            self._flock = None
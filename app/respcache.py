@@ -0,0 +1,118 @@
+"""Respuestas JSON del catálogo ya serializadas.
+
+Las listas (`/products`, `/categories`, `/index`, búsqueda) se sirven sin
+pasar por `response_model`: las filas vienen de nuestra propia base de
+datos, así que en vez de construir y validar un modelo pydantic por fila
+`project` se queda con los campos del esquema (convirtiendo a float los
+campos float, igual que haría pydantic) y `dumps` las codifica con orjson
+si está instalado o, si no, con `pydantic_core.to_json`.
+
+El cuerpo codificado se guarda en una caché LRU (limitada en bytes,
+`RESPONSE_CACHE_MAX_BYTES`) indexada por el ETag de la respuesta, que ya
+combina ruta + query + versión de las tablas (`db.version_tag`): una
+escritura cambia la versión y las entradas antiguas dejan de pedirse y
+acaban desalojadas.
+"""
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from pydantic_core import to_json
+
+try:
+    import orjson
+except ImportError:  # opcional: más rápido que pydantic_core.to_json
+    orjson = None
+
+ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "1").lower() in ("1", "true", "yes")
+MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# etag -> (cuerpo, cabeceras)
+_ENTRIES: "OrderedDict[str, Tuple[bytes, Dict[str, str]]]" = OrderedDict()
+_LOCK = threading.Lock()
+_STATS: Dict[str, int] = {"hits": 0, "misses": 0, "evictions": 0, "bytes": 0}
+_FIELDS: Dict[Tuple[type, Optional[Tuple[str, ...]]], Tuple[Tuple[str, bool], ...]] = {}
+
+
+def dumps(data: Any) -> bytes:
+    if orjson is not None:
+        try:
+            return orjson.dumps(data)
+        except TypeError:
+            pass  # tipos que orjson no conoce: pydantic_core los convierte
+    return to_json(data)
+
+
+def _fields(model: type, fields: Optional[Tuple[str, ...]]) -> Tuple[Tuple[str, bool], ...]:
+    key = (model, fields)
+    spec = _FIELDS.get(key)
+    if spec is None:
+        names = fields or tuple(model.model_fields)
+        spec = _FIELDS[key] = tuple((n, model.model_fields[n].annotation is float) for n in names)
+    return spec
+
+
+def project(model: type, rows: Iterable[Optional[Dict[str, Any]]],
+            fields: Optional[Tuple[str, ...]] = None) -> List[Optional[Dict[str, Any]]]:
+    """Filas con sólo los campos de `model` (o `fields`), sin validarlas."""
+    spec = _fields(model, fields)
+    out: List[Optional[Dict[str, Any]]] = []
+    for row in rows:
+        if row is None:
+            out.append(None)
+            continue
+        item = {}
+        for name, is_float in spec:
+            value = row.get(name)
+            if is_float and type(value) is int:
+                value = float(value)
+            item[name] = value
+        out.append(item)
+    return out
+
+
+def get(etag: Optional[str]) -> Optional[Tuple[bytes, Dict[str, str]]]:
+    if not ENABLED or not etag:
+        return None
+    with _LOCK:
+        entry = _ENTRIES.get(etag)
+        if entry is None:
+            _STATS["misses"] += 1
+            return None
+        _ENTRIES.move_to_end(etag)
+        _STATS["hits"] += 1
+        return entry
+
+
+def put(etag: Optional[str], body: bytes, headers: Dict[str, str]) -> None:
+    if not ENABLED or not etag or len(body) > MAX_BYTES:
+        return
+    with _LOCK:
+        old = _ENTRIES.pop(etag, None)
+        if old is not None:
+            _STATS["bytes"] -= len(old[0])
+        _ENTRIES[etag] = (body, headers)
+        _STATS["bytes"] += len(body)
+        while _STATS["bytes"] > MAX_BYTES:
+            _, (evicted, _) = _ENTRIES.popitem(last=False)
+            _STATS["bytes"] -= len(evicted)
+            _STATS["evictions"] += 1
+
+
+def clear() -> int:
+    with _LOCK:
+        n = len(_ENTRIES)
+        _ENTRIES.clear()
+        _STATS["bytes"] = 0
+    return n
+
+
+def stats() -> Dict[str, Any]:
+    with _LOCK:
+        out: Dict[str, Any] = dict(_STATS)
+        out["entries"] = len(_ENTRIES)
+    out["enabled"] = ENABLED
+    out["max_bytes"] = MAX_BYTES
+    out["encoder"] = "orjson" if orjson is not None else "pydantic_core"
+    return out
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List, Any
+from typing import Optional, List, Any, Dict
 
 
 class CategoryBase(BaseModel):
@@ -43,3 +43,77 @@ class Product(ProductBase):
 class IndexResponse(BaseModel):
     categories: List[Category]
     featured: List[Product]
+
+
+class CategoryCount(BaseModel):
+    category: str
+    count: int
+
+
+class PriceBucket(BaseModel):
+    # tramo [min, max); max null en el último
+    min: float
+    max: Optional[float] = None
+    count: int
+
+
+class FacetsResponse(BaseModel):
+    total: int
+    categories: List[CategoryCount]
+    price: List[PriceBucket]
+
+
+class BulkError(BaseModel):
+    # posición del elemento en el array recibido
+    index: int
+    detail: Any
+
+
+class CategoryBulkResult(BaseModel):
+    created: List[Category]
+    errors: List[BulkError]
+
+
+class ProductBulkResult(BaseModel):
+    created: List[Product]
+    errors: List[BulkError]
+
+
+class ProductBatch(BaseModel):
+    # un elemento por id pedido, en el mismo orden (null si no existe)
+    items: List[Optional[Product]]
+    missing: List[str]
+
+
+class CartItem(BaseModel):
+    id: Any
+    qty: int = Field(1, ge=1)
+
+
+class CartLine(BaseModel):
+    id: Any
+    name: str
+    price: float
+    qty: int
+    line_total: float
+    image_url: Optional[str] = None
+
+
+class CartQuote(BaseModel):
+    lines: List[CartLine]
+    # ids del carrito que ya no existen en el catálogo
+    missing: List[Any]
+    total: float
+
+
+class ImageInfo(BaseModel):
+    digest: str
+    url: str
+    content_type: str
+    width: Optional[int] = None
+    height: Optional[int] = None
+    bytes: int
+    # False si esa misma imagen ya estaba subida
+    created: bool
+    # "grid.webp" -> URL de la variante
+    variants: Dict[str, str]
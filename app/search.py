@@ -0,0 +1,194 @@
+"""Búsqueda de texto para productos.
+
+`normalize` / `tokenize` quitan acentos y pasan a minúsculas, de modo que
+"capitan america" encuentra "Capitán América". `InvertedIndex` mantiene un
+índice invertido incremental (`token -> {clave: peso}`) más un vocabulario
+ordenado para resolver prefijos con bisect; lo usa el fallback en memoria
+de `app.db`. `score` puntúa una fila suelta con ese mismo ranking. Con
+Supabase ordena `ts_rank` en el servidor (ver `supabase_setup.sql`).
+"""
+from bisect import bisect_left, insort
+from heapq import merge
+from itertools import product
+import re
+import unicodedata
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Peso de cada campo indexado
+FIELD_WEIGHTS: Dict[str, float] = {"name": 3.0, "description": 1.0}
+# Un token que sólo coincide como prefijo puntúa menos que uno exacto
+PREFIX_FACTOR = 0.5
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def normalize(text: str) -> str:
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch)).lower()
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return _TOKEN_RE.findall(normalize(text)) if text else []
+
+
+def _weights(row: Dict[str, Any]) -> Dict[str, float]:
+    weights: Dict[str, float] = {}
+    for field, w in FIELD_WEIGHTS.items():
+        value = row.get(field)
+        for token in tokenize(value if isinstance(value, str) else None):
+            weights[token] = max(weights.get(token, 0.0), w)
+    return weights
+
+
+def _term_score(weights: Dict[str, float], q: str) -> float:
+    prefix = max((w for t, w in weights.items() if t != q and t.startswith(q)), default=0.0)
+    return max(weights.get(q, 0.0), prefix * PREFIX_FACTOR)
+
+
+def score(row: Dict[str, Any], query_tokens: List[str]) -> float:
+    """Puntuación de una fila para la consulta (0 si algún término no coincide)."""
+    weights = _weights(row)
+    total = 0.0
+    for q in query_tokens:
+        best = _term_score(weights, q)
+        if not best:
+            return 0.0
+        total += best
+    return total
+
+
+class InvertedIndex:
+    """Índice invertido incremental.
+
+    Las listas de cada token se agrupan por peso y se recorren en orden de
+    escritura del documento, así `search` recorre los niveles de puntuación
+    de mayor a menor y para en cuanto tiene `limit` resultados, sin puntuar
+    todos los documentos que coinciden.
+    """
+
+    def __init__(self) -> None:
+        # token -> peso -> {clave: orden}
+        self._postings: Dict[str, Dict[float, Dict[str, int]]] = {}
+        self._docs: Dict[str, Dict[str, float]] = {}
+        self._vocab: List[str] = []
+        # orden de la última escritura de cada documento (desempate estable)
+        self._order: Dict[str, int] = {}
+        self._next = 0
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def add(self, key: str, row: Dict[str, Any]) -> None:
+        self.remove(key)
+        order = self._order[key] = self._next
+        self._next += 1
+        weights = _weights(row)
+        self._docs[key] = weights
+        for token, w in weights.items():
+            by_weight = self._postings.get(token)
+            if by_weight is None:
+                by_weight = self._postings[token] = {}
+                insort(self._vocab, token)
+            by_weight.setdefault(w, {})[key] = order
+
+    def remove(self, key: str) -> None:
+        weights = self._docs.pop(key, None)
+        if weights is None:
+            return
+        del self._order[key]
+        for token, w in weights.items():
+            by_weight = self._postings[token]
+            bucket = by_weight[w]
+            del bucket[key]
+            if not bucket:
+                del by_weight[w]
+                if not by_weight:
+                    del self._postings[token]
+                    del self._vocab[bisect_left(self._vocab, token)]
+
+    def _expand(self, prefix: str) -> Iterable[str]:
+        i = bisect_left(self._vocab, prefix)
+        while i < len(self._vocab) and self._vocab[i].startswith(prefix):
+            yield self._vocab[i]
+            i += 1
+
+    def _df(self, q: str, cap: int = 32) -> int:
+        """Estimación del número de documentos que casan con `q` (0 = ninguno)."""
+        total = 0
+        for n, token in enumerate(self._expand(q)):
+            if n >= cap:
+                return len(self._docs) + n
+            total += sum(len(b) for b in self._postings[token].values())
+        return total
+
+    def _tiers(self, q: str) -> List[Tuple[float, List[Dict[str, int]]]]:
+        """Niveles `(puntuación, listas)` para el término `q`, de mayor a menor."""
+        exact = self._postings.get(q, {})
+        prefixed = [self._postings[t] for t in self._expand(q) if t != q]
+        tiers: Dict[float, List[Dict[str, int]]] = {}
+        for w, bucket in exact.items():
+            tiers.setdefault(w, []).append(bucket)
+        for by_weight in prefixed:
+            for w, bucket in by_weight.items():
+                tiers.setdefault(w * PREFIX_FACTOR, []).append(bucket)
+        return sorted(tiers.items(), reverse=True)
+
+    def search(self, query: str, limit: int = 20) -> List[Tuple[str, float]]:
+        """Devuelve `[(clave, puntuación)]` de mayor a menor relevancia."""
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens or limit <= 0:
+            return []
+        if not all(self._df(q, cap=1) for q in tokens):
+            return []
+        if len(tokens) == 1:
+            return self._search_one(tokens[0], limit)
+        return self._search_many(tokens, limit)
+
+    def _search_one(self, q: str, limit: int) -> List[Tuple[str, float]]:
+        # Dentro de un nivel todos puntúan igual y las listas están en orden
+        # de escritura: basta con tomar los primeros `limit` de cada nivel.
+        results: List[Tuple[str, float]] = []
+        seen = set()
+        for tier_score, buckets in self._tiers(q):
+            stream = buckets[0] if len(buckets) == 1 else (
+                kv[0] for kv in merge(*(b.items() for b in buckets), key=lambda kv: kv[1]))
+            for key in stream:
+                if key not in seen:
+                    seen.add(key)
+                    results.append((key, tier_score))
+                    if len(results) >= limit:
+                        return results
+        return results
+
+    def _search_many(self, tokens: List[str], limit: int) -> List[Tuple[str, float]]:
+        # Combinaciones de niveles (uno por término) en orden de puntuación
+        # total; cada combinación es una intersección de conjuntos (en C) y
+        # los conjuntos de cada nivel se construyen sólo si hacen falta.
+        tiers = [self._tiers(q) for q in tokens]
+        cache: Dict[Tuple[int, int], set] = {}
+
+        def keys(term: int, level: int) -> set:
+            found = cache.get((term, level))
+            if found is None:
+                found = cache[(term, level)] = set().union(*tiers[term][level][1])
+            return found
+
+        combos: Dict[float, List[Tuple[int, ...]]] = {}
+        for levels in product(*(range(len(t)) for t in tiers)):
+            total = sum(tiers[i][lv][0] for i, lv in enumerate(levels))
+            combos.setdefault(total, []).append(levels)
+        results: List[Tuple[str, float]] = []
+        seen: set = set()
+        order = self._order
+        for total in sorted(combos, reverse=True):
+            group: set = set()
+            for levels in combos[total]:
+                sets = sorted((keys(i, lv) for i, lv in enumerate(levels)), key=len)
+                group |= sets[0].intersection(*sets[1:])
+            group -= seen
+            seen |= group
+            for key in sorted(group, key=order.__getitem__)[:limit - len(results)]:
+                results.append((key, total))
+            if len(results) >= limit:
+                break
+        return results
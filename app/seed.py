@@ -0,0 +1,109 @@
+"""Siembra de datos de ejemplo fuera del camino de arranque de los workers.
+
+`start_background` (lo llama el startup de la app) siembra en un hilo si el
+backend es Supabase, así el worker acepta tráfico enseguida; en modo memoria
+siembra en el momento (no hay red de por medio y el almacén en memoria no
+admite escrituras desde otro hilo mientras el event loop lee).
+
+Con Supabase (o con el modo memoria compartido, `MEMSTORE_SHARED`) un
+lock de fichero (`SEED_LOCK_FILE`) hace que, si arrancan varios workers en
+la misma máquina, sólo uno siembre: los demás lo ven ocupado y siguen sin
+esperar. `db.seed_sample_data` vuelve a comprobar si
+hay datos con el lock tomado, así que sembrar es idempotente.
+
+También se puede sembrar una vez antes de arrancar (con `SEED_ON_STARTUP=0`
+en los workers):
+
+    python -m app.seed [--force]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin lock entre procesos
+    fcntl = None
+
+from . import db
+
+SEED_ON_STARTUP = os.getenv("SEED_ON_STARTUP", "1").lower() in ("1", "true", "yes")
+SEED_LOCK_FILE = os.getenv("SEED_LOCK_FILE", os.path.join(tempfile.gettempdir(), "ecommerce-seed.lock"))
+
+# Estados en los que el worker ya no espera a la siembra ("skipped": la
+# hace otro worker)
+READY_STATES = ("done", "skipped", "disabled")
+
+STATE: Dict[str, Any] = {"status": "pending", "result": None, "error": None}
+
+
+@contextmanager
+def _file_lock(path: str, wait: bool) -> Iterator[bool]:
+    if fcntl is None:
+        yield True
+        return
+    with open(path, "a") as f:
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | (0 if wait else fcntl.LOCK_NB))
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def run(force: bool = False, wait: bool = False) -> Dict[str, Any]:
+    """Siembra si hace falta y actualiza `STATE`. Devuelve una copia del estado."""
+    STATE.update(status="running", error=None)
+    try:
+        if db.backend() == "memory" and not db.shared():
+            # cada proceso tiene sus propios datos: no hay nada que coordinar
+            result = db.seed_sample_data(force=force)
+        else:
+            with _file_lock(SEED_LOCK_FILE, wait) as acquired:
+                if not acquired:
+                    STATE.update(status="skipped", result=None)
+                    return dict(STATE)
+                # almacén compartido: ver lo que ya haya sembrado otro worker
+                db.sync()
+                result = db.seed_sample_data(force=force)
+    except Exception as e:
+        STATE.update(status="failed", error=f"{type(e).__name__}: {e}")
+        print(f"Error seeding sample data: {e}")
+    else:
+        STATE.update(status="done", result=result)
+        print(f"Seeded sample data: {result}")
+    return dict(STATE)
+
+
+def start_background() -> None:
+    if not SEED_ON_STARTUP:
+        STATE["status"] = "disabled"
+        return
+    if db.backend() == "memory":
+        run()
+        return
+    STATE["status"] = "running"
+    threading.Thread(target=run, name="seed", daemon=True).start()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Siembra los datos de ejemplo una sola vez.")
+    parser.add_argument("--force", action="store_true", help="sembrar aunque ya haya datos")
+    args = parser.parse_args()
+    db.connect()
+    try:
+        state = run(force=args.force, wait=True)
+    finally:
+        db.close()
+    sys.exit(0 if state["status"] == "done" else 1)
+
+
+if __name__ == "__main__":
+    main()
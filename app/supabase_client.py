@@ -2,23 +2,138 @@
 
 Usamos la REST API para evitar dependencias con el SDK oficial y
 compatibilizar con versiones de Pydantic/FastAPI en el proyecto.
+
+Todas las llamadas comparten un único `httpx.Client` por proceso (pool de
+conexiones keep-alive, HTTP/2 opcional), que se abre/cierra desde los eventos
+startup/shutdown de FastAPI mediante `open_client()` / `close_client()`.
+Las variantes `a*` (`alist_table`, `aget_by_id`, ...) usan un
+`httpx.AsyncClient` equivalente para las rutas async.
+
+Cada petición pasa por `_send` / `_asend`, que registran en `app.metrics`
+la latencia, el código de respuesta, el tamaño y los errores por tabla y
+operación. Ahí también:
+
+- las lecturas (GET/HEAD) se reintentan hasta `SUPABASE_RETRIES` veces ante
+  errores de red o 502/503/504, con espera exponencial con jitter;
+- `BREAKER` (circuit breaker) corta las llamadas tras
+  `SUPABASE_BREAKER_FAILURES` fallos seguidos: durante
+  `SUPABASE_BREAKER_RESET` segundos fallan al momento con
+  `CircuitOpenError` en vez de esperar el timeout; después deja pasar una
+  llamada de prueba y se cierra si sale bien.
 """
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 import os
+import asyncio
+import random
+import threading
+import time
 import httpx
 
+from . import metrics
+
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_ANON_KEY = os.getenv("SUPABASE_ANON_KEY") or os.getenv("SUPABASE_KEY")
 SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY") or os.getenv("SUPABASE_KEY")
 
+# Configuración del pool de conexiones
+POOL_SIZE = int(os.getenv("SUPABASE_POOL_SIZE", "20"))
+POOL_KEEPALIVE = int(os.getenv("SUPABASE_POOL_KEEPALIVE", "10"))
+KEEPALIVE_EXPIRY = float(os.getenv("SUPABASE_KEEPALIVE_EXPIRY", "30"))
+HTTP2 = os.getenv("SUPABASE_HTTP2", "0").lower() in ("1", "true", "yes")
+
+# Timeouts por tipo de operación (segundos)
+CONNECT_TIMEOUT = float(os.getenv("SUPABASE_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.getenv("SUPABASE_READ_TIMEOUT", "10"))
+WRITE_TIMEOUT = float(os.getenv("SUPABASE_WRITE_TIMEOUT", "10"))
+
+# Reintentos de lecturas y circuit breaker
+RETRIES = int(os.getenv("SUPABASE_RETRIES", "2"))
+RETRY_BACKOFF = float(os.getenv("SUPABASE_RETRY_BACKOFF", "0.05"))
+BREAKER_FAILURES = int(os.getenv("SUPABASE_BREAKER_FAILURES", "5"))
+BREAKER_RESET = float(os.getenv("SUPABASE_BREAKER_RESET", "30"))
+
+_READ = httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT)
+_WRITE = httpx.Timeout(WRITE_TIMEOUT, connect=CONNECT_TIMEOUT)
+
+_client: Optional[httpx.Client] = None
+_async_client: Optional[httpx.AsyncClient] = None
+_client_lock = threading.Lock()
+_HEADERS: Dict[Tuple[bool, Optional[str]], Dict[str, str]] = {}
 
-def _headers(use_service: bool = False) -> Dict[str, str]:
-    key = SUPABASE_SERVICE_KEY if use_service and SUPABASE_SERVICE_KEY else SUPABASE_ANON_KEY
-    headers = {
-        "apikey": key or "",
-        "Authorization": f"Bearer {key}" if key else "",
-        "Content-Type": "application/json",
+
+def _http2_available() -> bool:
+    if not HTTP2:
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _client_kwargs() -> Dict[str, Any]:
+    return {
+        "http2": _http2_available(),
+        "limits": httpx.Limits(
+            max_connections=POOL_SIZE,
+            max_keepalive_connections=POOL_KEEPALIVE,
+            keepalive_expiry=KEEPALIVE_EXPIRY,
+        ),
+        "timeout": _READ,
     }
+
+
+def open_client() -> httpx.Client:
+    """Crea (si no existe) el cliente compartido del proceso."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = httpx.Client(**_client_kwargs())
+    return _client
+
+
+def close_client() -> None:
+    """Cierra el cliente compartido y libera las conexiones del pool."""
+    global _client
+    with _client_lock:
+        client, _client = _client, None
+    if client is not None:
+        client.close()
+
+
+def open_async_client() -> httpx.AsyncClient:
+    """Crea (si no existe) el cliente async compartido del proceso."""
+    global _async_client
+    if _async_client is None:
+        with _client_lock:
+            if _async_client is None:
+                _async_client = httpx.AsyncClient(**_client_kwargs())
+    return _async_client
+
+
+async def close_async_client() -> None:
+    global _async_client
+    with _client_lock:
+        client, _async_client = _async_client, None
+    if client is not None:
+        await client.aclose()
+
+
+def _headers(use_service: bool = False, prefer: Optional[str] = None) -> Dict[str, str]:
+    # Las cabeceras sólo dependen de las claves (fijas por proceso) y de
+    # `Prefer`: se calculan una vez y se reutilizan. No mutar el dict devuelto.
+    headers = _HEADERS.get((use_service, prefer))
+    if headers is None:
+        key = SUPABASE_SERVICE_KEY if use_service and SUPABASE_SERVICE_KEY else SUPABASE_ANON_KEY
+        headers = {
+            "apikey": key or "",
+            "Authorization": f"Bearer {key}" if key else "",
+            "Content-Type": "application/json",
+        }
+        if prefer:
+            headers["Prefer"] = prefer
+        _HEADERS[(use_service, prefer)] = headers
     return headers
 
 
@@ -27,51 +142,349 @@ def _table_url(table: str) -> str:
     return f"{base}/rest/v1/{table}"
 
 
-def list_table(table: str, filters: Optional[Dict[str, Any]] = None, select: str = "*") -> List[Dict[str, Any]]:
-    url = _table_url(table)
+class CircuitOpenError(Exception):
+    """Supabase se considera caído: la llamada no se ha intentado."""
+
+
+# testigo de las llamadas admitidas con el circuito cerrado
+_PASS = object()
+
+
+class CircuitBreaker:
+    """Estados `closed` -> `open` (tras `failures` fallos seguidos) -> `half_open`
+    (pasados `reset` segundos, una sola llamada de prueba) -> `closed` u `open`.
+
+    `allow` devuelve un testigo (None si rechaza) que el llamador entrega a
+    `release` al terminar, pase lo que pase: si la llamada de prueba acaba
+    sin `success` ni `failure` (un error que no es de red, una cancelación)
+    queda libre el hueco para otra prueba en vez de rechazar para siempre."""
+
+    def __init__(self, failures: int = BREAKER_FAILURES, reset: float = BREAKER_RESET) -> None:
+        self.threshold = failures
+        self.reset = reset
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.rejected = 0
+        # testigo de la llamada de prueba en curso (half_open)
+        self._probe: Optional[object] = None
+        self._lock = threading.Lock()
+
+    def allow(self) -> Optional[object]:
+        with self._lock:
+            if self.state == "closed" or self.threshold <= 0:
+                return _PASS
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset:
+                self.state = "half_open"
+            if self.state == "half_open" and self._probe is None:
+                self._probe = object()
+                return self._probe
+            self.rejected += 1
+            return None
+
+    def release(self, token: Optional[object]) -> None:
+        """Fin de una llamada admitida por `allow`; libera la prueba si era esta."""
+        with self._lock:
+            if token is not None and token is self._probe:
+                self._probe = None
+
+    def success(self) -> None:
+        with self._lock:
+            self.state, self.failures, self._probe = "closed", 0, None
+
+    def failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._probe = None
+            if self.threshold > 0 and (self.state == "half_open" or self.failures >= self.threshold):
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            retry_in = max(0.0, self.reset - (time.monotonic() - self.opened_at)) if self.state == "open" else 0.0
+            return {"state": self.state, "consecutive_failures": self.failures, "threshold": self.threshold,
+                    "reset_seconds": self.reset, "retry_in": round(retry_in, 3), "rejected": self.rejected}
+
+
+BREAKER = CircuitBreaker()
+
+_IDEMPOTENT = ("GET", "HEAD")
+_RETRY_STATUS = (502, 503, 504)
+
+
+def _backoff(attempt: int) -> float:
+    # "full jitter": aleatorio entre 0 y la espera exponencial
+    return random.uniform(0, RETRY_BACKOFF * (2 ** attempt))
+
+
+def _attempts(method: str) -> int:
+    return 1 + (RETRIES if method in _IDEMPOTENT else 0)
+
+
+def _admit(table: str, op: str) -> object:
+    token = BREAKER.allow()
+    if token is None:
+        metrics.upstream_rejected(table, op)
+        raise CircuitOpenError(f"Supabase no disponible (circuito abierto): {table} {op}")
+    return token
+
+
+def _failed(table: str, op: str, start: float, exc: Exception) -> None:
+    metrics.observe_upstream(table, op, time.perf_counter() - start, error=exc)
+    if isinstance(exc, httpx.TransportError):
+        BREAKER.failure()
+
+
+def _outcome(table: str, op: str, start: float, r: httpx.Response, last: bool) -> bool:
+    """Registra la respuesta; True si hay que reintentar. Lanza si es un error definitivo."""
+    error = None
+    try:
+        r.raise_for_status()
+    except httpx.HTTPStatusError as exc:
+        error = exc
+    metrics.observe_upstream(table, op, time.perf_counter() - start, r.status_code, len(r.content), error)
+    if r.status_code >= 500:
+        BREAKER.failure()
+    else:
+        BREAKER.success()
+    if error is None:
+        return False
+    if r.status_code in _RETRY_STATUS and not last:
+        return True
+    raise error
+
+
+def _send(table: str, op: str, method: str, url: str, **kwargs: Any) -> httpx.Response:
+    """Petición con el cliente compartido: medida, con reintentos, breaker y `raise_for_status`."""
+    attempts = _attempts(method)
+    for attempt in range(attempts):
+        token = _admit(table, op)
+        last = attempt + 1 == attempts
+        start = time.perf_counter()
+        try:
+            r = open_client().request(method, url, **kwargs)
+        except Exception as exc:
+            _failed(table, op, start, exc)
+            if last or not isinstance(exc, httpx.TransportError):
+                raise
+        else:
+            if not _outcome(table, op, start, r, last):
+                return r
+        finally:
+            BREAKER.release(token)
+        metrics.upstream_retry(table, op)
+        time.sleep(_backoff(attempt))
+    raise AssertionError("unreachable")
+
+
+async def _asend(table: str, op: str, method: str, url: str, **kwargs: Any) -> httpx.Response:
+    attempts = _attempts(method)
+    for attempt in range(attempts):
+        token = _admit(table, op)
+        last = attempt + 1 == attempts
+        start = time.perf_counter()
+        try:
+            r = await open_async_client().request(method, url, **kwargs)
+        except Exception as exc:
+            _failed(table, op, start, exc)
+            if last or not isinstance(exc, httpx.TransportError):
+                raise
+        else:
+            if not _outcome(table, op, start, r, last):
+                return r
+        finally:
+            # también con CancelledError (cliente desconectado), que no es Exception
+            BREAKER.release(token)
+        metrics.upstream_retry(table, op)
+        await asyncio.sleep(_backoff(attempt))
+    raise AssertionError("unreachable")
+
+
+def _first(data: Any) -> Optional[Dict[str, Any]]:
+    return data[0] if isinstance(data, list) and data else (data if isinstance(data, dict) else None)
+
+
+def _list_params(filters: Optional[Dict[str, Any]], select: str) -> Dict[str, Any]:
     params = {"select": select}
     if filters:
         params.update(filters)
-    r = httpx.get(url, headers=_headers(use_service=False), params=params, timeout=10.0)
-    r.raise_for_status()
+    return params
+
+
+def _quote(value: Any) -> str:
+    # Valores dentro de `or=(...)` se citan si contienen caracteres reservados
+    text = str(value)
+    if any(ch in text for ch in ',.:()" '):
+        return '"' + text.replace("\\", "\\\\").replace('"', '\\"') + '"'
+    return text
+
+
+def keyset_params(order_by: str = "id", after: Optional[Tuple[Any, ...]] = None, limit: Optional[int] = None) -> Dict[str, Any]:
+    """Parámetros PostgREST para una página keyset ordenada por `(order_by, id)`."""
+    params: Dict[str, Any] = {"order": "id.asc" if order_by == "id" else f"{order_by}.asc.nullslast,id.asc"}
+    if after is not None:
+        if order_by == "id":
+            params["id"] = f"gt.{after[-1]}"
+        else:
+            value, last_id = after[0], after[-1]
+            if value is None:
+                # con nulos al final sólo quedan otras filas nulas
+                params["and"] = f"({order_by}.is.null,id.gt.{last_id})"
+            else:
+                v = _quote(value)
+                params["or"] = f"({order_by}.gt.{v},{order_by}.is.null,and({order_by}.eq.{v},id.gt.{last_id}))"
+    if limit is not None:
+        params["limit"] = str(limit)
+    return params
+
+
+def in_filter(values: Iterable[Any]) -> str:
+    """Filtro PostgREST `in.(a,b,c)` para una lista de valores."""
+    return "in.(" + ",".join(_quote(v) for v in values) + ")"
+
+
+def _total(r: httpx.Response) -> Optional[int]:
+    # Content-Range: "0-24/3573" o "*/0" (total "*" si no se pidió count)
+    total = r.headers.get("content-range", "").rpartition("/")[2]
+    return int(total) if total.isdigit() else None
+
+
+def list_table(table: str, filters: Optional[Dict[str, Any]] = None, select: str = "*") -> List[Dict[str, Any]]:
+    url = _table_url(table)
+    r = _send(table, "list", "GET", url, headers=_headers(use_service=False), params=_list_params(filters, select), timeout=_READ)
     return r.json()
 
 
+def list_page(table: str, filters: Optional[Dict[str, Any]] = None, select: str = "*",
+              count: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+    """Como `list_table`, pero devuelve también el total (`count` = exact/estimated)."""
+    url = _table_url(table)
+    headers = _headers(use_service=False, prefer=f"count={count}" if count else None)
+    r = _send(table, "page", "GET", url, headers=headers, params=_list_params(filters, select), timeout=_READ)
+    return r.json(), _total(r)
+
+
+def count(table: str, filters: Optional[Dict[str, Any]] = None) -> Optional[int]:
+    """Número de filas sin descargarlas (HEAD + `Prefer: count=exact`)."""
+    url = _table_url(table)
+    r = _send(table, "count", "HEAD", url, headers=_headers(use_service=False, prefer="count=exact"),
+              params=_list_params(filters, "*"), timeout=_READ)
+    return _total(r)
+
+
 def get_by_id(table: str, id_value: str, id_column: str = "id") -> Optional[Dict[str, Any]]:
     url = _table_url(table)
     params = {"select": "*", id_column: f"eq.{id_value}"}
-    r = httpx.get(url, headers=_headers(use_service=False), params=params, timeout=10.0)
-    r.raise_for_status()
-    data = r.json()
-    return data[0] if data else None
+    r = _send(table, "get", "GET", url, headers=_headers(use_service=False), params=params, timeout=_READ)
+    return _first(r.json())
+
+
+def search(table: str, query: str, limit: int) -> List[Dict[str, Any]]:
+    """Filas de `table` que cumplen el tsquery `query`, de más a menos relevante.
+
+    Llama a la función `search_<table>` (ver `supabase_setup.sql`), que ordena
+    por `ts_rank` en el servidor antes de aplicar `limit`.
+    """
+    url = _table_url(f"rpc/search_{table}")
+    r = _send(table, "search", "GET", url, headers=_headers(use_service=False),
+              params={"q": query, "lim": str(limit)}, timeout=_READ)
+    return r.json()
 
 
 def insert(table: str, payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
     url = _table_url(table)
-    headers = _headers(use_service=True)
-    headers["Prefer"] = "return=representation"
-    r = httpx.post(url, headers=headers, json=payload, timeout=10.0)
-    r.raise_for_status()
-    data = r.json()
-    return data[0] if isinstance(data, list) and data else (data if isinstance(data, dict) else None)
+    r = _send(table, "insert", "POST", url, headers=_headers(use_service=True, prefer="return=representation"), json=payload, timeout=_WRITE)
+    return _first(r.json())
+
+
+def _bulk_request(rows: List[Dict[str, Any]], upsert: bool) -> Tuple[Dict[str, str], Dict[str, Any]]:
+    prefer = "return=representation,missing=default"
+    if upsert:
+        prefer += ",resolution=merge-duplicates"
+    # `columns` = unión de claves: las filas pueden traer columnas distintas
+    columns = ",".join(dict.fromkeys(k for row in rows for k in row))
+    return _headers(use_service=True, prefer=prefer), {"columns": columns}
+
+
+def insert_many(table: str, rows: List[Dict[str, Any]], upsert: bool = False) -> List[Dict[str, Any]]:
+    """Inserta (o hace upsert por clave primaria de) varias filas en una sola petición."""
+    url = _table_url(table)
+    headers, params = _bulk_request(rows, upsert)
+    r = _send(table, "insert_many", "POST", url, headers=headers, params=params, json=rows, timeout=_WRITE)
+    return r.json()
 
 
 def update(table: str, id_value: str, payload: Dict[str, Any], id_column: str = "id") -> Optional[Dict[str, Any]]:
     url = _table_url(table)
-    headers = _headers(use_service=True)
-    headers["Prefer"] = "return=representation"
-    params = {id_column: f"eq.{id_value}", "select": "*"}
-    r = httpx.patch(url, headers=headers, params={id_column: f"eq.{id_value}"}, json=payload, timeout=10.0)
-    r.raise_for_status()
-    data = r.json()
-    return data[0] if isinstance(data, list) and data else (data if isinstance(data, dict) else None)
+    r = _send(table, "update", "PATCH", url, headers=_headers(use_service=True, prefer="return=representation"), params={id_column: f"eq.{id_value}"}, json=payload, timeout=_WRITE)
+    return _first(r.json())
 
 
 def delete(table: str, id_value: str, id_column: str = "id") -> bool:
     url = _table_url(table)
-    headers = _headers(use_service=True)
-    r = httpx.delete(url, headers=headers, params={id_column: f"eq.{id_value}"}, timeout=10.0)
-    r.raise_for_status()
+    _send(table, "delete", "DELETE", url, headers=_headers(use_service=True), params={id_column: f"eq.{id_value}"}, timeout=_WRITE)
+    return True
+
+
+# Variantes async (mismas URLs/filtros, cliente httpx.AsyncClient)
+async def alist_table(table: str, filters: Optional[Dict[str, Any]] = None, select: str = "*") -> List[Dict[str, Any]]:
+    url = _table_url(table)
+    r = await _asend(table, "list", "GET", url, headers=_headers(use_service=False), params=_list_params(filters, select), timeout=_READ)
+    return r.json()
+
+
+async def alist_page(table: str, filters: Optional[Dict[str, Any]] = None, select: str = "*",
+                     count: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+    url = _table_url(table)
+    headers = _headers(use_service=False, prefer=f"count={count}" if count else None)
+    r = await _asend(table, "page", "GET", url, headers=headers, params=_list_params(filters, select), timeout=_READ)
+    return r.json(), _total(r)
+
+
+async def acount(table: str, filters: Optional[Dict[str, Any]] = None) -> Optional[int]:
+    url = _table_url(table)
+    r = await _asend(table, "count", "HEAD", url, headers=_headers(use_service=False, prefer="count=exact"),
+                          params=_list_params(filters, "*"), timeout=_READ)
+    return _total(r)
+
+
+async def asearch(table: str, query: str, limit: int) -> List[Dict[str, Any]]:
+    url = _table_url(f"rpc/search_{table}")
+    r = await _asend(table, "search", "GET", url, headers=_headers(use_service=False),
+                     params={"q": query, "lim": str(limit)}, timeout=_READ)
+    return r.json()
+
+
+async def aget_by_id(table: str, id_value: str, id_column: str = "id") -> Optional[Dict[str, Any]]:
+    url = _table_url(table)
+    params = {"select": "*", id_column: f"eq.{id_value}"}
+    r = await _asend(table, "get", "GET", url, headers=_headers(use_service=False), params=params, timeout=_READ)
+    return _first(r.json())
+
+
+async def ainsert(table: str, payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    url = _table_url(table)
+    r = await _asend(table, "insert", "POST", url, headers=_headers(use_service=True, prefer="return=representation"), json=payload, timeout=_WRITE)
+    return _first(r.json())
+
+
+async def ainsert_many(table: str, rows: List[Dict[str, Any]], upsert: bool = False) -> List[Dict[str, Any]]:
+    url = _table_url(table)
+    headers, params = _bulk_request(rows, upsert)
+    r = await _asend(table, "insert_many", "POST", url, headers=headers, params=params, json=rows, timeout=_WRITE)
+    return r.json()
+
+
+async def aupdate(table: str, id_value: str, payload: Dict[str, Any], id_column: str = "id") -> Optional[Dict[str, Any]]:
+    url = _table_url(table)
+    r = await _asend(table, "update", "PATCH", url, headers=_headers(use_service=True, prefer="return=representation"), params={id_column: f"eq.{id_value}"}, json=payload, timeout=_WRITE)
+    return _first(r.json())
+
+
+async def adelete(table: str, id_value: str, id_column: str = "id") -> bool:
+    url = _table_url(table)
+    await _asend(table, "delete", "DELETE", url, headers=_headers(use_service=True), params={id_column: f"eq.{id_value}"}, timeout=_WRITE)
     return True
 
 
@@ -0,0 +1,89 @@
+"""Comprobación del circuit breaker de `app.supabase_client` contra el PostgREST de juguete.
+
+Abre el circuito con una caída simulada (`store.outage`) y, para cada forma
+en que puede terminar mal la llamada de prueba en `half_open` sin ser un
+error de red, comprueba que el breaker no se queda atascado rechazando:
+
+- una URL inválida (`httpx.InvalidURL`), en `_send` y en `_asend`;
+- una llamada de prueba cancelada (cliente desconectado, `CancelledError`).
+
+Tras cada una, la siguiente llamada normal debe llegar a Supabase y cerrar
+el circuito. Termina con código 1 si alguna falla.
+
+Uso:
+    python -m bench.bench_breaker
+"""
+import asyncio
+import os
+import sys
+import time
+
+from bench.fake_postgrest import serve
+
+RESET = 0.2
+
+
+def main() -> None:
+    server, url = serve(products=5, categories=1, delay_ms=50)
+    os.environ.update(SUPABASE_URL=url, SUPABASE_KEY="bench", SUPABASE_RETRIES="0",
+                      SUPABASE_BREAKER_FAILURES="2", SUPABASE_BREAKER_RESET=str(RESET))
+    from app import supabase_client as sc
+
+    breaker = sc.BREAKER
+    products = sc._table_url("products")
+    failures = []
+
+    def open_circuit() -> None:
+        server.store.outage = True
+        for _ in range(breaker.threshold):
+            try:
+                sc._send("products", "select", "GET", products)
+            except Exception:
+                pass
+        server.store.outage = False
+        assert breaker.state == "open", breaker.snapshot()
+        time.sleep(RESET * 1.2)
+
+    async def cancelled_probe() -> None:
+        task = asyncio.ensure_future(sc._asend("products", "select", "GET", products))
+        await asyncio.sleep(0.01)  # la prueba ya está en vuelo (el servidor tarda 50 ms)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    # un carácter de control en la URL: httpx.InvalidURL, que no es httpx.TransportError
+    invalid = products + "\x00"
+    cases = {
+        "InvalidURL (_send)": lambda: sc._send("products", "select", "GET", invalid),
+        "InvalidURL (_asend)": lambda: asyncio.run(sc._asend("products", "select", "GET", invalid)),
+        "prueba cancelada (_asend)": lambda: asyncio.run(cancelled_probe()),
+    }
+    sc.open_client()
+    try:
+        for name, probe in cases.items():
+            open_circuit()
+            try:
+                probe()
+            except Exception:
+                pass
+            state = breaker.snapshot()["state"]
+            try:
+                sc._send("products", "select", "GET", products)
+                ok = breaker.state == "closed"
+            except sc.CircuitOpenError:
+                ok = False
+            print(f"{name:<28} estado tras la prueba: {state:<10} recupera: {'sí' if ok else 'NO'}")
+            if not ok:
+                failures.append(name)
+    finally:
+        sc.close_client()
+        server.shutdown()
+    if failures:
+        print(f"breaker atascado tras: {', '.join(failures)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
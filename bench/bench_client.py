@@ -0,0 +1,61 @@
+"""Benchmark: peticiones/s contra PostgREST con y sin pool de conexiones.
+
+Compara el patrón antiguo (`httpx.get` de nivel superior: una conexión nueva
+por petición) con el cliente compartido de `app.supabase_client`.
+
+Uso:
+    python -m bench.bench_client --requests 2000 --threads 8
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+from bench.fake_postgrest import serve
+
+
+def _run(fn, total: int, threads: int) -> float:
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(lambda _: fn(), range(total)))
+    return total / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--products", type=int, default=50)
+    args = parser.parse_args()
+
+    server, url = serve(products=args.products)
+    os.environ["SUPABASE_URL"] = url
+    os.environ.setdefault("SUPABASE_KEY", "bench")
+    from app import supabase_client as sc
+
+    def before():
+        # Réplica del comportamiento anterior: cabeceras y conexión nuevas cada vez
+        headers = {"apikey": "bench", "Authorization": "Bearer bench", "Content-Type": "application/json"}
+        r = httpx.get(f"{url}/rest/v1/products", headers=headers, params={"select": "*", "limit": "8"}, timeout=10.0)
+        r.raise_for_status()
+        return r.json()
+
+    def after():
+        return sc.list_table("products", filters={"limit": "8"})
+
+    sc.open_client()
+    try:
+        rps_before = _run(before, args.requests, args.threads)
+        rps_after = _run(after, args.requests, args.threads)
+    finally:
+        sc.close_client()
+        server.shutdown()
+
+    print(f"sin pool : {rps_before:8.1f} req/s")
+    print(f"con pool : {rps_after:8.1f} req/s  (x{rps_after / rps_before:.2f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Benchmark: N peticiones simultáneas a `/products` sobre el stack async.
+
+Levanta el PostgREST de juguete con latencia inyectada y dispara N
+peticiones concurrentes contra la app (transporte ASGI en proceso). Informa
+el tiempo total y el máximo de llamadas upstream simultáneas observado: con
+handlers síncronos este máximo quedaba limitado por el threadpool (~40).
+
+Cada petición lleva un `min_price` distinto para que sea una consulta
+upstream distinta: peticiones idénticas se agruparían en una sola llamada
+(single-flight) y no medirían concurrencia. Por lo mismo se desactivan la
+caché de lecturas y la de respuestas. Si el máximo no supera con holgura
+ese límite (`MIN_INFLIGHT`, o todas las peticiones si son menos), el script
+termina con código 1.
+
+Uso:
+    python -m bench.bench_concurrency --requests 500 --delay-ms 100
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import httpx
+
+from bench.fake_postgrest import serve
+
+# el doble del threadpool de Starlette (40)
+MIN_INFLIGHT = 80
+
+
+async def _fire(app, total: int) -> float:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://app") as client:
+        start = time.perf_counter()
+        responses = await asyncio.gather(*(client.get(f"/products?min_price={i}") for i in range(total)))
+        elapsed = time.perf_counter() - start
+    failed = sum(1 for r in responses if r.status_code != 200)
+    if failed:
+        print(f"{failed} respuestas con error")
+    return elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--delay-ms", type=float, default=100.0)
+    parser.add_argument("--products", type=int, default=20)
+    args = parser.parse_args()
+
+    server, url = serve(products=args.products, delay_ms=args.delay_ms)
+    os.environ["SUPABASE_URL"] = url
+    os.environ.setdefault("SUPABASE_KEY", "bench")
+    os.environ.setdefault("SUPABASE_POOL_SIZE", str(args.requests))
+    os.environ["DB_CACHE_ENABLED"] = "0"
+    os.environ["RESPONSE_CACHE_ENABLED"] = "0"
+    from app import db
+    from app.main import app
+
+    db.connect()
+    try:
+        elapsed = asyncio.run(_fire(app, args.requests))
+    finally:
+        db.close()
+        server.shutdown()
+    serial = args.requests * args.delay_ms / 1000.0
+    print(f"{args.requests} peticiones en {elapsed:.2f}s (serie: {serial:.1f}s)")
+    print(f"máximo de llamadas upstream simultáneas: {server.store.max_inflight}")
+    if server.store.max_inflight < min(MIN_INFLIGHT, args.requests):
+        print(f"concurrencia upstream por debajo de {min(MIN_INFLIGHT, args.requests)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Benchmark: memoria pico de la exportación NDJSON en streaming.
+
+Llena el fallback en memoria con N productos y mide (tracemalloc) la
+memoria adicional reservada mientras se descarga `/admin/export/products`.
+Debe mantenerse plana aunque N crezca.
+
+Uso:
+    python -m bench.bench_export --sizes 1000 100000
+"""
+import argparse
+import asyncio
+import time
+import tracemalloc
+
+
+async def _export(app) -> int:
+    # Llamamos a la app ASGI directamente: httpx.ASGITransport acumula el
+    # cuerpo completo y falsearía la medida.
+    total = 0
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": "/admin/export/products", "raw_path": b"/admin/export/products",
+        "query_string": b"", "root_path": "", "headers": [(b"x-user-id", b"admin")],
+        "client": ("127.0.0.1", 1), "server": ("app", 80),
+    }
+
+    sent_request = False
+    done = asyncio.Event()
+
+    async def receive():
+        nonlocal sent_request
+        if not sent_request:
+            sent_request = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal total
+        if message["type"] == "http.response.body":
+            total += len(message.get("body", b""))
+
+    await app(scope, receive, send)
+    done.set()
+    return total
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100000])
+    args = parser.parse_args()
+
+    from app import db
+    from app.main import app
+
+    loaded = 0
+    for size in sorted(args.sizes):
+        db.insert_many("products", [
+            {"name": f"Producto {i}", "description": "Figura coleccionable", "price": 1000 + i % 4000,
+             "image_url": None, "category": "avengers"}
+            for i in range(loaded, size)
+        ])
+        loaded = size
+        db.select_page("products", limit=1)  # índice ordenado ya construido
+        tracemalloc.start()
+        start = time.perf_counter()
+        nbytes = asyncio.run(_export(app))
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{size:8d} filas: {nbytes / 1e6:7.1f} MB exportados en {elapsed:.2f}s, pico {peak / 1e6:6.2f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""Ingesta de imágenes de producto (`app.images`): subida en lote y variantes.
+
+Genera `--images` JPEG sintéticos de `--size` píxeles (una fracción
+`--duplicates` son copias exactas de otros, para ver la deduplicación) y los
+sube con `POST /images`, `--concurrency` peticiones a la vez. Después pide
+la variante `grid.webp` de cada imagen distinta dos veces: la primera vez se
+genera (frío) y la segunda se lee del disco (caliente).
+
+Se repite para cada valor de `--workers` (procesos del pool de
+`app.images`; 0 = pool de hilos del event loop), cada uno con un
+`IMAGES_DIR` temporal vacío. Por fase se muestran imágenes/s, MB/s de
+entrada, latencia p50/p99 y el mayor retraso del event loop, medido con un
+temporizador de 5 ms que corre a la vez: es lo que esperaría cualquier otra
+petición del mismo worker mientras se decodifica y redimensiona.
+
+La app se sirve por ASGI en proceso (sin red) y el rendimiento está
+limitado por los núcleos de la máquina (se muestran al principio).
+
+Uso:
+    python -m bench.bench_images [--images 1000] [--size 1200x900] [--workers 0,2] [--concurrency 16]
+"""
+import argparse
+import asyncio
+import io
+import os
+import random
+import shutil
+import tempfile
+import time
+from typing import Any, Awaitable, Callable, List, Tuple
+
+ADMIN = {"x-user-id": "admin"}
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def _images(count: int, size: Tuple[int, int], duplicates: float) -> List[bytes]:
+    from PIL import Image, ImageDraw
+
+    rnd = random.Random(42)
+    w, h = size
+    # fondo con ruido y degradado (una foto comprime peor que un color liso)
+    base = Image.merge("RGB", (Image.effect_noise(size, 48), Image.linear_gradient("L").resize(size),
+                               Image.radial_gradient("L").resize(size)))
+    unique = max(1, int(count * (1 - duplicates)))
+    out: List[bytes] = []
+    for i in range(unique):
+        im = base.copy()
+        draw = ImageDraw.Draw(im)
+        for _ in range(6):
+            x, y = rnd.randrange(w), rnd.randrange(h)
+            draw.rectangle((x, y, x + w // 5, y + h // 5), fill=tuple(rnd.randrange(256) for _ in range(3)))
+        draw.text((10, 10), f"producto {i}", fill=(255, 255, 255))
+        buf = io.BytesIO()
+        im.save(buf, "JPEG", quality=88)
+        out.append(buf.getvalue())
+    out += [out[rnd.randrange(unique)] for _ in range(count - unique)]
+    rnd.shuffle(out)
+    return out
+
+
+async def _phase(items: List[Any], concurrency: int,
+                 call: Callable[[Any], Awaitable[None]]) -> Tuple[float, List[float], float]:
+    """Ejecuta `call` sobre `items` con `concurrency` a la vez: (segundos, latencias, retraso máx. del loop)."""
+    loop = asyncio.get_running_loop()
+    latencies: List[float] = []
+    queue = list(reversed(items))
+    done = asyncio.Event()
+    worst = 0.0
+
+    async def ticker() -> None:
+        nonlocal worst
+        while not done.is_set():
+            t = loop.time()
+            await asyncio.sleep(0.005)
+            worst = max(worst, loop.time() - t - 0.005)
+
+    async def worker() -> None:
+        while queue:
+            item = queue.pop()
+            t = time.perf_counter()
+            await call(item)
+            latencies.append(time.perf_counter() - t)
+
+    tick = asyncio.ensure_future(ticker())
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    done.set()
+    await tick
+    return elapsed, latencies, worst
+
+
+def _row(label: str, workers: int, n: int, nbytes: int, result: Tuple[float, List[float], float]) -> None:
+    elapsed, latencies, worst = result
+    print(f"{label:>12} {workers:>8} {n / elapsed:>10.1f} {nbytes / elapsed / 1e6:>8.1f}"
+          f" {_percentile(latencies, .5) * 1000:>9.1f} {_percentile(latencies, .99) * 1000:>9.1f} {worst * 1000:>10.1f}")
+
+
+async def _run(args, data: List[bytes]) -> None:
+    import httpx
+    from app import db, images
+    from app.main import app
+
+    db.connect()
+    db.seed_sample_data()
+    print(f"{'fase':>12} {'workers':>8} {'img/s':>10} {'MB/s':>8} {'p50 ms':>9} {'p99 ms':>9} {'loop máx':>10}")
+    for workers in args.workers:
+        directory = tempfile.mkdtemp(prefix="images-bench-")
+        images.STORE = images.Store(directory=directory, cache_bytes=1 << 40, workers=workers)
+        digests: List[str] = []
+        try:
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench",
+                                         timeout=None) as client:
+                # arranque del pool fuera de la medida
+                await client.get("/images/" + "0" * 64 + "/grid.webp")
+
+                async def upload(body: bytes) -> None:
+                    r = await client.post("/images", content=body, headers=ADMIN)
+                    assert r.status_code == 200, (r.status_code, r.text)
+                    if r.json()["created"]:
+                        digests.append(r.json()["digest"])
+
+                async def variant(digest: str) -> None:
+                    r = await client.get(f"/images/{digest}/grid.webp")
+                    assert r.status_code == 200, (r.status_code, r.text)
+
+                _row("subida", workers, len(data), sum(map(len, data)), await _phase(data, args.concurrency, upload))
+                stats = dict(images.STORE.stats)
+                _row("grid frío", workers, len(digests), 0, await _phase(digests, args.concurrency, variant))
+                _row("grid caliente", workers, len(digests), 0, await _phase(digests, args.concurrency, variant))
+                print(f"{'':>12} originales {stats['ingested']}, repetidas {stats['deduplicated']},"
+                      f" variantes generadas {images.STORE.stats['generated']}")
+        finally:
+            images.STORE.close()
+            shutil.rmtree(directory, ignore_errors=True)
+    db.close()
+
+
+def run(args) -> None:
+    os.environ.pop("SUPABASE_URL", None)
+    os.environ.pop("SUPABASE_KEY", None)
+    os.environ.setdefault("SEED_ON_STARTUP", "0")
+    size = tuple(int(x) for x in args.size.lower().split("x"))
+    t = time.perf_counter()
+    data = _images(args.images, size, args.duplicates)
+    print(f"núcleos: {os.cpu_count()}  imágenes: {len(data)} de {size[0]}x{size[1]}"
+          f" ({sum(map(len, data)) / 1e6:.1f} MB, generadas en {time.perf_counter() - t:.1f} s)"
+          f"  concurrencia: {args.concurrency}")
+    asyncio.run(_run(args, data))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=1000)
+    parser.add_argument("--size", default="1200x900")
+    parser.add_argument("--duplicates", type=float, default=0.1)
+    parser.add_argument("--workers", default=f"0,{os.cpu_count() or 1}", type=lambda s: [int(x) for x in s.split(",")])
+    parser.add_argument("--concurrency", type=int, default=16)
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Benchmark: latencia de `/index` y `/products?category_id=` con upstream lento.
+
+Levanta el PostgREST de juguete con latencia inyectada por petición y mide
+la mediana de N peticiones secuenciales a cada ruta, con la caché de
+lecturas y la de respuestas desactivadas: cada petición tiene que llegar a
+upstream. Con las consultas de `/index` en paralelo y el mapa residente de
+slugs, cada ruta debe costar una sola espera de red (~delay). El script
+termina con código 1 si alguna supera 1.5 × delay o si sus llamadas upstream
+por petición no están entre 1 y las esperadas (`ROUTES`): menos de una
+significa que algo la ha servido sin medir.
+
+Uso:
+    python -m bench.bench_latency --delay-ms 50 --requests 20
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+import httpx
+
+from bench.fake_postgrest import serve
+
+# ruta -> llamadas upstream esperadas por petición (las de `/index` van en paralelo)
+ROUTES = {"/index": 2, "/products?category_id=1": 1, "/products?category=cat-1": 1}
+
+
+async def _measure(client, store, path: str, total: int):
+    (await client.get(path)).raise_for_status()  # calentamiento (mapa de slugs, conexiones)
+    before = store.requests
+    timings = []
+    for _ in range(total):
+        start = time.perf_counter()
+        r = await client.get(path)
+        timings.append(time.perf_counter() - start)
+        r.raise_for_status()
+    return statistics.median(timings), (store.requests - before) / total
+
+
+async def _run(app, store, total: int):
+    # un solo event loop para todas las rutas, como en un worker: el cliente
+    # async compartido no sobrevive a cambiar de loop (reintentaría y contaría de más)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://app") as client:
+        return [(path, expected, await _measure(client, store, path, total)) for path, expected in ROUTES.items()]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--delay-ms", type=float, default=50.0)
+    parser.add_argument("--products", type=int, default=200)
+    args = parser.parse_args()
+
+    server, url = serve(products=args.products, delay_ms=args.delay_ms)
+    os.environ["SUPABASE_URL"] = url
+    os.environ.setdefault("SUPABASE_KEY", "bench")
+    os.environ["DB_CACHE_ENABLED"] = "0"
+    os.environ["RESPONSE_CACHE_ENABLED"] = "0"
+    from app import db
+    from app.main import app
+
+    delay = args.delay_ms / 1000.0
+    slow, wrong = [], []
+    db.connect()
+    try:
+        results = asyncio.run(_run(app, server.store, args.requests))
+    finally:
+        db.close()
+        server.shutdown()
+    for path, expected, (median, calls) in results:
+        print(f"{path:<28} mediana {median * 1000:7.1f} ms  "
+              f"({median / delay:.2f} × delay, {calls:.1f} llamadas upstream/petición)")
+        if median > 1.5 * delay:
+            slow.append(path)
+        if not 1 <= calls <= expected:
+            wrong.append(f"{path} ({calls:.1f}, esperadas 1-{expected})")
+    if slow:
+        print(f"más de una espera de red en: {', '.join(slow)}")
+    if wrong:
+        print(f"llamadas upstream fuera de rango en: {', '.join(wrong)}")
+    if slow or wrong:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Micro-benchmarks del almacén en memoria (`app.memstore.Table`).
+
+Compara el almacén indexado con el fallback anterior (lista de dicts con
+búsqueda lineal) para select_one / select_where / update / delete a
+1k, 100k y 1M filas.
+
+Uso:
+    python -m bench.bench_memstore --sizes 1000 100000 1000000
+"""
+import argparse
+import random
+import time
+from typing import Any, Dict, List
+
+from app.memstore import Table
+
+CATEGORIES = ["avengers", "avengers-villanos", "guardianes-de-la-galaxia", "guardianes-villanos"]
+
+
+class ListStore:
+    """Réplica del fallback original (escaneo lineal)."""
+
+    def __init__(self) -> None:
+        self.rows: List[Dict[str, Any]] = []
+
+    def insert(self, row: Dict[str, Any]) -> None:
+        self.rows.append(dict(row))
+
+    def get(self, id_value: Any):
+        for row in self.rows:
+            if str(row.get("id")) == str(id_value):
+                return dict(row)
+        return None
+
+    def where(self, column: str, value: Any):
+        return [r for r in self.rows if r.get(column) == value]
+
+    def update(self, id_value: Any, payload: Dict[str, Any]):
+        for i, row in enumerate(self.rows):
+            if str(row.get("id")) == str(id_value):
+                updated = dict(row)
+                updated.update(payload)
+                self.rows[i] = updated
+                return updated
+        return None
+
+    def delete(self, id_value: Any):
+        for i, row in enumerate(self.rows):
+            if str(row.get("id")) == str(id_value):
+                return self.rows.pop(i)
+        return None
+
+
+def _fill(store, n: int) -> None:
+    for i in range(1, n + 1):
+        store.insert({
+            "id": i,
+            "name": f"Producto {i}",
+            "description": "Figura coleccionable",
+            "price": 1000 + i % 4000,
+            "image_url": None,
+            "category": f"cat-{i % 1000}",
+        })
+
+
+def _time(fn, ops: int) -> float:
+    start = time.perf_counter()
+    for _ in range(ops):
+        fn()
+    return (time.perf_counter() - start) / ops * 1e6
+
+
+def bench(size: int, ops: int) -> Dict[str, Dict[str, float]]:
+    results: Dict[str, Dict[str, float]] = {}
+    for label, store in (("lista", ListStore()), ("indexado", Table("products", indexes=("category",)))):
+        _fill(store, size)
+        store.where("category", "cat-0")  # construye el índice
+        ids = [random.randint(1, size) for _ in range(ops)]
+        it = iter(ids)
+        r = {
+            "select_one": _time(lambda: store.get(next(it)), ops),
+            "select_where": _time(lambda: store.where("category", f"cat-{random.randrange(1000)}"), ops),
+        }
+        it = iter(ids)
+        r["update"] = _time(lambda: store.update(next(it), {"price": 1}), ops)
+        it = iter(ids)
+        r["delete"] = _time(lambda: store.delete(next(it)), ops)
+        results[label] = r
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100000, 1000000])
+    args = parser.parse_args()
+    for size in args.sizes:
+        ops = max(5, min(1000, 2_000_000 // size))
+        print(f"\n{size} filas ({ops} ops, µs/op)")
+        for label, r in bench(size, ops).items():
+            print(f"  {label:9s} " + "  ".join(f"{k}={v:10.1f}" for k, v in r.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""Benchmark de arranque y comprobaciones de recuperación de `app.persist`.
+
+Arranque: construye en un directorio temporal un snapshot con `--rows`
+productos y un log de `--tail` escrituras posteriores, y mide en un proceso
+nuevo (como un worker recién lanzado) cuánto tardan `import app.db`,
+`db.connect()` (abrir el snapshot y leer el log) y la primera lectura de
+`products` (decodificar la tabla y aplicarle el log).
+
+Recuperación (`--check`): registro final cortado, registro corrupto a mitad
+del log, restos de una compactación interrumpida y un proceso matado con
+SIGKILL mientras escribe. Termina con código 1 si alguna falla.
+
+Uso:
+    python -m bench.bench_persist --rows 1000000 --tail 10000
+    python -m bench.bench_persist --check
+"""
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+from app import db, persist
+
+_CHILD_STARTUP = """
+import json, time
+t0 = time.perf_counter()
+from app import db
+t1 = time.perf_counter()
+db.connect()
+t2 = time.perf_counter()
+row = db.select_one("products", 1)
+t3 = time.perf_counter()
+print(json.dumps({"import": t1 - t0, "connect": t2 - t1, "first_read": t3 - t2, "row": row}))
+"""
+
+_CHILD_WRITER = """
+from app import db
+db.connect()
+i = 0
+while True:
+    i += 1
+    db.insert("products", {"name": f"P{i}", "price": i, "category": "cat-0"})
+    print(i, flush=True)
+"""
+
+
+def _env(directory: str, **extra: str) -> dict:
+    env = {k: v for k, v in os.environ.items() if not k.startswith("SUPABASE_")}
+    env.update(MEMSTORE_DIR=directory, MEMSTORE_WARM="0", PYTHONPATH=os.getcwd(), **extra)
+    return env
+
+
+def _product(i: int) -> tuple:
+    return (f"Producto {i}", f"Descripción del producto {i}", 1000 + (i * 37) % 4000, None, f"cat-{i % 4}", i)
+
+
+def build(directory: str, rows: int, tail: int) -> None:
+    journal = persist.Journal(directory)
+    tables, autoinc = journal.open(db._new_table)
+    table = tables["products"] = db._new_table("products")
+    table.restore(["name", "description", "price", "image_url", "category", "id"],
+                  [_product(i) for i in range(1, rows + 1)])
+    journal.compact(tables, {"products": rows + 1})
+    for i in range(tail):
+        if i % 2:
+            journal.append(("u", "products", 1 + i % rows, {"price": i}))
+        else:
+            journal.append(("i", "products", {"name": f"Nuevo {i}", "price": i, "id": rows + 1 + i}))
+    journal.close()
+
+
+def startup(directory: str) -> dict:
+    out = subprocess.run([sys.executable, "-c", _CHILD_STARTUP], env=_env(directory),
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def _reopen(directory: str):
+    journal = persist.Journal(directory)
+    tables, autoinc = journal.open(db._new_table)
+    return journal, tables, autoinc
+
+
+def _insert_ops(journal: persist.Journal, start: int, n: int, tables=None, autoinc=None) -> None:
+    # sólo al log, salvo que se pasen las tablas (para compactar después)
+    for i in range(start, start + n):
+        op = ("i", "products", {"id": i, "name": f"P{i}"})
+        journal.append(op)
+        if tables is not None:
+            if "products" not in tables:
+                tables["products"] = db._new_table("products")
+            persist._apply(tables["products"], op)
+            autoinc["products"] = i + 1
+    journal.commit()
+
+
+def check_torn_tail(directory: str) -> bool:
+    journal, _, _ = _reopen(directory)
+    _insert_ops(journal, 1, 100)
+    journal.close()
+    path = os.path.join(directory, "log.0")
+    with open(path, "ab") as f:
+        f.write(persist._RECORD.pack(500, 0) + b"\x00" * 10)  # escritura a medias
+    journal, tables, autoinc = _reopen(directory)
+    ok = len(tables["products"]) == 100 and autoinc["products"] == 101
+    _insert_ops(journal, 101, 1)
+    journal.close()
+    _, tables, _ = _reopen(directory)
+    return ok and len(tables["products"]) == 101
+
+
+def check_corrupt_record(directory: str) -> bool:
+    journal, _, _ = _reopen(directory)
+    _insert_ops(journal, 1, 10)
+    journal.close()
+    path = os.path.join(directory, "log.0")
+    with open(path, "r+b") as f:
+        size = os.path.getsize(path)
+        f.seek(size // 2)
+        byte = f.read(1)
+        f.seek(size // 2)
+        f.write(bytes([byte[0] ^ 0xFF]))
+    _, tables, _ = _reopen(directory)
+    n = len(tables["products"])
+    return 0 < n < 10 and all(tables["products"].get(i) for i in range(1, n + 1))
+
+
+def check_interrupted_compaction(directory: str) -> bool:
+    journal, tables, autoinc = _reopen(directory)
+    _insert_ops(journal, 1, 50, tables, autoinc)
+    journal.compact(tables, autoinc)
+    _insert_ops(journal, 51, 5)
+    journal.close()
+    # snapshot a medio escribir y log de una generación que nunca llegó a valer
+    with open(os.path.join(directory, persist.SNAPSHOT + ".tmp"), "wb") as f:
+        f.write(b"basura")
+    with open(os.path.join(directory, "log.7"), "wb") as f:
+        f.write(b"basura")
+    _, tables, autoinc = _reopen(directory)
+    leftovers = {"log.7", persist.SNAPSHOT + ".tmp"} & set(os.listdir(directory))
+    return len(tables["products"]) == 55 and autoinc["products"] == 56 and not leftovers
+
+
+def check_sigkill(directory: str) -> bool:
+    proc = subprocess.Popen([sys.executable, "-c", _CHILD_WRITER], env=_env(directory),
+                            stdout=subprocess.PIPE, text=True)
+    acked = 0
+    for line in proc.stdout:
+        acked = int(line)
+        if acked >= 300:
+            break
+    os.kill(proc.pid, signal.SIGKILL)
+    proc.wait()
+    _, tables, autoinc = _reopen(directory)
+    products = tables["products"]
+    n = len(products)
+    # todo lo confirmado está, sin huecos, y el contador de ids sigue detrás
+    return n >= acked and all(products.get(i) for i in range(1, n + 1)) and autoinc["products"] == n + 1
+
+
+def run_checks() -> bool:
+    ok = True
+    for check in (check_torn_tail, check_corrupt_record, check_interrupted_compaction, check_sigkill):
+        with tempfile.TemporaryDirectory() as directory:
+            passed = check(directory)
+        print(f"{check.__name__:<30} {'ok' if passed else 'FALLO'}")
+        ok &= passed
+    return ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--tail", type=int, default=10_000)
+    parser.add_argument("--check", action="store_true", help="sólo las comprobaciones de recuperación")
+    args = parser.parse_args()
+
+    if args.check:
+        sys.exit(0 if run_checks() else 1)
+
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        build(directory, args.rows, args.tail)
+        size = os.path.getsize(os.path.join(directory, persist.SNAPSHOT))
+        print(f"snapshot de {args.rows} filas: {size / 1e6:.1f} MB en {time.perf_counter() - start:.2f}s "
+              f"(+{args.tail} escrituras en el log)")
+        r = startup(directory)
+        print(f"import app.db   {r['import'] * 1000:8.1f} ms")
+        print(f"db.connect()    {r['connect'] * 1000:8.1f} ms  (abrir snapshot + leer log)")
+        print(f"primera lectura {r['first_read'] * 1000:8.1f} ms  (decodificar products + aplicar log)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""Benchmark de la búsqueda en memoria (`app.search.InvertedIndex`).
+
+Indexa N productos sintéticos con vocabulario en español y mide la latencia
+de consultas típicas (palabra completa, prefijos, varios términos).
+
+Uso:
+    python -m bench.bench_search --products 100000
+"""
+import argparse
+import random
+import time
+
+from app.search import InvertedIndex
+
+WORDS = [
+    "capitán", "américa", "hombre", "araña", "guardianes", "galaxia", "villano", "héroe",
+    "armadura", "escudo", "martillo", "trueno", "cósmico", "figura", "edición", "coleccionista",
+    "articulada", "clásica", "legendaria", "batalla", "guerrero", "hechicero", "mutante", "reina",
+    "rey", "wakanda", "asgard", "titán", "nave", "espacial", "pirata", "robot", "planeta", "dios",
+]
+QUERIES = ["capitan", "capitán américa", "gal", "guardianes gal", "hechicero supremo", "tit", "a", "figura edicion col"]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--products", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    rnd = random.Random(1)
+    index = InvertedIndex()
+    start = time.perf_counter()
+    for i in range(args.products):
+        name = " ".join(rnd.sample(WORDS, 3)) + f" {i}"
+        desc = " ".join(rnd.sample(WORDS, 8))
+        index.add(str(i), {"name": name, "description": desc})
+    print(f"indexados {args.products} productos en {time.perf_counter() - start:.2f}s")
+
+    for q in QUERIES:
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            hits = index.search(q, 20)
+        ms = (time.perf_counter() - start) / args.repeat * 1000
+        print(f"  {q!r:28s} {ms:8.2f} ms  ({len(hits)} resultados)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Tiempo de CPU por petición de `/products` según el tamaño del catálogo.
+
+Para cada tamaño (`--sizes`, por defecto 100, 10k y 100k productos) mide,
+en modo memoria y con tiempo de CPU del proceso (`time.process_time`):
+
+- `pydantic`: validar las filas con `List[Product]` y serializarlas, que es
+  lo que hacía `response_model` antes de `app.respcache`.
+- `fast`: `respcache.project` + `respcache.dumps` sobre las mismas filas.
+- `GET miss`: la petición completa por ASGI con la caché de respuestas vacía
+  (consulta + proyección + codificación).
+- `GET hit`: la petición completa servida desde la caché de respuestas.
+
+Uso:
+    python -m bench.bench_serialize [--sizes 100,10000,100000] [--repeat 5]
+"""
+import argparse
+import asyncio
+import os
+import time
+from typing import Callable, List
+
+os.environ.pop("SUPABASE_URL", None)
+os.environ.pop("SUPABASE_KEY", None)
+os.environ.pop("MEMSTORE_DIR", None)
+os.environ["SEED_ON_STARTUP"] = "0"
+
+import httpx  # noqa: E402
+from pydantic import TypeAdapter  # noqa: E402
+
+from app import db, respcache  # noqa: E402
+from app.main import app  # noqa: E402
+from app.schemas import Product  # noqa: E402
+
+
+def _cpu(fn: Callable[[], object], repeat: int) -> float:
+    """Mediana de tiempo de CPU (ms) de `fn`."""
+    samples = []
+    for _ in range(repeat):
+        start = time.process_time()
+        fn()
+        samples.append((time.process_time() - start) * 1000)
+    samples.sort()
+    return samples[len(samples) // 2]
+
+
+async def _acpu(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.process_time()
+        await fn()
+        samples.append((time.process_time() - start) * 1000)
+    samples.sort()
+    return samples[len(samples) // 2]
+
+
+def _fill(n: int) -> None:
+    table = db._DATA["products"] = db._new_table("products")
+    db._AUTO_INC["products"] = 1
+    db.insert_many("products", [
+        {"name": f"Producto {i}", "description": f"Descripción del producto número {i}", "price": 1000 + i % 4000,
+         "image_url": f"/static/img/{i}.png", "category": f"cat-{i % 4}"}
+        for i in range(n)
+    ])
+    assert len(table) == n
+
+
+async def run(sizes: List[int], repeat: int) -> None:
+    adapter = TypeAdapter(List[Product])
+    print(f"codificador: {respcache.stats()['encoder']}")
+    print(f"{'productos':>10} {'pydantic':>10} {'fast':>10} {'GET miss':>10} {'GET hit':>10}  (ms de CPU)")
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        for n in sizes:
+            _fill(n)
+            rows = db.select_all("products")
+            pyd = _cpu(lambda: adapter.dump_json(adapter.validate_python(rows)), repeat)
+            fast = _cpu(lambda: respcache.dumps(respcache.project(Product, rows)), repeat)
+
+            async def miss():
+                respcache.clear()
+                r = await client.get("/products")
+                assert len(r.content) > 2
+
+            async def hit():
+                r = await client.get("/products")
+                assert len(r.content) > 2
+
+            cold = await _acpu(miss, repeat)
+            await hit()
+            warm = await _acpu(hit, repeat)
+            print(f"{n:>10} {pyd:>10.2f} {fast:>10.2f} {cold:>10.2f} {warm:>10.2f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="100,10000,100000")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(run([int(s) for s in args.sizes.split(",")], args.repeat))
+
+
+if __name__ == "__main__":
+    main()
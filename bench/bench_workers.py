@@ -0,0 +1,179 @@
+"""Escalado del modo memoria compartido (`MEMSTORE_SHARED`) de 1 a N workers.
+
+Se siembra un `MEMSTORE_DIR` temporal con `--products` productos y, para
+cada número de workers de `--workers`, se lanzan esos procesos sobre el
+mismo directorio. Cada uno sirve la app por ASGI en proceso con
+`--concurrency` peticiones simultáneas durante `--duration` segundos: una
+mezcla de lecturas (`GET /products?limit=20`, `GET /products/{id}`) y una
+fracción `--write-ratio` de `POST /products`. Se informa de las peticiones/s
+del conjunto y de la latencia p50/p99 de lecturas y escrituras.
+
+Después mide cuánto tarda una escritura en verse en otro worker: un proceso
+hace `POST /products` y otro consulta `GET /products/{id}` hasta obtener
+200 (`--probes` veces; p50/p99/máximo en ms).
+
+No hay servidor HTTP de por medio (uvicorn no es dependencia del repo): se
+mide la app y el almacén compartido, no la red. El escalado está limitado
+por los núcleos de la máquina (se muestran al principio).
+
+Uso:
+    python -m bench.bench_workers [--workers 1,2,4] [--duration 5] [--products 5000]
+"""
+import argparse
+import asyncio
+import multiprocessing as mp
+import os
+import random
+import shutil
+import tempfile
+import time
+from typing import Any, List
+
+ADMIN = {"x-user-id": "admin"}
+
+
+def _env(directory: str) -> None:
+    os.environ.pop("SUPABASE_URL", None)
+    os.environ.pop("SUPABASE_KEY", None)
+    os.environ.update(MEMSTORE_DIR=directory, MEMSTORE_SHARED="1", SEED_ON_STARTUP="0")
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def _prepare(directory: str, products: int) -> None:
+    _env(directory)
+    from app import db
+    db.connect()
+    db.seed_sample_data()
+    missing = products - (db.count_rows("products") or 0)
+    db.insert_many("products", [
+        {"name": f"Bench {i}", "description": f"Producto de benchmark {i}", "price": 1000 + i % 3000,
+         "category": "avengers"} for i in range(max(missing, 0))
+    ])
+    db.close()
+
+
+async def _load(args, start: float, out: "mp.Queue[Any]") -> None:
+    import httpx
+    from app import db
+    from app.main import app
+
+    db.connect()
+    ids = [r["id"] for r in db.select_all("products", ["id"])]
+    reads: List[float] = []
+    writes: List[float] = []
+    rnd = random.Random(os.getpid())
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        await asyncio.sleep(max(start - time.time(), 0))
+        deadline = time.monotonic() + args.duration
+
+        async def worker() -> None:
+            i = 0
+            while time.monotonic() < deadline:
+                i += 1
+                t = time.perf_counter()
+                if rnd.random() < args.write_ratio:
+                    r = await client.post("/products", json={"name": f"W {os.getpid()}-{i}", "price": 10.0,
+                                                             "category": "avengers"}, headers=ADMIN)
+                    writes.append(time.perf_counter() - t)
+                elif i % 2:
+                    r = await client.get("/products", params={"limit": 20})
+                    reads.append(time.perf_counter() - t)
+                else:
+                    r = await client.get(f"/products/{rnd.choice(ids)}")
+                    reads.append(time.perf_counter() - t)
+                assert r.status_code < 400, (r.status_code, r.text)
+
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    db.close()
+    out.put((reads, writes))
+
+
+def _load_proc(directory: str, args, start: float, out: "mp.Queue[Any]") -> None:
+    _env(directory)
+    asyncio.run(_load(args, start, out))
+
+
+async def _probe(role: str, probes: int, ids: "mp.Queue[Any]", out: "mp.Queue[Any]") -> None:
+    import httpx
+    from app import db
+    from app.main import app
+
+    db.connect()
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        if role == "writer":
+            for i in range(probes):
+                r = await client.post("/products", json={"name": f"Sonda {i}", "price": 1.0, "category": "avengers"},
+                                      headers=ADMIN)
+                ids.put((r.json()["id"], time.monotonic()))
+                await asyncio.sleep(0.02)
+        else:
+            delays = []
+            for _ in range(probes):
+                pid, written = ids.get()
+                while (await client.get(f"/products/{pid}")).status_code != 200:
+                    await asyncio.sleep(0.0002)
+                delays.append((time.monotonic() - written) * 1000)
+            out.put(delays)
+    db.close()
+
+
+def _probe_proc(directory: str, role: str, probes: int, ids: "mp.Queue[Any]", out: "mp.Queue[Any]") -> None:
+    _env(directory)
+    asyncio.run(_probe(role, probes, ids, out))
+
+
+def run(args) -> None:
+    ctx = mp.get_context("spawn")
+    directory = tempfile.mkdtemp(prefix="memstore-bench-")
+    try:
+        _prepare(directory, args.products)
+        print(f"núcleos: {os.cpu_count()}  productos: {args.products}  concurrencia por worker: {args.concurrency}"
+              f"  escrituras: {args.write_ratio:.0%}")
+        print(f"{'workers':>8} {'req/s':>10} {'lect p50':>10} {'lect p99':>10} {'escr p50':>10} {'escr p99':>10}  (ms)")
+        for n in args.workers:
+            out = ctx.Queue()
+            start = time.time() + 2 + 0.5 * n  # margen para importar la app en cada proceso
+            procs = [ctx.Process(target=_load_proc, args=(directory, args, start, out)) for _ in range(n)]
+            for p in procs:
+                p.start()
+            results = [out.get() for _ in procs]
+            for p in procs:
+                p.join()
+            reads = [v for r, _ in results for v in r]
+            writes = [v for _, w in results for v in w]
+            rps = (len(reads) + len(writes)) / args.duration
+            print(f"{n:>8} {rps:>10.0f} {_percentile(reads, .5) * 1000:>10.2f} {_percentile(reads, .99) * 1000:>10.2f}"
+                  f" {_percentile(writes, .5) * 1000:>10.2f} {_percentile(writes, .99) * 1000:>10.2f}")
+        ids, out = ctx.Queue(), ctx.Queue()
+        procs = [ctx.Process(target=_probe_proc, args=(directory, role, args.probes, ids, out))
+                 for role in ("reader", "writer")]
+        for p in procs:
+            p.start()
+        delays = out.get()
+        for p in procs:
+            p.join()
+        print(f"visibilidad entre workers ({args.probes} escrituras): p50 {_percentile(delays, .5):.2f} ms"
+              f"  p99 {_percentile(delays, .99):.2f} ms  máx {max(delays):.2f} ms")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default="1,2,4", type=lambda s: [int(x) for x in s.split(",")])
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--write-ratio", type=float, default=0.02)
+    parser.add_argument("--probes", type=int, default=200)
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
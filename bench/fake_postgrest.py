@@ -0,0 +1,337 @@
+"""Servidor PostgREST de juguete para benchmarks locales.
+
+Imita las convenciones de URL/filtros que usa `app/supabase_client.py`
+(`/rest/v1/<tabla>?select=*&col=eq.valor&limit=N`) sobre tablas en memoria,
+y la función `rpc/search_<tabla>?q=<tsquery>&lim=N` de `supabase_setup.sql`
+con un ranking parecido a `ts_rank` (el nombre pesa más que la descripción).
+Sólo usa la librería estándar y habla HTTP/1.1 con keep-alive, de modo que
+sirve para medir el coste real de abrir conexiones.
+
+Uso:
+    python -m bench.fake_postgrest --port 54321 --products 1000 --delay-ms 0
+"""
+import argparse
+import json
+import re
+import threading
+import time
+import unicodedata
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qsl, urlsplit
+
+
+class FakeStore:
+    def __init__(self) -> None:
+        self.tables: Dict[str, List[Dict[str, Any]]] = {"categories": [], "products": [], "app_users": []}
+        self.next_id: Dict[str, int] = {}
+        self.lock = threading.Lock()
+        # peticiones simultáneas en curso (y máximo observado)
+        self.inflight = 0
+        self.max_inflight = 0
+        # peticiones recibidas en total
+        self.requests = 0
+        # con True todas las peticiones responden 503 (caída simulada)
+        self.outage = False
+
+    def seed(self, products: int = 1000, categories: int = 4) -> None:
+        for c in range(categories):
+            self.insert("categories", {"name": f"Cat {c}", "slug": f"cat-{c}", "description": f"Categoría {c}"})
+        for i in range(products):
+            self.insert("products", {
+                "name": f"Producto {i}",
+                "description": f"Descripción del producto {i}",
+                "price": 1000 + (i * 37) % 4000,
+                "image_url": None,
+                "category": f"cat-{i % categories}",
+            })
+
+    def insert(self, table: str, row: Dict[str, Any], upsert: bool = False) -> Dict[str, Any]:
+        with self.lock:
+            if upsert and "id" in row:
+                for existing in self.tables.get(table, []):
+                    if existing.get("id") == row["id"]:
+                        existing.update(row)
+                        return existing
+            obj = dict(row)
+            if "id" not in obj:
+                obj["id"] = self.next_id.get(table, 1)
+                self.next_id[table] = obj["id"] + 1
+            self.tables.setdefault(table, []).append(obj)
+            return obj
+
+
+def _coerce(raw: str) -> Any:
+    try:
+        return int(raw)
+    except ValueError:
+        try:
+            return float(raw)
+        except ValueError:
+            return raw
+
+
+def _split_top(text: str) -> List[str]:
+    """Divide `a,b(c,d),"e,f"` por comas de primer nivel."""
+    parts, depth, quoted, cur = [], 0, False, ""
+    for ch in text:
+        if ch == '"':
+            quoted = not quoted
+        elif not quoted and ch == "(":
+            depth += 1
+        elif not quoted and ch == ")":
+            depth -= 1
+        elif not quoted and depth == 0 and ch == ",":
+            parts.append(cur)
+            cur = ""
+            continue
+        cur += ch
+    parts.append(cur)
+    return parts
+
+
+def _logic(row: Dict[str, Any], op: str, body: str) -> bool:
+    results = []
+    for cond in _split_top(body.strip()[1:-1]):
+        if cond.startswith(("and(", "or(")):
+            inner_op, _, inner = cond.partition("(")
+            results.append(_logic(row, inner_op, "(" + inner))
+        else:
+            column, _, expr = cond.partition(".")
+            op_, _, raw = expr.partition(".")
+            results.append(_match(row, column, f"{op_}.{raw.strip(chr(34))}"))
+    return all(results) if op == "and" else any(results)
+
+
+def _match(row: Dict[str, Any], column: str, expr: str) -> bool:
+    if column in ("or", "and"):
+        return _logic(row, column, expr)
+    op, _, raw = expr.partition(".")
+    value = row.get(column)
+    if op == "is":
+        return value is None if raw == "null" else True
+    if op == "eq":
+        return str(value) == raw
+    if op == "in":
+        return str(value) in raw.strip("()").split(",")
+    if value is None:
+        return False
+    other = _coerce(raw)
+    try:
+        if op == "gt":
+            return value > other
+        if op == "gte":
+            return value >= other
+        if op == "lt":
+            return value < other
+        if op == "lte":
+            return value <= other
+    except TypeError:
+        return str(value) > raw if op == "gt" else False
+    return True
+
+
+_RESERVED = {"select", "limit", "offset", "order"}  # "or"/"and" se evalúan como filtros
+
+
+# pesos por defecto de ts_rank para setweight 'A' (nombre) y 'B' (descripción)
+_RANK_WEIGHTS = {"name": 1.0, "description": 0.4}
+
+
+def _words(text: Any) -> List[str]:
+    if not isinstance(text, str):
+        return []
+    plain = "".join(ch for ch in unicodedata.normalize("NFKD", text) if not unicodedata.combining(ch))
+    return re.findall(r"[a-z0-9]+", plain.lower())
+
+
+def _rank(row: Dict[str, Any], prefixes: List[str]) -> float:
+    """Puntuación de `row` para un tsquery `a:* & b:*` (0 si algún término no aparece)."""
+    total = 0.0
+    for prefix in prefixes:
+        best = max((w for column, w in _RANK_WEIGHTS.items()
+                    if any(word.startswith(prefix) for word in _words(row.get(column)))), default=0.0)
+        if not best:
+            return 0.0
+        total += best
+    return total
+
+
+def _search(rows: List[Dict[str, Any]], tsquery: str, limit: int) -> List[Dict[str, Any]]:
+    prefixes = [term.strip().removesuffix(":*") for term in tsquery.split("&") if term.strip()]
+    scored = [(_rank(r, prefixes), r) for r in rows]
+    hits = sorted(((s, r) for s, r in scored if s), key=lambda x: (-x[0], x[1].get("id")))
+    return [r for _, r in hits[:limit]]
+
+
+def _apply(rows: List[Dict[str, Any]], params: List[tuple]) -> List[Dict[str, Any]]:
+    for column, expr in params:
+        if column not in _RESERVED:
+            rows = [r for r in rows if _match(r, column, expr)]
+    opts = dict(params)
+    if "order" in opts:
+        for term in reversed(opts["order"].split(",")):
+            column, _, direction = term.partition(".")
+            rows = sorted(rows, key=lambda r: (r.get(column) is None, r.get(column) or 0) if r.get(column) is None
+                          else (False, r.get(column)), reverse=direction.startswith("desc"))
+    offset = int(opts.get("offset", 0))
+    if "limit" in opts:
+        rows = rows[offset:offset + int(opts["limit"])]
+    elif offset:
+        rows = rows[offset:]
+    select = opts.get("select", "*")
+    if select != "*":
+        cols = select.split(",")
+        rows = [{c: r.get(c) for c in cols} for r in rows]
+    return rows
+
+
+def make_handler(store: FakeStore, delay: float = 0.0, error_rate: float = 0.0):
+    counter = {"n": 0}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # cabeceras y cuerpo van en escrituras separadas: sin esto Nagle +
+        # delayed ACK añaden ~40 ms a cada respuesta con keep-alive
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args: Any) -> None:  # silencioso
+            pass
+
+        def _table(self) -> Optional[str]:
+            path = urlsplit(self.path).path
+            prefix = "/rest/v1/"
+            return path[len(prefix):] if path.startswith(prefix) else None
+
+        def _params(self) -> List[tuple]:
+            return parse_qsl(urlsplit(self.path).query, keep_blank_values=True)
+
+        def _body(self) -> Any:
+            length = int(self.headers.get("Content-Length") or 0)
+            return json.loads(self.rfile.read(length) or b"null")
+
+        def _send(self, status: int, payload: Any = None, headers: Optional[Dict[str, str]] = None) -> None:
+            body = b"" if payload is None else json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            if body and self.command != "HEAD":
+                self.wfile.write(body)
+
+        def _prelude(self) -> bool:
+            with store.lock:
+                store.requests += 1
+            if delay:
+                with store.lock:
+                    store.inflight += 1
+                    store.max_inflight = max(store.max_inflight, store.inflight)
+                time.sleep(delay)
+                with store.lock:
+                    store.inflight -= 1
+            if store.outage:
+                self._send(503, {"message": "outage"})
+                return False
+            if error_rate:
+                counter["n"] += 1
+                if (counter["n"] * error_rate) % 1 < error_rate:
+                    self._send(503, {"message": "injected error"})
+                    return False
+            return True
+
+        def do_GET(self) -> None:
+            table = self._table()
+            if table is None:
+                return self._send(404, {"message": "not found"})
+            if not self._prelude():
+                return
+            if table.startswith("rpc/search_"):
+                with store.lock:
+                    rows = list(store.tables.get(table[len("rpc/search_"):], []))
+                params = dict(self._params())
+                return self._send(200, _search(rows, params.get("q", ""), int(params.get("lim", 20))))
+            with store.lock:
+                rows = list(store.tables.get(table, []))
+            params = self._params()
+            result = _apply(rows, params)
+            headers = {}
+            if "count=" in (self.headers.get("Prefer") or ""):
+                total = len(_apply(rows, [p for p in params if p[0] not in ("limit", "offset")]))
+                headers["Content-Range"] = f"0-{max(len(result) - 1, 0)}/{total}"
+            self._send(200, result, headers)
+
+        def do_HEAD(self) -> None:
+            self.do_GET()
+
+        def do_POST(self) -> None:
+            table = self._table()
+            if table is None or not self._prelude():
+                return
+            body = self._body()
+            rows = body if isinstance(body, list) else [body]
+            upsert = "merge-duplicates" in (self.headers.get("Prefer") or "")
+            created = [store.insert(table, r, upsert=upsert) for r in rows]
+            self._send(201, created)
+
+        def do_PATCH(self) -> None:
+            table = self._table()
+            if table is None or not self._prelude():
+                return
+            payload = self._body()
+            params = self._params()
+            with store.lock:
+                matched = _apply(store.tables.get(table, []), params)
+                for row in matched:
+                    row.update(payload)
+            self._send(200, matched)
+
+        def do_DELETE(self) -> None:
+            table = self._table()
+            if table is None or not self._prelude():
+                return
+            params = self._params()
+            with store.lock:
+                rows = store.tables.get(table, [])
+                doomed = {id(r) for r in _apply(rows, params)}
+                store.tables[table] = [r for r in rows if id(r) not in doomed]
+            self._send(204)
+
+    return Handler
+
+
+def serve(port: int = 0, products: int = 1000, delay_ms: float = 0.0, error_rate: float = 0.0, categories: int = 4):
+    """Arranca el servidor en un hilo y devuelve `(server, base_url)`.
+
+    El almacén queda accesible como `server.store`.
+    """
+    store = FakeStore()
+    store.seed(products=products, categories=categories)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(store, delay_ms / 1000.0, error_rate))
+    server.daemon_threads = True
+    server.request_queue_size = 1024
+    server.store = store
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=54321)
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--delay-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--categories", type=int, default=4)
+    args = parser.parse_args()
+    server, url = serve(args.port, args.products, args.delay_ms, args.error_rate, args.categories)
+    print(f"Fake PostgREST escuchando en {url}", flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
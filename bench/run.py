@@ -0,0 +1,342 @@
+"""Suite de benchmarks: todas las rutas de `app/main.py`, en memoria y contra PostgREST.
+
+Para cada backend (`memory` y `rest`, este último contra `bench.fake_postgrest`
+en otro proceso, con latencia y errores inyectables) se lanza un proceso
+hijo que siembra los datos de ejemplo, completa el catálogo hasta
+`--products` filas y recorre los escenarios de `SCENARIOS` con
+`--concurrency` peticiones simultáneas (transporte ASGI en proceso).
+
+Por ruta se informa: peticiones/s, latencia p50/p95/p99 y, en una segunda
+pasada secuencial con tracemalloc, la memoria pico reservada por petición.
+El resultado se escribe en JSON (`--output`) para comparar commits:
+
+    python -m bench.run --output before.json
+    python -m bench.run --output after.json
+    python -m bench.run --compare before.json after.json
+
+Al empezar avisa de las rutas de la app que no tienen escenario.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+ADMIN = {"x-user-id": "admin"}
+
+Request = Tuple[str, str, Dict[str, Any]]  # método, url, kwargs de httpx
+
+
+class Scenario(NamedTuple):
+    name: str
+    # (método, plantilla de ruta) tal como está declarada en la app
+    route: Tuple[str, str]
+    build: Callable[[int, Dict[str, Any]], Request]
+    # fracción de `--requests` (rutas caras como la exportación)
+    weight: float = 1.0
+
+
+def _get(url: str, **kw: Any) -> Callable[[int, Dict[str, Any]], Request]:
+    return lambda i, ctx: ("GET", url.format(i=i, **ctx), kw)
+
+
+def _product(i: int) -> Dict[str, Any]:
+    return {"name": f"Bench {i}", "description": f"Producto de benchmark {i}", "price": 1000 + i % 3000,
+            "category": "avengers"}
+
+
+def _create_product(i: int, ctx: Dict[str, Any]) -> Request:
+    return "POST", "/products", {"json": _product(i), "headers": ADMIN}
+
+
+def _delete_created(kind: str, path: str) -> Callable[[int, Dict[str, Any]], Request]:
+    def build(i: int, ctx: Dict[str, Any]) -> Request:
+        created = ctx["created"][kind]
+        target = created.pop() if created else 0
+        return "DELETE", path.format(id=target), {"headers": ADMIN}
+    return build
+
+
+def _import_body(i: int, ctx: Dict[str, Any]) -> Request:
+    lines = "\n".join(json.dumps(dict(_product(j), id=j + 1)) for j in range(100))
+    return "POST", "/admin/import/products?upsert=true", {"content": lines.encode(), "headers": ADMIN}
+
+
+SCENARIOS: List[Scenario] = [
+    Scenario("GET /", ("GET", "/"), _get("/")),
+    Scenario("GET /health/ready", ("GET", "/health/ready"), _get("/health/ready")),
+    Scenario("GET /metrics", ("GET", "/metrics"), _get("/metrics")),
+    Scenario("GET /health/upstream", ("GET", "/health/upstream"), _get("/health/upstream")),
+    Scenario("GET /index", ("GET", "/index"), _get("/index")),
+    Scenario("GET /index?fields", ("GET", "/index"), _get("/index?fields=id,name,price,image_url")),
+    Scenario("GET /categories", ("GET", "/categories"), _get("/categories")),
+    Scenario("GET /categories/slug/{slug}", ("GET", "/categories/slug/{slug}"), _get("/categories/slug/avengers")),
+    Scenario("GET /categories/{id}", ("GET", "/categories/{category_id}"), _get("/categories/1")),
+    Scenario("GET /products", ("GET", "/products"), _get("/products"), weight=0.2),
+    Scenario("GET /products?category", ("GET", "/products"), _get("/products?category=avengers")),
+    Scenario("GET /products?category_id", ("GET", "/products"), _get("/products?category_id=1")),
+    Scenario("GET /products?limit&order_by", ("GET", "/products"),
+             _get("/products?limit=50&order_by=price&count=exact")),
+    Scenario("GET /products?fields", ("GET", "/products"),
+             _get("/products?limit=50&fields=id,name,price,image_url")),
+    Scenario("GET /products/search", ("GET", "/products/search"),
+             lambda i, ctx: ("GET", f"/products/search?q=bench {i % 97}", {})),
+    Scenario("GET /products/batch", ("GET", "/products/batch"),
+             lambda i, ctx: ("GET", "/products/batch?ids=" + ",".join(str(1 + (i + j) % ctx["products"]) for j in range(20)), {})),
+    Scenario("GET /products/{id}", ("GET", "/products/{product_id}"),
+             lambda i, ctx: ("GET", f"/products/{1 + i % ctx['products']}", {})),
+    Scenario("POST /cart/price", ("POST", "/cart/price"),
+             lambda i, ctx: ("POST", "/cart/price", {"json": [{"id": 1 + (i + j) % ctx["products"], "qty": 2} for j in range(10)]})),
+    Scenario("POST /auth/login", ("POST", "/auth/login"),
+             lambda i, ctx: ("POST", "/auth/login", {"json": {"username": "admin", "pass": "123456"}})),
+    Scenario("GET /admin/cache", ("GET", "/admin/cache"), _get("/admin/cache", headers=ADMIN)),
+    Scenario("POST /products", ("POST", "/products"), _create_product),
+    Scenario("PUT /products/{id}", ("PUT", "/products/{product_id}"),
+             lambda i, ctx: ("PUT", f"/products/{1 + i % ctx['products']}", {"json": _product(i), "headers": ADMIN})),
+    Scenario("DELETE /products/{id}", ("DELETE", "/products/{product_id}"),
+             _delete_created("products", "/products/{id}")),
+    Scenario("POST /products/bulk", ("POST", "/products/bulk"),
+             lambda i, ctx: ("POST", "/products/bulk", {"json": [_product(i * 50 + j) for j in range(50)], "headers": ADMIN}),
+             weight=0.2),
+    Scenario("POST /categories", ("POST", "/categories"),
+             lambda i, ctx: ("POST", "/categories", {"json": {"name": f"Bench {i}", "slug": f"bench-{ctx['run']}-{i}"}})),
+    Scenario("PUT /categories/{id}", ("PUT", "/categories/{category_id}"),
+             lambda i, ctx: ("PUT", "/categories/4", {"json": {"name": "Guardianes Villanos", "slug": "guardianes-villanos"}})),
+    Scenario("DELETE /categories/{id}", ("DELETE", "/categories/{category_id}"),
+             _delete_created("categories", "/categories/{id}")),
+    Scenario("POST /categories/bulk", ("POST", "/categories/bulk"),
+             lambda i, ctx: ("POST", "/categories/bulk", {"json": [{"name": f"Lote {i}-{j}", "slug": f"lote-{ctx['run']}-{i}-{j}"} for j in range(10)], "headers": ADMIN}),
+             weight=0.2),
+    Scenario("GET /admin/export/products", ("GET", "/admin/export/products"),
+             _get("/admin/export/products", headers=ADMIN), weight=0.05),
+    Scenario("GET /admin/export/products?csv", ("GET", "/admin/export/products"),
+             _get("/admin/export/products?format=csv", headers=ADMIN), weight=0.05),
+    Scenario("POST /admin/import/products", ("POST", "/admin/import/products"), _import_body, weight=0.1),
+    Scenario("POST /admin/cache/flush", ("POST", "/admin/cache/flush"),
+             lambda i, ctx: ("POST", "/admin/cache/flush", {"headers": ADMIN})),
+    Scenario("GET /app", ("GET", "/app"), _get("/app")),
+    Scenario("GET /app/login", ("GET", "/app/login"), _get("/app/login")),
+    Scenario("GET /app/cart", ("GET", "/app/cart"), _get("/app/cart")),
+    Scenario("GET /app/admin", ("GET", "/app/admin"), _get("/app/admin")),
+    Scenario("GET /app/category/{slug}", ("GET", "/app/category/{category_slug}"), _get("/app/category/avengers")),
+    Scenario("GET /app/product/{id}", ("GET", "/app/product/{product_id}"), _get("/app/product/1")),
+    Scenario("GET /static/styles.css", ("GET", "/static"), _get("/static/styles.css")),
+]
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, int(round(q * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[k]
+
+
+def _uncovered(app) -> List[str]:
+    covered = {s.route for s in SCENARIOS}
+    missing = []
+    for route in app.routes:
+        methods = getattr(route, "methods", None) or {"GET"}
+        for method in sorted(methods - {"HEAD", "OPTIONS"}):
+            if route.path.startswith(("/docs", "/redoc", "/openapi")):
+                continue
+            if (method, route.path) not in covered:
+                missing.append(f"{method} {route.path}")
+    return missing
+
+
+async def _drive(client, scenario: Scenario, total: int, concurrency: int, ctx: Dict[str, Any]) -> Dict[str, Any]:
+    latencies: List[float] = []
+    errors = 0
+    pending = iter(range(total))
+
+    async def worker() -> None:
+        nonlocal errors
+        for i in pending:
+            method, url, kw = scenario.build(i, ctx)
+            start = time.perf_counter()
+            r = await client.request(method, url, **kw)
+            latencies.append(time.perf_counter() - start)
+            if r.status_code >= 400:
+                errors += 1
+            elif scenario.name == "POST /products":
+                ctx["created"]["products"].append(r.json()["id"])
+            elif scenario.name == "POST /categories":
+                ctx["created"]["categories"].append(r.json()["id"])
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(1, min(concurrency, total)))))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "requests": total,
+        "errors": errors,
+        "rps": round(total / elapsed, 1) if elapsed else 0.0,
+        "mean_ms": round(1000 * sum(latencies) / len(latencies), 3),
+        "p50_ms": round(1000 * _percentile(latencies, 0.50), 3),
+        "p95_ms": round(1000 * _percentile(latencies, 0.95), 3),
+        "p99_ms": round(1000 * _percentile(latencies, 0.99), 3),
+    }
+
+
+async def _allocations(client, scenario: Scenario, samples: int, ctx: Dict[str, Any]) -> float:
+    """Mediana de la memoria pico (KiB) reservada durante una petición."""
+    peaks = []
+    tracemalloc.start()
+    try:
+        for i in range(samples):
+            method, url, kw = scenario.build(10_000_000 + i, ctx)
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            r = await client.request(method, url, **kw)
+            peaks.append(tracemalloc.get_traced_memory()[1] - before)
+            if r.status_code < 400 and scenario.name in ("POST /products", "POST /categories"):
+                ctx["created"]["products" if "products" in scenario.name else "categories"].append(r.json()["id"])
+    finally:
+        tracemalloc.stop()
+    peaks.sort()
+    return round(peaks[len(peaks) // 2] / 1024, 1)
+
+
+async def _child(args) -> Dict[str, Any]:
+    import httpx
+    from app import db, seed
+    from app.main import app
+
+    db.connect()
+    seed.run(wait=True)
+    extra = args.products - (db.count_rows("products") or 0)
+    if extra > 0:
+        db.insert_many("products", [_product(i) for i in range(extra)])
+    ctx: Dict[str, Any] = {"products": args.products, "run": int(time.time()), "created": {"products": [], "categories": []}}
+    selected = [s for s in SCENARIOS if not args.only or any(o in s.name for o in args.only)]
+    results: Dict[str, Any] = {}
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for scenario in selected:
+                total = max(1, int(args.requests * scenario.weight))
+                results[scenario.name] = await _drive(client, scenario, total, args.concurrency, ctx)
+                if args.alloc_samples:
+                    results[scenario.name]["alloc_peak_kib"] = await _allocations(
+                        client, scenario, max(1, int(args.alloc_samples * min(1.0, scenario.weight * 5))), ctx)
+    finally:
+        await db.aclose()
+    return {"results": results, "uncovered": _uncovered(app)}
+
+
+def _commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _start_fake(args) -> Tuple[subprocess.Popen, str]:
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "bench.fake_postgrest", "--port", "0", "--products", "0", "--categories", "0",
+         "--delay-ms", str(args.delay_ms), "--error-rate", str(args.error_rate)],
+        stdout=subprocess.PIPE, text=True)
+    line = proc.stdout.readline()
+    return proc, line.strip().rsplit(" ", 1)[-1]
+
+
+def _run_backend(backend: str, args) -> Dict[str, Any]:
+    env = {k: v for k, v in os.environ.items() if not k.startswith(("SUPABASE_", "MEMSTORE_"))}
+    env["SEED_ON_STARTUP"] = "0"
+    fake = None
+    if backend == "rest":
+        fake, url = _start_fake(args)
+        env.update(SUPABASE_URL=url, SUPABASE_KEY="bench")
+    cmd = [sys.executable, "-m", "bench.run", "--child", "--requests", str(args.requests),
+           "--concurrency", str(args.concurrency), "--products", str(args.products),
+           "--alloc-samples", str(args.alloc_samples)] + [a for o in args.only for a in ("--only", o)]
+    try:
+        out = subprocess.run(cmd, env=env, capture_output=True, text=True)
+    finally:
+        if fake is not None:
+            fake.terminate()
+            fake.wait()
+    if out.returncode != 0:
+        sys.stderr.write(out.stderr)
+        raise SystemExit(f"el benchmark del backend {backend} falló")
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def _print_table(backend: str, results: Dict[str, Any]) -> None:
+    print(f"\n== {backend}")
+    print(f"{'escenario':<36} {'req/s':>9} {'p50':>8} {'p95':>8} {'p99':>8} {'KiB/pet':>8} {'err':>4}")
+    for name, r in results.items():
+        print(f"{name:<36} {r['rps']:>9.1f} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f} "
+              f"{r.get('alloc_peak_kib', 0):>8.1f} {r['errors']:>4}")
+
+
+def compare(old_path: str, new_path: str) -> None:
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"{old['meta'].get('commit')} -> {new['meta'].get('commit')}")
+    for backend, results in new["results"].items():
+        print(f"\n== {backend}")
+        print(f"{'escenario':<36} {'req/s':>16} {'p95 ms':>18}")
+        for name, r in results.items():
+            before = old["results"].get(backend, {}).get(name)
+            if before is None:
+                continue
+            d_rps = (r["rps"] / before["rps"] - 1) * 100 if before["rps"] else 0.0
+            d_p95 = (r["p95_ms"] / before["p95_ms"] - 1) * 100 if before["p95_ms"] else 0.0
+            print(f"{name:<36} {r['rps']:>9.1f} {d_rps:+6.1f}% {r['p95_ms']:>10.2f} {d_p95:+6.1f}%")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=("memory", "rest", "both"), default="both")
+    parser.add_argument("--requests", type=int, default=200, help="peticiones por escenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--products", type=int, default=1000, help="tamaño del catálogo")
+    parser.add_argument("--delay-ms", type=float, default=2.0, help="latencia inyectada en el PostgREST falso")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fracción de respuestas 503 del PostgREST falso")
+    parser.add_argument("--alloc-samples", type=int, default=10, help="peticiones medidas con tracemalloc (0 = no medir)")
+    parser.add_argument("--only", action="append", default=[], help="sólo escenarios que contengan este texto")
+    parser.add_argument("--output", default="bench-results.json")
+    parser.add_argument("--compare", nargs=2, metavar=("ANTES", "DESPUES"))
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    if args.child:
+        print(json.dumps(asyncio.run(_child(args))))
+        return
+
+    backends = ("memory", "rest") if args.backend == "both" else (args.backend,)
+    report: Dict[str, Any] = {
+        "meta": {
+            "commit": _commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "args": {k: v for k, v in vars(args).items() if k not in ("compare", "child", "output")},
+        },
+        "results": {},
+    }
+    for backend in backends:
+        out = _run_backend(backend, args)
+        if out["uncovered"]:
+            print(f"rutas sin escenario: {', '.join(out['uncovered'])}")
+        report["results"][backend] = out["results"]
+        _print_table(backend, out["results"])
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nresultados en {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -67,17 +67,45 @@ async function loadProducts(){
   (prods||[]).forEach(p=>container.appendChild(renderProductRow(p)));
 }
 
+// Aplica un cambio del feed (/events/catalog) a la lista sin volver a descargarla
+function applyAdminChange(change){
+  if(change.table === 'categories'){ loadCategories().catch(e=>console.error('[admin] categorías', e)); return; }
+  if(change.table !== 'products') return;
+  const container = document.getElementById('admin-products');
+  if(!container) return;
+  const current = container.querySelector(`[data-id="${change.id}"]`);
+  if(change.op === 'delete' || !change.row){ if(current) current.remove(); return; }
+  const row = renderProductRow(change.row);
+  if(current) current.replaceWith(row); else container.appendChild(row);
+}
+
+let catalogFeed = null;
+
+// Tras una escritura: si el feed está conectado el cambio llega por él; si no, se recarga la lista
+async function refreshAfterWrite(){
+  if(catalogFeed && catalogFeed.readyState === EventSource.OPEN) return;
+  await loadProducts();
+}
+
 function getAuthHeader(){
   const user = JSON.parse(localStorage.getItem('user')||'null');
   if(!user) throw new Error('Usuario no autenticado. Accede con credenciales admin.');
   const id = user.username || user.id || user.name || null;
-  if(!id) throw new Error('Usuario inválido en sesión');
-  return {'x-user-id': id};
+  if(!id && !user.token) throw new Error('Usuario inválido en sesión');
+  const headers = {};
+  if(id) headers['x-user-id'] = id;
+  // Token firmado de /auth/login: el servidor lo valida sin consultar la base de datos.
+  // Sin AUTH_SECRET sólo vale en el worker que lo emitió; en los demás se usa x-user-id.
+  if(user.token) headers['Authorization'] = 'Bearer ' + user.token;
+  return headers;
 }
 
 window.addEventListener('load', async ()=>{
   console.log('[admin] script loaded');
   try{ await loadCategories(); await loadProducts(); }catch(e){ console.error('[admin] carga inicial fallida', e); }
+  if(window.watchCatalog){
+    catalogFeed = watchCatalog(applyAdminChange, ()=>{ loadProducts().catch(e=>console.error('[admin] resync', e)); });
+  }
 
   const btnRefresh = document.getElementById('btn-refresh');
   if(btnRefresh) btnRefresh.addEventListener('click', async (ev)=>{ ev.preventDefault(); await loadProducts(); });
@@ -102,7 +130,7 @@ window.addEventListener('load', async ()=>{
       const headers = Object.assign({'Content-Type':'application/json'}, getAuthHeader());
       await api('/products', {method:'POST', headers, body: JSON.stringify({name, description:desc, price, image_url:image, category})});
       hideModal('modal-create');
-      await loadProducts();
+      await refreshAfterWrite();
     }catch(err){ alert('Error: ' + err.message); }
   });
 
@@ -116,13 +144,19 @@ window.addEventListener('load', async ()=>{
     const name = document.getElementById('e-p-name').value;
     const desc = document.getElementById('e-p-desc').value;
     const price = Number(document.getElementById('e-p-price').value)||0;
-    const image = document.getElementById('e-p-image').value||'';
+    let image = document.getElementById('e-p-image').value||'';
     const category = document.getElementById('e-p-category').value || null;
+    const file = document.getElementById('e-p-file').files[0];
     try{
+      if(file){
+        // los bytes tal cual: el servidor guarda el original y genera las variantes
+        const uploaded = await api(`/products/${id}/image`, {method:'PUT', headers: Object.assign({'Content-Type': file.type}, getAuthHeader()), body: file});
+        image = uploaded.image_url;
+      }
       const headers = Object.assign({'Content-Type':'application/json'}, getAuthHeader());
       await api(`/products/${id}`, {method:'PUT', headers, body: JSON.stringify({name, description:desc, price, image_url:image, category})});
       hideModal('modal-edit');
-      await loadProducts();
+      await refreshAfterWrite();
     }catch(err){ alert('Error: ' + err.message); }
   });
 
@@ -136,7 +170,7 @@ window.addEventListener('load', async ()=>{
     try{
       await api(`/products/${id}`, {method:'DELETE', headers: getAuthHeader()});
       hideModal('modal-delete');
-      await loadProducts();
+      await refreshAfterWrite();
     }catch(err){ alert('Error: ' + err.message); }
   });
 
@@ -156,6 +190,7 @@ window.addEventListener('load', async ()=>{
         document.getElementById('e-p-desc').value = prod.description||'';
         document.getElementById('e-p-price').value = prod.price||0;
         document.getElementById('e-p-image').value = prod.image_url||'';
+        document.getElementById('e-p-file').value = '';
         document.getElementById('e-p-category').value = prod.category||'';
         showModal('modal-edit');
       }catch(err){ alert('Error cargando producto: ' + err.message); }
@@ -92,7 +92,30 @@ function setupLoginHandlers(){
   });
 }
 
+// Feed de cambios del catálogo (/events/catalog): cada evento `change` trae
+// {table, op, id, row} y `resync` pide volver a cargar las listas. El
+// navegador reconecta solo y pide lo perdido con Last-Event-ID.
+function watchCatalog(onChange, onResync){
+  if(!window.EventSource) return null;
+  const es = new EventSource('/events/catalog');
+  es.addEventListener('change', ev=>{ try{ onChange(JSON.parse(ev.data)); }catch(e){ console.error('[catalog] evento inválido', e); } });
+  es.addEventListener('resync', ev=>{ try{ onResync(JSON.parse(ev.data)); }catch(e){ console.error('[catalog] resync', e); } });
+  return es;
+}
+
+// Tarjetas de producto ya pintadas: se actualizan (precio, nombre...) o se quitan
+function applyProductChange(change){
+  if(change.table !== 'products' || change.op === 'insert') return;
+  document.querySelectorAll(`.product .add[data-id="${change.id}"]`).forEach(btn=>{
+    const card = btn.closest('.product');
+    if(!card) return;
+    if(change.op === 'delete' || !change.row) card.remove();
+    else card.replaceWith(makeProductCard(change.row));
+  });
+}
+
 // Expose useful helpers globally for other page scripts
+window.watchCatalog = watchCatalog;
 window.getCart = getCart;
 window.saveCart = saveCart;
 window.addToCartItem = addToCartItem;
@@ -100,7 +123,7 @@ window.showLoginModal = showLoginModal;
 window.updateCartBadge = updateCartBadge;
 
 
-function makeCategoryCard(cat){
+function makeCategoryCard(cat, count){
   const el = document.createElement('div');
   el.className = 'cat-card';
 
@@ -115,6 +138,7 @@ function makeCategoryCard(cat){
     <div class="cat-body">
       <h3>${cat.name}</h3>
       <p>${cat.description||''}</p>
+      <span class="cat-count" data-slug="${cat.slug || ''}">${count === undefined ? '' : countLabel(count)}</span>
       <a href="/app/category/${cat.slug || cat.id}" data-id="${cat.slug || cat.id}" class="view" data-nav="page">Ver productos <span class="arrow">→</span></a>
     </div>
   `;
@@ -122,11 +146,16 @@ function makeCategoryCard(cat){
   return el;
 }
 
+// Las imágenes subidas (/images/<hash>) tienen variantes por tamaño: grid, detail y cart
+function imageVariant(url, size){
+  return url && url.startsWith('/images/') ? `${url}/${size}.webp` : url;
+}
+
 function makeProductCard(p){
   const el = document.createElement('div');
   el.className = 'product';
 
-  const imageUrl = p.image_url && p.image_url.length ? p.image_url : '/static/default-product.svg';
+  const imageUrl = p.image_url && p.image_url.length ? imageVariant(p.image_url, 'grid') : '/static/default-product.svg';
 
   el.innerHTML = `
     <div class="product-media">
@@ -164,12 +193,33 @@ function makeProductCard(p){
   return el;
 }
 
+function countLabel(n){
+  return n === 1 ? '1 producto' : `${n} productos`;
+}
+
+// Número de productos por categoría desde /facets (agregados del servidor)
+async function loadCounts(){
+  try{
+    const f = await api('/facets');
+    return Object.fromEntries((f.categories||[]).map(c=>[c.category, c.count]));
+  }catch(e){
+    return {};
+  }
+}
+
+async function refreshCounts(){
+  const counts = await loadCounts();
+  document.querySelectorAll('.cat-count[data-slug]').forEach(el=>{
+    el.textContent = countLabel(counts[el.dataset.slug] || 0);
+  });
+}
+
 async function loadIndex(){
   try{
-    const data = await api('/index');
+    const [data, counts] = await Promise.all([api('/index'), loadCounts()]);
     const cats = document.getElementById('categories-list');
     cats.innerHTML='';
-    (data.categories||[]).forEach(c=>cats.appendChild(makeCategoryCard(c)));
+    (data.categories||[]).forEach(c=>cats.appendChild(makeCategoryCard(c, counts[c.slug] || 0)));
 
     const featured = document.getElementById('featured-list');
     featured.innerHTML='';
@@ -264,6 +314,17 @@ window.addEventListener('load', ()=>{
   if(document.getElementById('categories-list')){
     loadIndex();
   }
+  // Mantener al día las tarjetas de producto de la página (el panel admin tiene su propio manejo)
+  if(document.querySelector('#featured-list, #category-products')){
+    watchCatalog(change=>{
+      if(change.table === 'categories'){ if(document.getElementById('categories-list')) loadIndex(); return; }
+      applyProductChange(change);
+      if(document.getElementById('categories-list')) refreshCounts();
+    }, ()=>{
+      if(document.getElementById('categories-list')) loadIndex();
+      else if(typeof loadCategory === 'function') loadCategory();
+    });
+  }
   // Initialize login handlers and cart badge on all pages
   try{ setupLoginHandlers(); }catch(e){}
   try{ updateCartBadge(); }catch(e){}
@@ -4,6 +4,9 @@ async function api(path){
   return res.json();
 }
 
+// Variante pequeña de las imágenes subidas (/images/<hash>)
+function imageVariant(url, size){ return url && url.startsWith('/images/') ? `${url}/${size}.webp` : url; }
+
 function getCart(){ try{ return JSON.parse(localStorage.getItem('cart')||'[]') }catch(e){ return [] } }
 function saveCart(cart){ localStorage.setItem('cart', JSON.stringify(cart||[])); }
 function getUser(){ try{ return JSON.parse(localStorage.getItem('user')||'null') }catch(e){ return null } }
@@ -23,7 +26,7 @@ function renderCart(){
     total += (Number(item.price)||0) * (item.qty||1);
     const it = document.createElement('div'); it.className='cart-item';
     it.innerHTML = `
-      <div class="media"><img src="${item.image_url||'/static/default-product.svg'}" alt="${item.name}" onerror="this.onerror=null;this.src='/static/default-product.svg'"/></div>
+      <div class="media"><img src="${item.image_url ? imageVariant(item.image_url, 'cart') : '/static/default-product.svg'}" alt="${item.name}" onerror="this.onerror=null;this.src='/static/default-product.svg'"/></div>
       <div class="meta">
         <h4>${item.name}</h4>
         <p>${formatPrice(item.price)}</p>
@@ -40,6 +43,26 @@ function renderCart(){
   totalEl.textContent = formatPrice(total);
 }
 
+// Actualiza precios/nombres del carrito con el catálogo actual (una sola petición)
+async function refreshCartPrices(){
+  const cart = getCart();
+  if(!cart || cart.length===0) return;
+  try{
+    const res = await fetch('/cart/price', {method:'POST', headers:{'Content-Type':'application/json'}, body: JSON.stringify(cart.map(c=>({id:c.id, qty:c.qty||1})))});
+    if(!res.ok) return;
+    const quote = await res.json();
+    const byId = new Map(quote.lines.map(l=>[String(l.id), l]));
+    let changed = false;
+    cart.forEach(c=>{
+      const line = byId.get(String(c.id));
+      if(line && (Number(c.price)!==line.price || c.name!==line.name)){
+        c.price = line.price; c.name = line.name; c.image_url = line.image_url || c.image_url; changed = true;
+      }
+    });
+    if(changed){ saveCart(cart); renderCart(); }
+  }catch(e){ console.error('Error actualizando precios del carrito', e); }
+}
+
 function updateQty(id, delta){
   const cart = getCart();
   const idx = cart.findIndex(c=>c.id==id);
@@ -88,6 +111,7 @@ function setupLoginHandlers(){
 
 window.addEventListener('load', ()=>{
   renderCart();
+  refreshCartPrices();
   setupLoginHandlers();
 
   document.getElementById('clear-cart')?.addEventListener('click', (e)=>{ e.preventDefault(); if(confirm('Vaciar carrito?')) clearCart(); });
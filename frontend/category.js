@@ -7,7 +7,7 @@ async function api(path){
 function makeProductCard(p){
   const el = document.createElement('div');
   el.className = 'product';
-  const imageUrl = p.image_url && p.image_url.length ? p.image_url : '/static/default-product.svg';
+  const imageUrl = p.image_url && p.image_url.length ? imageVariant(p.image_url, 'grid') : '/static/default-product.svg';
   el.innerHTML = `
     <div class="product-media">
       <img src="${imageUrl}" alt="${p.name}" onerror="this.onerror=null;this.src='/static/default-product.svg'" />
@@ -22,7 +22,7 @@ async function loadProduct(){
     if(!prod){ document.getElementById('detail-title').textContent='Producto no encontrado'; return; }
     document.getElementById('detail-title').textContent = prod.name || 'Producto';
     document.getElementById('detail-desc').textContent = prod.description || '';
-    document.getElementById('detail-image').src = prod.image_url || '/static/default-product.svg';
+    document.getElementById('detail-image').src = prod.image_url ? imageVariant(prod.image_url, 'detail') : '/static/default-product.svg';
     document.getElementById('detail-price').textContent = formatPrice(prod.price);
 
     // handler add
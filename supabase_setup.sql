@@ -67,4 +67,42 @@ CREATE TABLE IF NOT EXISTS public.categories (
   description text
 );
 
+-- 6) Búsqueda de texto en productos (GET /products/search)
+-- La API llama a `rpc/search_products?q=capit:*%20%26%20americ:*&lim=20`, que filtra y
+-- ordena por relevancia (`ts_rank`, con el nombre pesando más que la descripción) en el
+-- servidor: el límite se aplica sobre los mejores resultados, no sobre los primeros que aparezcan.
+-- `unaccent` no es IMMUTABLE, por eso lo envolvemos para poder usarlo en un índice.
+CREATE EXTENSION IF NOT EXISTS unaccent WITH SCHEMA extensions;
+
+CREATE OR REPLACE FUNCTION public.immutable_unaccent(text)
+  RETURNS text
+  LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+AS $$ SELECT extensions.unaccent('extensions.unaccent'::regdictionary, $1) $$;
+
+CREATE OR REPLACE FUNCTION public.product_search_vector(name text, description text)
+  RETURNS tsvector
+  LANGUAGE sql IMMUTABLE PARALLEL SAFE
+AS $$
+  SELECT setweight(to_tsvector('simple', public.immutable_unaccent(coalesce(name, ''))), 'A') ||
+         setweight(to_tsvector('simple', public.immutable_unaccent(coalesce(description, ''))), 'B')
+$$;
+
+-- Versiones anteriores de este script guardaban el tsvector en una columna generada,
+-- que aparecía en todos los `select=*`; el índice por expresión la sustituye.
+ALTER TABLE public.products DROP COLUMN IF EXISTS search;
+
+CREATE INDEX IF NOT EXISTS products_search_idx
+  ON public.products USING gin (public.product_search_vector(name, description));
+
+CREATE OR REPLACE FUNCTION public.search_products(q text, lim integer DEFAULT 20)
+  RETURNS SETOF public.products
+  LANGUAGE sql STABLE
+AS $$
+  SELECT p.*
+  FROM public.products p, to_tsquery('simple', q) query
+  WHERE public.product_search_vector(p.name, p.description) @@ query
+  ORDER BY ts_rank(public.product_search_vector(p.name, p.description), query) DESC, p.id
+  LIMIT lim
+$$;
+
 -- Fin del script